@@ -1,3 +1,5 @@
+import os
+
 # Universal timestamp format
 TIMESTAMP_FORMAT = "%Y-%m-%dT%H:%M:%S.%f"
 TIMESTAMP_FORMAT_READABLE = "%Y-%m-%d %H:%M:%S"
@@ -11,3 +13,17 @@ TELEMETRIES = ["voltage", "current", "power", "energy", "frequency", "pf"]
 
 # Example single device target
 DEVICE_ID = "anonymous-smartlamp-001"
+
+# Pending windows waiting for detection (oldest are dropped when full)
+DETECTION_QUEUE_SIZE = int(os.getenv("DETECTION_QUEUE_SIZE", "10000"))
+
+# Micro-batching: a batch closes at this many windows or after this delay
+INFERENCE_BATCH_SIZE = int(os.getenv("INFERENCE_BATCH_SIZE", "64"))
+INFERENCE_BATCH_DEADLINE_MS = float(os.getenv("INFERENCE_BATCH_DEADLINE_MS", "20"))
+
+# Seconds between batching metrics log lines (0 disables)
+INFERENCE_STATS_INTERVAL = int(os.getenv("INFERENCE_STATS_INTERVAL", "60"))
+
+# Maintain per-device running window statistics instead of recomputing
+# every reduction over the whole window
+INCREMENTAL_FEATURES = os.getenv("INCREMENTAL_FEATURES", "false").lower() == "true"
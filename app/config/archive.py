@@ -0,0 +1,14 @@
+import os
+
+# Columnar telemetry archive (app.storage.telemetry_archive)
+ARCHIVE_DIR = os.getenv("ARCHIVE_DIR", "archive")
+
+# Archive worker cycle
+ARCHIVE_INTERVAL = int(os.getenv("ARCHIVE_INTERVAL", "300")) # seconds
+
+# Time partition length; closed partitions are compacted into a single chunk.
+# Readers find partitions by listing, so changing it only affects new data.
+ARCHIVE_PARTITION_SECONDS = int(os.getenv("ARCHIVE_PARTITION_SECONDS", "86400"))
+
+# Answer /telemetry/{device_id}/history from the archive instead of Postgres
+ARCHIVE_HISTORY = os.getenv("ARCHIVE_HISTORY", "false").lower() == "true"
@@ -4,3 +4,34 @@ import os
 MAX_BUFFER_SIZE = 3600 # data
 
 REDIS_HOST = os.getenv("REDIS_HOST", "localhost")
+
+# Timestamp-indexed buffer (sorted set scored by epoch seconds)
+BUFFER_KEY_PREFIX = "telemetry_index"
+
+# Pre-index buffers were plain lists, kept here for migration
+LEGACY_BUFFER_KEY_PREFIX = "telemetry_buffer"
+
+# Entries per ingest script call in add_many, keeps script ARGV bounded
+INGEST_CHUNK_SIZE = 500
+
+# Buffer entry encoding: "json", "packed64" or "packed32" (float32 values,
+# float64 timestamp). Readers accept every format, so this can be switched
+# during a rollout.
+BUFFER_CODEC = os.getenv("BUFFER_CODEC", "json")
+
+# Async Redis connection pool size per API worker
+REDIS_MAX_CONNECTIONS = int(os.getenv("REDIS_MAX_CONNECTIONS", "64"))
+
+# Newly buffered entries are published on <prefix>:<device_id> for streaming
+UPDATE_CHANNEL_PREFIX = "telemetry_updates"
+PUBLISH_UPDATES = os.getenv("PUBLISH_UPDATES", "true").lower() == "true"
+
+# In-process cache of recent telemetry in each API worker, kept current from
+# the update channels (needs PUBLISH_UPDATES); misses fall back to Redis
+TELEMETRY_CACHE_ENABLED = os.getenv("TELEMETRY_CACHE_ENABLED", "false").lower() == "true"
+
+# Newest samples held per cached device
+TELEMETRY_CACHE_CAPACITY = int(os.getenv("TELEMETRY_CACHE_CAPACITY", "1200"))
+
+# Memory for cached devices; least recently read devices are evicted beyond it
+TELEMETRY_CACHE_MEMORY_MB = int(os.getenv("TELEMETRY_CACHE_MEMORY_MB", "64"))
@@ -0,0 +1,12 @@
+import os
+
+POSTGRES_HOST = os.getenv("POSTGRES_HOST", "localhost")
+POSTGRES_DB = os.getenv("POSTGRES_DB", "yourdb")
+POSTGRES_USER = os.getenv("POSTGRES_USER", "youruser")
+POSTGRES_PASSWORD = os.getenv("POSTGRES_PASSWORD", "yourpassword")
+
+# Seconds to wait for a connection before giving up
+POSTGRES_CONNECT_TIMEOUT = int(os.getenv("POSTGRES_CONNECT_TIMEOUT", "3"))
+
+# Pooled connections per API worker
+POSTGRES_POOL_SIZE = int(os.getenv("POSTGRES_POOL_SIZE", "4"))
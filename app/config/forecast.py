@@ -1,3 +1,5 @@
+import os
+
 # Forecasting horizon in seconds
 ALLOWED_HORIZONS = [60, 300, 600]
 
@@ -6,3 +8,35 @@ SEQUENCE_LENGTH = 30
 
 # Threshold during training process
 THRESHOLD = 1.676783097932059
+
+# Forecast result cache (shared by all API workers through Redis)
+FORECAST_CACHE_ENABLED = os.getenv("FORECAST_CACHE_ENABLED", "true").lower() == "true"
+FORECAST_CACHE_TTL = int(os.getenv("FORECAST_CACHE_TTL", "300")) # seconds
+FORECAST_CACHE_MAX_ENTRIES = int(os.getenv("FORECAST_CACHE_MAX_ENTRIES", "10000"))
+
+# How long a request waits on a forecast another request is already computing
+FORECAST_CACHE_LOCK_TIMEOUT = float(os.getenv("FORECAST_CACHE_LOCK_TIMEOUT", "30")) # seconds
+FORECAST_CACHE_POLL_INTERVAL = 0.05 # seconds
+
+# Largest number of (device_id, horizon) pairs accepted by POST /forecast/batch
+FORECAST_BATCH_MAX_ITEMS = int(os.getenv("FORECAST_BATCH_MAX_ITEMS", "500"))
+
+# Complete short or cold buffers with persisted samples from Postgres;
+# enable only when the persist worker and database are deployed
+FORECAST_PERSISTED_FALLBACK = os.getenv("FORECAST_PERSISTED_FALLBACK", "false").lower() == "true"
+
+# Forecasts precomputed for every horizon by app.workers.forecast_precompute.
+# The API answers GET /forecast from them when FORECAST_PRECOMPUTED is set.
+FORECAST_PRECOMPUTED = os.getenv("FORECAST_PRECOMPUTED", "false").lower() == "true"
+
+# A device is recomputed once this many seconds of new telemetry have arrived...
+FORECAST_PRECOMPUTE_EVERY = float(os.getenv("FORECAST_PRECOMPUTE_EVERY", "30")) # seconds of data
+
+# ...but at most once per this interval, however much it sends
+FORECAST_PRECOMPUTE_MIN_INTERVAL = float(os.getenv("FORECAST_PRECOMPUTE_MIN_INTERVAL", "10")) # seconds
+
+# Devices recomputed together (one predict call per model per batch)
+FORECAST_PRECOMPUTE_BATCH_SIZE = int(os.getenv("FORECAST_PRECOMPUTE_BATCH_SIZE", "64"))
+
+# Precomputed forecasts older than this are not served (they expire in Redis)
+FORECAST_PRECOMPUTE_TTL = int(os.getenv("FORECAST_PRECOMPUTE_TTL", "120")) # seconds
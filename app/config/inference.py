@@ -0,0 +1,31 @@
+import os
+
+# Model calls running at once in one API worker
+INFERENCE_CONCURRENCY = int(os.getenv("INFERENCE_CONCURRENCY", "2"))
+
+# Model calls allowed to wait for a free slot before requests get 503
+INFERENCE_QUEUE_DEPTH = int(os.getenv("INFERENCE_QUEUE_DEPTH", "16"))
+
+# Retry-After (seconds) sent with 503 when the inference queue is full
+INFERENCE_RETRY_AFTER = int(os.getenv("INFERENCE_RETRY_AFTER", "1"))
+
+# Where API forecasts run: "thread" runs models in the API process (see
+# app/utils/inference_executor.py), "process" hands them to a pool of
+# model-hosting processes (see app/utils/inference_pool.py)
+INFERENCE_BACKEND = os.getenv("INFERENCE_BACKEND", "thread")
+
+# Model-hosting processes for the "process" backend; each model is held by one of them
+INFERENCE_PROCESSES = int(os.getenv("INFERENCE_PROCESSES", str(os.cpu_count() or 2)))
+
+# Shared-memory slots, one per forecast waiting or running in the pool;
+# requests get 503 when all are taken
+INFERENCE_SHARED_SLOTS = int(os.getenv("INFERENCE_SHARED_SLOTS", "64"))
+
+# How the "process" backend picks a host: "model" keeps every model artifact
+# on one host (least memory), "device" spreads devices across hosts so a
+# model shared by many devices is loaded by several hosts and uses more cores
+INFERENCE_POOL_ROUTING = os.getenv("INFERENCE_POOL_ROUTING", "model")
+
+# Seconds a "process" backend host with forecasts waiting may go without answering
+# before it is killed and restarted (a stuck host would otherwise hold its slots forever)
+INFERENCE_POOL_TIMEOUT = float(os.getenv("INFERENCE_POOL_TIMEOUT", "30"))
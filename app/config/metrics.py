@@ -0,0 +1,10 @@
+import os
+
+# Port of the Prometheus exporter started by the workers (the API serves /metrics)
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9100"))
+
+# Fraction of requests and messages traced stage by stage (0 disables tracing)
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "0"))
+
+# Sampled traces slower than this are logged with their spans
+TRACE_SLOW_MS = float(os.getenv("TRACE_SLOW_MS", "250"))
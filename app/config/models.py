@@ -0,0 +1,17 @@
+import os
+
+# Approximate memory the model cache may hold before evicting least recently used models
+MODEL_MEMORY_BUDGET_MB = int(os.getenv("MODEL_MEMORY_BUDGET_MB", "512"))
+
+# Seconds between checks of model files on disk for changes (0 checks every access)
+MODEL_RELOAD_CHECK_INTERVAL = float(os.getenv("MODEL_RELOAD_CHECK_INTERVAL", "30"))
+
+# Devices whose models load at startup: comma-separated IDs, "all" for every enabled device
+PRELOAD_DEVICES = os.getenv("PRELOAD_DEVICES", "")
+
+# Maps device IDs to model artifacts (see app/utils/model_manifest.py)
+MODEL_MANIFEST = os.getenv("MODEL_MANIFEST", "")
+
+# Inference runtime: "auto" serves exported NumPy artifacts (.npz) when they are
+# present and up to date, "numpy" requires them, "keras" always loads TensorFlow
+MODEL_RUNTIME = os.getenv("MODEL_RUNTIME", "auto")
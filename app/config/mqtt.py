@@ -1,5 +1,14 @@
-MQTT_BROKER = "broker.emqx.io"
+import os
+
+MQTT_BROKER = os.getenv("MQTT_BROKER", "broker.emqx.io")
 MQTT_BASE_TOPIC = "cermatlistrik"
 DEVICE_ID = "anonymous-smartlamp-001"
 POWER_TELEMETRY_SUBTOPIC = "telemetry/power-consumption"
 ANOMALY_SUBTOPIC = "anomalies"
+
+# Validate incoming telemetry against app.interfaces.power_telemetry.PowerTelemetry
+# and drop payloads that do not match; when off, any JSON object is buffered
+TELEMETRY_VALIDATION = os.getenv("TELEMETRY_VALIDATION", "true").lower() == "true"
+
+# Single-level wildcard over device IDs
+POWER_TELEMETRY_WILDCARD_TOPIC = f"{MQTT_BASE_TOPIC}/+/{POWER_TELEMETRY_SUBTOPIC}"
@@ -1,4 +1,16 @@
+import os
+
 """
 Persist to database interval
 """
-PERSIST_INTERVAL = 3600 # seconds
+PERSIST_INTERVAL = int(os.getenv("PERSIST_INTERVAL", "60")) # seconds
+
+# Rows per INSERT statement sent by execute_values
+PERSIST_PAGE_SIZE = 5000
+
+# Rollup bucket sizes in seconds; coarser levels are built from the finest one
+ROLLUP_RESOLUTIONS = [60, 900, 3600]
+
+# History queries
+HISTORY_DEFAULT_POINTS = 300
+HISTORY_MAX_ROWS = 10000
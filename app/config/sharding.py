@@ -0,0 +1,19 @@
+import os
+import socket
+
+# Split devices between anomaly worker replicas by consistent hashing
+SHARDING_ENABLED = os.getenv("SHARDING_ENABLED", "true").lower() == "true"
+
+# Identity of this replica in the fleet (unique per process)
+WORKER_ID = os.getenv("WORKER_ID", f"{socket.gethostname()}-{os.getpid()}")
+
+# Replicas renew a lease every heartbeat; a replica whose lease expires is
+# considered dead and its devices move to the survivors
+SHARD_HEARTBEAT_INTERVAL = float(os.getenv("SHARD_HEARTBEAT_INTERVAL", "5")) # seconds
+SHARD_LEASE_TTL = float(os.getenv("SHARD_LEASE_TTL", "15")) # seconds
+
+# Virtual nodes per replica on the hash ring (more = more even split)
+SHARD_VNODES = 64
+
+SHARD_MEMBERS_KEY = "anomaly_workers"
+WINDOW_STATE_KEY = "anomaly_window_state"
@@ -0,0 +1,13 @@
+import os
+
+# Seconds of history sent when a stream opens without a cursor
+STREAM_BACKFILL_SECONDS = 600
+
+# Minimum seconds between forecast updates pushed for one device/horizon
+STREAM_FORECAST_INTERVAL = float(os.getenv("STREAM_FORECAST_INTERVAL", "10"))
+
+# Seconds between keep-alive comments on idle streams
+STREAM_HEARTBEAT_INTERVAL = 15
+
+# Events buffered per client before it is considered too slow and disconnected
+STREAM_CLIENT_QUEUE_SIZE = int(os.getenv("STREAM_CLIENT_QUEUE_SIZE", "1000"))
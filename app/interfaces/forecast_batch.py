@@ -0,0 +1,9 @@
+from typing import List
+from pydantic import BaseModel
+
+class ForecastBatchItem(BaseModel):
+    device_id: str
+    horizon: int
+
+class ForecastBatchRequest(BaseModel):
+    items: List[ForecastBatchItem]
@@ -1,7 +1,10 @@
-from pydantic import BaseModel
+from typing import Union
+from pydantic import BaseModel, StrictFloat, StrictInt, field_validator
+from app.storage.telemetry_codec import to_epoch_seconds
 
 class PowerTelemetry(BaseModel):
-    timestamp: str
+    # Epoch seconds or an ISO 8601 string; strict so a JSON boolean is not read as 0 or 1
+    timestamp: Union[StrictFloat, StrictInt, str]
     voltage: float
     current: float
     pf: float
@@ -11,3 +14,18 @@ class PowerTelemetry(BaseModel):
     power: float
     energy: float
     frequency: float
+
+    @field_validator("timestamp")
+    @classmethod
+    def timestamp_is_parseable(cls, value):
+        if isinstance(value, str):
+            to_epoch_seconds(value)
+        return value
+
+"""
+Parse and validate a raw MQTT payload in one pass.
+Returns the entry as a plain dict; raises pydantic.ValidationError
+(a ValueError) for malformed JSON and for payloads that do not match.
+"""
+def parse_power_telemetry(raw: bytes) -> dict:
+    return PowerTelemetry.model_validate_json(raw).model_dump()
@@ -1,82 +1,86 @@
 import numpy as np
-import pandas as pd
-from datetime import datetime, timedelta
-from app.config.anomaly_detection import (
-    TIMESTAMP_FORMAT_READABLE,
-    TIMESTAMP_FORMAT,
-    WINDOW_SIZE,
-    TELEMETRIES,
-)
+from datetime import datetime, timezone
 from app.utils.model_loader import get_anomaly_detection_model
+from app.utils.scaling import transform
+from app.modules.window_features import window_to_array, extract_features_array, FEATURE_COLUMNS
+from app.utils.metrics import timed, FEATURE_EXTRACTION, MODEL_PREDICT
 
 """
+Build the scaled model input for one window.
+features may carry a precomputed feature row (e.g. from RollingWindowFeatures).
+Returns (model, threshold, prepared) where prepared is passed on to score_windows.
+"""
+def prepare_window(device_id, raw_data, features=None):
+    model, scaler, threshold = get_anomaly_detection_model(device_id)
+
+    with timed(FEATURE_EXTRACTION, "features:anomaly", task="anomaly"):
+        timestamps, values = window_to_array(raw_data)
+        if features is None:
+            features = extract_features_array(values[np.newaxis])
+
+        X_scaled = transform(scaler, features, FEATURE_COLUMNS)
+
+    return model, threshold, {
+        "timestamps": timestamps,
+        "feature_names": FEATURE_COLUMNS,
+        "X_scaled": X_scaled,
+    }
 
 """
-def extract_window_features(window_df):
-    features = {}
-    for col in TELEMETRIES:
-        series = window_df[col]
-        features[f'{col}_mean'] = series.mean()
-        features[f'{col}_std'] = series.std()
-        features[f'{col}_min'] = series.min()
-        features[f'{col}_max'] = series.max()
-        features[f'{col}_trend'] = series.iloc[-1] - series.iloc[0]
-
-    return features
+Score prepared windows that share one model with a single forward pass.
+threshold is one cutoff for every window, or one per window when devices
+sharing the model override it. Returns one result (or None) per window, in order.
+"""
+def score_windows(model, threshold, prepared_windows):
+    X_scaled = np.vstack([p["X_scaled"] for p in prepared_windows])
+    with timed(MODEL_PREDICT, "predict:anomaly", task="anomaly"):
+        X_pred = model.predict(X_scaled, verbose=0)
+
+    recon_errors = np.mean((X_scaled - X_pred) ** 2, axis=1)
+    anomaly_feature_idxs = np.argmax(np.abs(X_scaled - X_pred), axis=1)
+
+    anomalous = recon_errors > np.asarray(threshold, dtype=np.float64)
+
+    return [
+        build_anomaly_result(prepared, recon_error, anomaly_feature_idx)
+        if is_anomalous else None
+        for prepared, recon_error, anomaly_feature_idx, is_anomalous
+        in zip(prepared_windows, recon_errors, anomaly_feature_idxs, anomalous)
+    ]
+
+def _isoformat(epoch_seconds):
+    return datetime.fromtimestamp(float(epoch_seconds), tz=timezone.utc).replace(tzinfo=None).isoformat()
+
+"""
+Describe an anomalous window
+"""
+def build_anomaly_result(prepared, recon_error, anomaly_feature_idx):
+    timestamps = prepared["timestamps"]
+
+    # Ensure the anomaly feature index is within bounds
+    if anomaly_feature_idx < 0 or anomaly_feature_idx >= len(timestamps):
+        raise ValueError(f"Anomaly feature index {anomaly_feature_idx} is out of bounds.")
+
+    most_anomalous_feature = prepared["feature_names"][anomaly_feature_idx]
+
+    timestamp_start = _isoformat(timestamps[0])
+    timestamp_end = _isoformat(timestamps[-1])
+    most_anomalous_feature_timestamp = _isoformat(timestamps[anomaly_feature_idx])
+
+    return {
+        "timestamp_start": timestamp_start,
+        "timestamp_end": timestamp_end,
+        "reconstruction_error": float(recon_error),
+        "most_anomalous_feature": most_anomalous_feature,
+        "message": f"Anomaly in '{most_anomalous_feature}' at {most_anomalous_feature_timestamp}"
+    }
 
 """
 Predict anomalies using machine learning model
 """
 def detect_anomalies(device_id, raw_data):
-    # print("anomaly detection function", flush=True)
-    model, scaler, threshold = get_anomaly_detection_model(device_id)
-
-    # Ensure raw_data isn't empty
-    if not raw_data:
-        raise ValueError("Raw data is empty. Cannot perform anomaly detection.")
-
-    df_window = pd.DataFrame(raw_data)
-    df_window['timestamp'] = pd.to_datetime(df_window['timestamp'], unit='s')
-    df_window = df_window.sort_values('timestamp').reset_index(drop=True)
-
-    features = extract_window_features(df_window)
-    X_input = pd.DataFrame([features])
-    X_scaled = scaler.transform(X_input)
-
-    # print("calling anomaly detection model...", flush=True)
-    
-    X_pred = model.predict(X_scaled)
-    # print("call done, reconstructing...", flush=True)
-    recon_error = np.mean((X_scaled - X_pred) ** 2, axis=1)[0]
-    # print("reconstruction done, determining is it anomaly?", flush=True)
-    is_anomaly = int(recon_error > threshold)
-
-    if is_anomaly:
-        # print("there are anomalies", flush=True)
-        # Find the most anomalous feature
-        anomaly_feature_idx = np.argmax(np.abs(X_scaled - X_pred), axis=1)[0]
-
-        # Ensure the anomaly feature index is within bounds
-        if anomaly_feature_idx < 0 or anomaly_feature_idx >= len(df_window):
-            raise ValueError(f"Anomaly feature index {anomaly_feature_idx} is out of bounds.")
-
-        feature_names = X_input.columns.tolist()
-        most_anomalous_feature = feature_names[anomaly_feature_idx]
-
-        timestamp_start = df_window["timestamp"].iloc[0].isoformat()
-        timestamp_end = df_window["timestamp"].iloc[-1].isoformat()
-        most_anomalous_feature_timestamp = df_window['timestamp'].iloc[anomaly_feature_idx].isoformat()
-        
-        return {
-            "timestamp_start": timestamp_start,
-            "timestamp_end": timestamp_end,
-            "reconstruction_error": recon_error,
-            "most_anomalous_feature": most_anomalous_feature,
-            "message": f"Anomaly in '{most_anomalous_feature}' at {most_anomalous_feature_timestamp}"
-        }
-    
-    # else:
-    #     print("NO ANOMALIES", flush=True)
+    model, threshold, prepared = prepare_window(device_id, raw_data)
+    return score_windows(model, threshold, [prepared])[0]
 
 """
 Generate anomaly message based on type
@@ -1,40 +1,178 @@
 import numpy as np
-import pandas as pd
-from datetime import timedelta
 from app.utils.model_loader import get_forecasting_model
 from app.config.forecast import SEQUENCE_LENGTH
+from app.storage.telemetry_codec import to_epoch_seconds
+from app.utils.scaling import transform, inverse_transform
+from app.utils.metrics import timed, FEATURE_EXTRACTION, MODEL_PREDICT
 
 features = ['voltage', 'current', 'pf', 'minute_sin', 'minute_cos', 'hour_sin', 'hour_cos']
+telemetry_features = ['voltage', 'current', 'pf']
 
-def generate_forecast(device_id, history_data, horizon):
-    history = pd.DataFrame(history_data)
-
-    # Time features
-    history['timestamp'] = pd.to_datetime(history['timestamp'], unit='s')
-    history['minute'] = history['timestamp'].dt.minute
-    history['hour'] = history['timestamp'].dt.hour
-    history['minute_sin'] = np.sin(2 * np.pi * history['minute'] / 60)
-    history['minute_cos'] = np.cos(2 * np.pi * history['minute'] / 60)
-    history['hour_sin'] = np.sin(2 * np.pi * history['hour'] / 24)
-    history['hour_cos'] = np.cos(2 * np.pi * history['hour'] / 24)
-
-    # Select & scale
-    X = history[features].values
-    if len(X) < SEQUENCE_LENGTH:
+# Cyclical time features for every minute of the hour and hour of the day
+MINUTE_SIN = np.sin(2 * np.pi * np.arange(60) / 60)
+MINUTE_COS = np.cos(2 * np.pi * np.arange(60) / 60)
+HOUR_SIN = np.sin(2 * np.pi * np.arange(24) / 24)
+HOUR_COS = np.cos(2 * np.pi * np.arange(24) / 24)
+
+# Columns of a history array (see get_latest_buffer_array)
+HISTORY_FIELDS = ['timestamp', *telemetry_features]
+
+"""
+History entries as an (n, len(HISTORY_FIELDS)) array for forecast_input_array.
+"""
+def history_array(entries):
+    history = np.empty((len(entries), len(HISTORY_FIELDS)), dtype=np.float64)
+    history[:, 0] = np.fromiter((to_epoch_seconds(e['timestamp']) for e in entries), dtype=np.float64, count=len(entries))
+    history[:, 1:] = [[e[col] for col in telemetry_features] for e in entries]
+    return history
+
+"""
+Model input rows (in `features` order) for the newest SEQUENCE_LENGTH
+entries, plus their epoch timestamps. Only that tail is converted.
+"""
+def forecast_input(history_data):
+    if len(history_data) < SEQUENCE_LENGTH:
+        raise ValueError(f"Insufficient history: need at least {SEQUENCE_LENGTH} records")
+    return forecast_input_array(history_array(history_data[-SEQUENCE_LENGTH:]))
+
+"""
+forecast_input for a history array, ascending by timestamp, so callers
+that read arrays never build per-entry dicts.
+"""
+def forecast_input_array(history):
+    if len(history) < SEQUENCE_LENGTH:
         raise ValueError(f"Insufficient history: need at least {SEQUENCE_LENGTH} records")
 
-    # Predict
+    tail = history[-SEQUENCE_LENGTH:]
+    timestamps = tail[:, 0].copy()
+    seconds = np.floor(timestamps).astype(np.int64)
+    minute = (seconds // 60) % 60
+    hour = (seconds // 3600) % 24
+
+    X = np.empty((len(tail), len(features)), dtype=np.float64)
+    X[:, :len(telemetry_features)] = tail[:, 1:]
+    X[:, 3] = MINUTE_SIN[minute]
+    X[:, 4] = MINUTE_COS[minute]
+    X[:, 5] = HOUR_SIN[hour]
+    X[:, 6] = HOUR_COS[hour]
+    return X, timestamps
+
+"""
+ISO timestamps for the `horizon` seconds following last_time (epoch seconds).
+"""
+def future_timestamps(last_time, horizon):
+    whole = float(last_time).is_integer()
+    start = np.datetime64(int(round(last_time * (1 if whole else 1_000_000))), 's' if whole else 'us')
+    steps = start + np.arange(1, horizon + 1) * np.timedelta64(1, 's')
+    return np.datetime_as_string(steps, unit='s' if whole else 'us').tolist()
+
+"""
+Build the scaled model input for one forecast request.
+Returns (model, prepared) where prepared is passed on to predict_forecasts.
+"""
+def prepare_forecast(device_id, history_data, horizon):
+    with timed(FEATURE_EXTRACTION, "features:forecast", task="forecast"):
+        X_seq, timestamps = forecast_input(history_data)
+    return prepare_sequence(device_id, X_seq, timestamps[-1], horizon)
+
+"""
+Scale an unscaled input sequence (rows of forecast_input) for the device's model.
+"""
+def prepare_sequence(device_id, X_seq, last_time, horizon):
     model, scaler_X, scaler_y = get_forecasting_model(device_id, horizon)
-    
-    X_seq = X[-SEQUENCE_LENGTH:]
-    X_scaled = scaler_X.transform(X_seq)
-    X_scaled = np.expand_dims(X_scaled, axis=0)
 
-    y_pred_scaled = model.predict(X_scaled)
-    y_pred = scaler_y.inverse_transform(y_pred_scaled).flatten().tolist()
+    with timed(FEATURE_EXTRACTION, "scaling:forecast", task="forecast"):
+        X_scaled = transform(scaler_X, X_seq, features)
+
+    return model, {
+        "X_scaled": X_scaled,
+        "scaler_y": scaler_y,
+        "last_time": last_time,
+        "horizon": horizon,
+    }
+
+"""
+Run prepared requests that share one model with a single forward pass.
+Returns the predicted powers (1-D array) per request, in order.
+"""
+def predict_powers(model, prepared_requests):
+    X_scaled = np.stack([p["X_scaled"] for p in prepared_requests])
+    with timed(MODEL_PREDICT, "predict:forecast", task="forecast"):
+        y_pred_scaled = model.predict(X_scaled, verbose=0)
+
+    return [
+        inverse_transform(prepared["scaler_y"], y_row[np.newaxis]).flatten()
+        for prepared, y_row in zip(prepared_requests, y_pred_scaled)
+    ]
+
+"""
+Like predict_powers, but returns one forecast (list of {timestamp, power}) per request.
+"""
+def predict_forecasts(model, prepared_requests):
+    return [
+        format_forecast(prepared["last_time"], prepared["horizon"], powers.tolist())
+        for prepared, powers in zip(prepared_requests, predict_powers(model, prepared_requests))
+    ]
+
+def format_forecast(last_time, horizon, y_pred):
+    timestamps = future_timestamps(last_time, horizon)
+    return [{"timestamp": ts, "power": p} for ts, p in zip(timestamps, y_pred)]
+
+def generate_forecast(device_id, history_data, horizon):
+    model, prepared = prepare_forecast(device_id, history_data, horizon)
+    return predict_forecasts(model, [prepared])[0]
+
+"""
+Forecast from an unscaled input sequence (see forecast_input_array)
+whose newest row is at last_time.
+"""
+def forecast_sequence(device_id, X_seq, last_time, horizon):
+    model, prepared = prepare_sequence(device_id, X_seq, last_time, horizon)
+    return predict_forecasts(model, [prepared])[0]
+
+"""
+Prepare every request with prepare(*request), then run each group of
+requests sharing a model through predict(model, prepared_requests).
+Returns, per request, either its result or the exception it raised.
+"""
+def _predict_grouped(requests, prepare, predict):
+    results = [None] * len(requests)
+    groups = {}
+
+    for i, request in enumerate(requests):
+        try:
+            model, prepared = prepare(*request)
+        except Exception as e:
+            results[i] = e
+            continue
+        group = groups.setdefault(id(model), (model, []))
+        group[1].append((i, prepared))
+
+    for model, items in groups.values():
+        try:
+            outputs = predict(model, [prepared for _, prepared in items])
+        except Exception as e:
+            outputs = [e] * len(items)
+        for (i, _), output in zip(items, outputs):
+            results[i] = output
+
+    return results
 
-    # Future timestamps
-    last_time = history['timestamp'].iloc[-1]
-    future_timestamps = [(last_time + timedelta(seconds=i+1)).isoformat() for i in range(horizon)]
+"""
+Forecast many (device_id, history_data, horizon) requests.
+Requests are grouped by model so each model runs one batched predict call.
+Returns, per request, either the forecast or the exception it raised.
+"""
+def generate_forecasts(requests):
+    return _predict_grouped(requests, prepare_forecast, predict_forecasts)
 
-    return [{"timestamp": ts, "power": p} for ts, p in zip(future_timestamps, y_pred)]
+"""
+Predicted powers for many (device_id, X_seq, horizon) requests, where X_seq
+is the unscaled output of forecast_input; grouped by model like generate_forecasts.
+"""
+def predict_sequences(requests):
+    return _predict_grouped(
+        requests,
+        lambda device_id, X_seq, horizon: prepare_sequence(device_id, X_seq, None, horizon),
+        predict_powers,
+    )
@@ -0,0 +1,127 @@
+import threading
+import time
+import traceback
+from collections import OrderedDict
+from app.modules.forecast import generate_forecasts
+from app.storage.telemetry_buffer import get_latest_buffers
+from app.storage.precomputed_forecasts import store_many
+from app.storage.telemetry_codec import to_epoch_seconds
+from app.config.forecast import ALLOWED_HORIZONS, SEQUENCE_LENGTH
+
+class ForecastPrecomputer:
+    """
+    Recomputes every horizon's forecast for devices with enough new telemetry.
+
+    notify(device_id, timestamp) is called for every buffered sample. Once a
+    device has every_seconds of data newer than its last precompute it becomes
+    due. It is recomputed when at least min_interval seconds have passed since
+    its last run. A due device takes a single slot however many samples it
+    sends, so a noisy device cannot crowd out the others. Due devices are run
+    in arrival order, up to batch_size at a time. Each batch takes one history
+    read and one predict call per model.
+    """
+
+    def __init__(self, every_seconds, min_interval, batch_size, stats_interval=0):
+        self.every_seconds = every_seconds
+        self.min_interval = min_interval
+        self.batch_size = batch_size
+        self.stats_interval = stats_interval
+        self._based_on = {}  # device_id -> newest timestamp used by its last run
+        self._last_run = {}  # device_id -> time.monotonic() of its last run
+        self._due = OrderedDict()
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._reset_stats()
+
+    def _reset_stats(self):
+        self._stats = {"batches": 0, "devices": 0, "forecasts": 0, "errors": 0}
+        self._stats_since = time.monotonic()
+
+    def notify(self, device_id, timestamp):
+        with self._lock:
+            based_on = self._based_on.get(device_id)
+            if device_id in self._due or (based_on is not None and timestamp - based_on < self.every_seconds):
+                return
+            self._due[device_id] = True
+        self._wakeup.set()
+
+    def _take_batch(self):
+        """
+        Up to batch_size due devices whose rate limit has passed, and the
+        seconds until the next rate-limited one is allowed.
+        """
+        now = time.monotonic()
+        batch, wait = [], None
+        with self._lock:
+            for device_id in list(self._due):
+                if len(batch) >= self.batch_size:
+                    break
+                ready_in = self._last_run.get(device_id, float("-inf")) + self.min_interval - now
+                if ready_in > 0:
+                    wait = ready_in if wait is None else min(wait, ready_in)
+                    continue
+                del self._due[device_id]
+                self._last_run[device_id] = now
+                batch.append(device_id)
+        return batch, wait
+
+    def run_batch(self, device_ids):
+        histories = get_latest_buffers(device_ids, seconds_prior=SEQUENCE_LENGTH)
+        requests, last_timestamps = [], {}
+        for device_id in device_ids:
+            history = histories.get(device_id, [])
+            if len(history) < SEQUENCE_LENGTH:
+                continue
+            last_timestamps[device_id] = to_epoch_seconds(history[-1]["timestamp"])
+            requests.extend((device_id, history, horizon) for horizon in ALLOWED_HORIZONS)
+
+        results, errors = [], 0
+        for (device_id, _, horizon), forecast in zip(requests, generate_forecasts(requests)):
+            if isinstance(forecast, Exception):
+                errors += 1
+                print(f"[forecast_precompute] {device_id}/{horizon}s failed: {forecast!r}", flush=True)
+                continue
+            results.append((device_id, horizon, last_timestamps[device_id], forecast))
+        if results:
+            store_many(results)
+
+        with self._lock:
+            for device_id, last_timestamp in last_timestamps.items():
+                self._based_on[device_id] = last_timestamp
+            self._stats["batches"] += 1
+            self._stats["devices"] += len(device_ids)
+            self._stats["forecasts"] += len(results)
+            self._stats["errors"] += errors
+
+    def _maybe_log_stats(self):
+        elapsed = time.monotonic() - self._stats_since
+        if not self.stats_interval or elapsed < self.stats_interval:
+            return
+        with self._lock:
+            stats = dict(self._stats, due=len(self._due))
+            self._reset_stats()
+        print(
+            f"[forecast_precompute] {stats['batches']} batches, {stats['devices']} devices, "
+            f"{stats['forecasts']} forecasts, {stats['errors']} errors, {stats['due']} due",
+            flush=True,
+        )
+
+    def run(self):
+        while True:
+            self._wakeup.clear()
+            batch, wait = self._take_batch()
+            if batch:
+                try:
+                    self.run_batch(batch)
+                except Exception:
+                    traceback.print_exc()
+                    with self._lock:
+                        self._stats["errors"] += 1
+            else:
+                self._wakeup.wait(wait if wait is not None else 1.0)
+            self._maybe_log_stats()
+
+    def start(self):
+        thread = threading.Thread(target=self.run, name="forecast-precompute", daemon=True)
+        thread.start()
+        return thread
@@ -0,0 +1,162 @@
+import queue
+import threading
+import time
+import traceback
+from app.modules.anomaly_detection import prepare_window, score_windows
+from app.utils.metrics import MESSAGE_TO_DETECTION, MESSAGE_TO_PUBLISH, DROPPED_WINDOWS
+
+class AnomalyBatchScheduler:
+    """
+    Collects ready windows from many devices and scores them in micro-batches.
+
+    A batch closes when max_batch_size windows are pending or max_delay_ms has
+    passed since its first window arrived. Windows are grouped by model so each
+    model gets one forward pass per batch; results go to on_result(device_id, result)
+    for every window flagged as anomalous.
+    """
+
+    def __init__(self, on_result, max_batch_size, max_delay_ms, queue_size, stats_interval=0):
+        self.on_result = on_result
+        self.max_batch_size = max_batch_size
+        self.max_delay = max_delay_ms / 1000
+        self.stats_interval = stats_interval
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._lock = threading.Lock()
+        self._reset_stats()
+
+    def _reset_stats(self):
+        self._stats = {
+            "batches": 0,
+            "windows": 0,
+            "dropped": 0,
+            "errors": 0,
+            "fill_ratio_sum": 0.0,
+            "queue_latency_sum": 0.0,
+            "queue_latency_max": 0.0,
+        }
+        self._stats_since = time.monotonic()
+
+    def submit(self, device_id, window, features=None, received_at=None):
+        """
+        Queue a window without blocking; the oldest pending window is dropped when full.
+        features optionally carries a precomputed feature row for the window;
+        received_at (time.monotonic()) is when its triggering message arrived.
+        """
+        now = time.monotonic()
+        item = (device_id, window, features, now, received_at or now)
+        try:
+            self._queue.put_nowait(item)
+        except queue.Full:
+            try:
+                dropped_device_id = self._queue.get_nowait()[0]
+                DROPPED_WINDOWS.inc()
+                with self._lock:
+                    self._stats["dropped"] += 1
+                print(f"Inference queue full, dropped window for {dropped_device_id}", flush=True)
+            except queue.Empty:
+                pass
+            self._queue.put_nowait(item)
+
+    def pending(self):
+        return self._queue.qsize()
+
+    def stats(self):
+        """
+        Snapshot of batching metrics since the last reset.
+        """
+        with self._lock:
+            s = dict(self._stats)
+        batches = s["batches"] or 1
+        windows = s["windows"] or 1
+        return {
+            "batches": s["batches"],
+            "windows": s["windows"],
+            "dropped": s["dropped"],
+            "errors": s["errors"],
+            "pending": self.pending(),
+            "avg_batch_fill_ratio": s["fill_ratio_sum"] / batches,
+            "avg_queue_latency_ms": s["queue_latency_sum"] / windows * 1000,
+            "max_queue_latency_ms": s["queue_latency_max"] * 1000,
+        }
+
+    def _collect_batch(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_delay
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _record_batch(self, batch, started_at):
+        latencies = [started_at - enqueued_at for _, _, _, enqueued_at, _ in batch]
+        with self._lock:
+            self._stats["batches"] += 1
+            self._stats["windows"] += len(batch)
+            self._stats["fill_ratio_sum"] += len(batch) / self.max_batch_size
+            self._stats["queue_latency_sum"] += sum(latencies)
+            self._stats["queue_latency_max"] = max(self._stats["queue_latency_max"], *latencies)
+
+    def _record_error(self):
+        with self._lock:
+            self._stats["errors"] += 1
+
+    def process_batch(self, batch):
+        # Group windows by model instance: devices sharing an artifact share
+        # one forward pass, each window keeping its own device's threshold
+        groups = {}
+        for device_id, window, features, _, received_at in batch:
+            try:
+                model, threshold, prepared = prepare_window(device_id, window, features)
+            except Exception as e:
+                self._record_error()
+                print(f"Error preparing window for {device_id}: {e}", flush=True)
+                continue
+            group = groups.setdefault(id(model), (model, []))
+            group[1].append((device_id, threshold, prepared, received_at))
+
+        for model, items in groups.values():
+            try:
+                results = score_windows(
+                    model,
+                    [threshold for _, threshold, _, _ in items],
+                    [prepared for _, _, prepared, _ in items],
+                )
+            except Exception:
+                self._record_error()
+                traceback.print_exc()
+                continue
+
+            scored_at = time.monotonic()
+            for (device_id, _, _, received_at), result in zip(items, results):
+                MESSAGE_TO_DETECTION.observe(scored_at - received_at)
+                if result:
+                    self.on_result(device_id, result)
+                    MESSAGE_TO_PUBLISH.observe(time.monotonic() - received_at)
+
+    def _maybe_log_stats(self):
+        if not self.stats_interval or time.monotonic() - self._stats_since < self.stats_interval:
+            return
+        print(f"[inference] {self.stats()}", flush=True)
+        with self._lock:
+            self._reset_stats()
+
+    def run(self):
+        while True:
+            batch = self._collect_batch()
+            self._record_batch(batch, time.monotonic())
+            try:
+                self.process_batch(batch)
+            except Exception:
+                self._record_error()
+                traceback.print_exc()
+            self._maybe_log_stats()
+
+    def start(self):
+        thread = threading.Thread(target=self.run, name="anomaly-batch-scheduler", daemon=True)
+        thread.start()
+        return thread
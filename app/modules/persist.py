@@ -1,6 +1,204 @@
+from psycopg2.extras import execute_values
+from app.storage.database import connection
+from app.storage.telemetry_codec import to_epoch_seconds
+from app.config.anomaly_detection import TELEMETRIES
+from app.config.persist import ROLLUP_RESOLUTIONS, HISTORY_MAX_ROWS
+from app.config.archive import ARCHIVE_HISTORY
+from app.storage import telemetry_archive
 
+ROLLUP_STATS = ["min", "max", "sum"]
+ROLLUP_COLUMNS = [f"{col}_{stat}" for col in TELEMETRIES for stat in ROLLUP_STATS]
+
+"""
+One row per device, resolution (bucket seconds) and bucket start. The mean
+is sum / sample_count, so coarser levels and partial buckets merge exactly.
 """
-Get persisted telemetry data from database
+ROLLUP_SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS telemetry_rollups (
+    device_id TEXT NOT NULL,
+    resolution INT NOT NULL,
+    bucket TIMESTAMP NOT NULL,
+    sample_count INT NOT NULL,
+    {", ".join(f"{column} FLOAT" for column in ROLLUP_COLUMNS)},
+    PRIMARY KEY (device_id, resolution, bucket)
+);
 """
-def get_persist(device_id: str, starts_at):
-    return None
+
+def _bucket(epoch_expr, resolution):
+    return f"(to_timestamp(floor({epoch_expr} / {resolution}) * {resolution}) AT TIME ZONE 'UTC')"
+
+def _upsert_rollup_sql(resolution, select_columns, source, where):
+    updates = ", ".join(f"{c} = EXCLUDED.{c}" for c in ["sample_count"] + ROLLUP_COLUMNS)
+    return f"""
+        INSERT INTO telemetry_rollups (device_id, resolution, bucket, sample_count, {", ".join(ROLLUP_COLUMNS)})
+        SELECT src.device_id, {resolution}, {_bucket("extract(epoch from src.ts)", resolution)}, {select_columns}
+        FROM {source} src
+        JOIN (VALUES %s) AS touched (device_id, since) ON src.device_id = touched.device_id
+        WHERE {where} AND src.ts >= {_bucket("touched.since", resolution)}
+        GROUP BY 1, 3
+        ON CONFLICT (device_id, resolution, bucket) DO UPDATE SET {updates}
+    """
+
+def rollup_statements():
+    """
+    Upserts that rebuild every touched bucket, finest level first.
+    The finest level is computed from raw samples and the coarser levels from it,
+    so reruns overwrite buckets with the same values instead of adding to them.
+    """
+    finest, *coarser = sorted(ROLLUP_RESOLUTIONS)
+    from_samples = ", ".join(
+        ["count(*)"] + [f"min(src.{col}), max(src.{col}), sum(src.{col})" for col in TELEMETRIES]
+    )
+    from_rollups = ", ".join(
+        ["sum(src.sample_count)"]
+        + [f"min(src.{col}_min), max(src.{col}_max), sum(src.{col}_sum)" for col in TELEMETRIES]
+    )
+    rollup_source = "(SELECT *, bucket AS ts FROM telemetry_rollups)"
+
+    statements = [_upsert_rollup_sql(finest, from_samples, "telemetry_samples", "TRUE")]
+    for resolution in coarser:
+        statements.append(_upsert_rollup_sql(
+            resolution, from_rollups, rollup_source, f"src.resolution = {finest}"
+        ))
+    return statements
+
+def update_rollups(cur, touched):
+    """
+    Recompute the rollup buckets covering samples at or after touched[device_id]
+    (epoch seconds), inside the caller's transaction.
+    """
+    values = list(touched.items())
+    if not values:
+        return
+    for sql in rollup_statements():
+        execute_values(cur, sql, values, template="(%s, %s::float8)")
+
+SAMPLE_SELECT = f"extract(epoch from ts), {', '.join(TELEMETRIES)}, is_on"
+
+def _sample_entry(row):
+    entry = {"timestamp": float(row[0])}
+    entry.update(zip(TELEMETRIES, row[1:-1]))
+    entry["is_on"] = row[-1]
+    return entry
+
+"""
+Get persisted telemetry data from database.
+Entries are shaped like buffered ones, ascending, with
+starts_at < timestamp < ends_before; limit keeps the newest entries.
+"""
+def get_persist(device_id: str, starts_at=None, ends_before=None, limit=None):
+    conditions, params = ["device_id = %s"], [device_id]
+    if starts_at is not None:
+        conditions.append("ts > (to_timestamp(%s) AT TIME ZONE 'UTC')")
+        params.append(to_epoch_seconds(starts_at))
+    if ends_before is not None:
+        conditions.append("ts < (to_timestamp(%s) AT TIME ZONE 'UTC')")
+        params.append(to_epoch_seconds(ends_before))
+    params.append(limit or HISTORY_MAX_ROWS)
+
+    with connection() as conn, conn.cursor() as cur:
+        cur.execute(
+            f"""
+            SELECT {SAMPLE_SELECT} FROM telemetry_samples
+            WHERE {" AND ".join(conditions)}
+            ORDER BY ts DESC LIMIT %s
+            """,
+            params,
+        )
+        rows = cur.fetchall()
+    return [_sample_entry(row) for row in reversed(rows)]
+
+"""
+Coarsest resolution (seconds, 1 for raw samples) that still yields at
+least `points` buckets over [start, end].
+"""
+def choose_resolution(start: float, end: float, points: int):
+    span = max(end - start, 0)
+    candidates = [r for r in ROLLUP_RESOLUTIONS if span / r >= points]
+    return max(candidates) if candidates else 1
+
+"""
+Downsampled history between start and end (epoch seconds).
+Returns (resolution, points) where each point has timestamp, count and
+{min, max, mean, sum} per telemetry.
+"""
+def get_history(device_id: str, start: float, end: float, points: int):
+    resolution = choose_resolution(start, end, points)
+    if ARCHIVE_HISTORY:
+        return resolution, get_archived_history(device_id, start, end, resolution)
+    if resolution == 1:
+        samples = get_persist(device_id, starts_at=start, ends_before=end)
+        return resolution, [
+            {
+                "timestamp": e["timestamp"],
+                "count": 1,
+                **{
+                    col: {"min": e[col], "max": e[col], "mean": e[col], "sum": e[col]}
+                    for col in TELEMETRIES
+                },
+            }
+            for e in samples
+        ]
+
+    with connection() as conn, conn.cursor() as cur:
+        cur.execute(
+            f"""
+            SELECT extract(epoch from bucket), sample_count, {", ".join(ROLLUP_COLUMNS)}
+            FROM telemetry_rollups
+            WHERE device_id = %s AND resolution = %s
+              AND bucket >= {_bucket("%s", resolution)}
+              AND bucket <= (to_timestamp(%s) AT TIME ZONE 'UTC')
+            ORDER BY bucket
+            LIMIT %s
+            """,
+            (device_id, resolution, float(start), float(end), HISTORY_MAX_ROWS),
+        )
+        rows = cur.fetchall()
+
+    history = []
+    for row in rows:
+        count = row[1]
+        point = {"timestamp": float(row[0]), "count": count}
+        for i, col in enumerate(TELEMETRIES):
+            low, high, total = row[2 + 3 * i: 5 + 3 * i]
+            mean = total / count if count and total is not None else None
+            point[col] = {"min": low, "max": high, "mean": mean, "sum": total}
+        history.append(point)
+    return resolution, history
+
+"""
+Same points as get_history, computed from the columnar archive: raw samples
+for resolution 1, otherwise buckets aggregated chunk by chunk with NumPy.
+"""
+def get_archived_history(device_id: str, start: float, end: float, resolution: int):
+    if resolution == 1:
+        samples = telemetry_archive.read_array(device_id, start, end, ["timestamp"] + TELEMETRIES)
+        samples = samples[samples[:, 0] > start][-HISTORY_MAX_ROWS:]
+        return [
+            {
+                "timestamp": float(row[0]),
+                "count": 1,
+                **{
+                    col: {"min": value, "max": value, "mean": value, "sum": value}
+                    for col, value in zip(TELEMETRIES, (None if v != v else v for v in row[1:].tolist()))
+                },
+            }
+            for row in samples
+        ]
+
+    first_bucket = start // resolution * resolution
+    buckets, counts, mins, maxs, sums, valid = telemetry_archive.bucket_stats(
+        device_id, first_bucket, (end // resolution + 1) * resolution, resolution, TELEMETRIES,
+    )
+    history = []
+    for i in range(min(len(buckets), HISTORY_MAX_ROWS)):
+        count = int(counts[i])
+        point = {"timestamp": float(buckets[i]), "count": count}
+        for j, col in enumerate(TELEMETRIES):
+            if not valid[i, j]:
+                point[col] = {"min": None, "max": None, "mean": None, "sum": None}
+                continue
+            total = float(sums[i, j])
+            point[col] = {"min": float(mins[i, j]), "max": float(maxs[i, j]), "mean": total / count, "sum": total}
+        history.append(point)
+    return history
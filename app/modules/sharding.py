@@ -0,0 +1,110 @@
+"""
+Device assignment for a fleet of anomaly worker replicas.
+
+Replicas hold leases in a Redis sorted set (member = worker id, score =
+lease expiry) and renew them every SHARD_HEARTBEAT_INTERVAL. Every replica
+builds the same consistent-hash ring from the live members, so each device
+has exactly one owner. When a replica joins, leaves or its lease expires,
+only the devices on its arcs of the ring move. Replicas see a rebalance up
+to a heartbeat apart, so the previous owner of a moved device keeps
+handing it over for a lease TTL plus one heartbeat.
+"""
+import bisect
+import hashlib
+import threading
+import time
+import traceback
+from app.config.sharding import (
+    SHARD_HEARTBEAT_INTERVAL, SHARD_LEASE_TTL, SHARD_VNODES, SHARD_MEMBERS_KEY,
+)
+
+def _hash(value: str) -> int:
+    return int.from_bytes(hashlib.blake2b(value.encode(), digest_size=8).digest(), "big")
+
+class HashRing:
+    def __init__(self, members, vnodes=SHARD_VNODES):
+        self.members = frozenset(members)
+        points = sorted((_hash(f"{member}#{i}"), member) for member in self.members for i in range(vnodes))
+        self._points = [point for point, _ in points]
+        self._owners = [member for _, member in points]
+
+    def owner(self, key: str):
+        if not self._points:
+            return None
+        i = bisect.bisect(self._points, _hash(key)) % len(self._points)
+        return self._owners[i]
+
+class ShardMembership:
+    """
+    This replica's lease and view of the fleet.
+    on_change(ring) is called from the heartbeat thread after a rebalance.
+    """
+
+    def __init__(self, redis_client, worker_id, on_change=None,
+                 heartbeat_interval=SHARD_HEARTBEAT_INTERVAL, lease_ttl=SHARD_LEASE_TTL):
+        self.r = redis_client
+        self.worker_id = worker_id
+        self.on_change = on_change
+        self.heartbeat_interval = heartbeat_interval
+        self.lease_ttl = lease_ttl
+        # Until the first heartbeat this replica owns everything it sees
+        self.ring = HashRing([worker_id])
+        # The ring before the last rebalance, and when handing over from it ends
+        self.previous_ring = None
+        self._handover_until = 0.0
+        self._stopped = threading.Event()
+
+    def owns(self, device_id: str) -> bool:
+        return self.ring.owner(device_id) == self.worker_id
+
+    def handing_over(self, device_id: str) -> bool:
+        """
+        Whether this replica owned the device before the last rebalance and
+        the rest of the fleet may not have caught up yet.
+        """
+        previous = self.previous_ring
+        return (
+            previous is not None
+            and time.monotonic() < self._handover_until
+            and previous.owner(device_id) == self.worker_id
+        )
+
+    def heartbeat(self):
+        """
+        Renew this replica's lease, drop expired ones and rebuild the ring if the fleet changed.
+        """
+        now = time.time()
+        pipe = self.r.pipeline(transaction=True)
+        pipe.zadd(SHARD_MEMBERS_KEY, {self.worker_id: now + self.lease_ttl})
+        pipe.zremrangebyscore(SHARD_MEMBERS_KEY, "-inf", now)
+        pipe.zrange(SHARD_MEMBERS_KEY, 0, -1)
+        members = {member.decode() for member in pipe.execute()[-1]} | {self.worker_id}
+
+        if members != self.ring.members:
+            self.previous_ring = self.ring
+            self._handover_until = time.monotonic() + self.lease_ttl + self.heartbeat_interval
+            self.ring = HashRing(members)
+            print(f"[sharding] {self.worker_id}: fleet is now {sorted(members)}", flush=True)
+            if self.on_change:
+                self.on_change(self.ring)
+
+    def leave(self):
+        """
+        Give up the lease so the other replicas take over right away.
+        """
+        self._stopped.set()
+        self.r.zrem(SHARD_MEMBERS_KEY, self.worker_id)
+
+    def run(self):
+        while not self._stopped.is_set():
+            try:
+                self.heartbeat()
+            except Exception:
+                traceback.print_exc()
+            self._stopped.wait(self.heartbeat_interval)
+
+    def start(self):
+        self.heartbeat()
+        thread = threading.Thread(target=self.run, name="shard-membership", daemon=True)
+        thread.start()
+        return thread
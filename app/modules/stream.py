@@ -0,0 +1,156 @@
+import asyncio
+import time
+import traceback
+from datetime import datetime, timezone
+from app.storage.telemetry_buffer import update_channel
+from app.storage.telemetry_codec import decode, to_epoch_seconds
+from app.config.buffer import UPDATE_CHANNEL_PREFIX
+from app.utils import fast_json
+from app.config.stream import STREAM_FORECAST_INTERVAL, STREAM_CLIENT_QUEUE_SIZE
+
+def format_power_point(entry):
+    return {
+        "timestamp": datetime.fromtimestamp(to_epoch_seconds(entry["timestamp"]), tz=timezone.utc).replace(tzinfo=None).isoformat(),
+        "power": float(entry.get("power", 0.0)),
+    }
+
+def sse_event(event, data, event_id=None):
+    """
+    One Server-Sent Events frame.
+    """
+    frame = f"event: {event}\n"
+    if event_id is not None:
+        frame += f"id: {event_id}\n"
+    return frame + f"data: {fast_json.dumps(data).decode()}\n\n"
+
+class Subscription:
+    """
+    One connected client: receives ("telemetry", entry), ("forecast", payload)
+    and finally ("close", reason) events on its queue.
+    """
+
+    def __init__(self, device_id, horizon=None):
+        self.device_id = device_id
+        self.horizon = horizon
+        self.queue = asyncio.Queue(maxsize=STREAM_CLIENT_QUEUE_SIZE)
+        self.closed = False
+
+    def push(self, event):
+        if self.closed:
+            return
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # Too slow to keep up: drop the client, it reconnects with its cursor
+            self.closed = True
+            self.queue.get_nowait()
+            self.queue.put_nowait(("close", "slow consumer"))
+
+class TelemetryHub:
+    """
+    Fans newly buffered telemetry out to every streaming client in this process.
+
+    Each device with at least one viewer costs one channel on a single shared
+    pub/sub connection, however many clients watch it. Forecast updates are
+    computed once per device and horizon, at most every STREAM_FORECAST_INTERVAL
+    seconds, and shared by all viewers of that horizon.
+    """
+
+    def __init__(self, redis, forecast_fn):
+        self.redis = redis
+        self.forecast_fn = forecast_fn
+        self._pubsub = None
+        self._reader = None
+        self._subscribers = {}
+        self._forecasts = {}
+        self._lock = asyncio.Lock()
+
+    async def subscribe(self, device_id, horizon=None):
+        subscription = Subscription(device_id, horizon)
+        async with self._lock:
+            viewers = self._subscribers.setdefault(device_id, set())
+            if not viewers:
+                if self._pubsub is None:
+                    self._pubsub = self.redis.pubsub(ignore_subscribe_messages=True)
+                await self._pubsub.subscribe(update_channel(device_id))
+                if self._reader is None:
+                    self._reader = asyncio.create_task(self._read_loop())
+            viewers.add(subscription)
+        return subscription
+
+    async def unsubscribe(self, subscription):
+        async with self._lock:
+            viewers = self._subscribers.get(subscription.device_id)
+            if viewers is None:
+                return
+            viewers.discard(subscription)
+            if not viewers:
+                del self._subscribers[subscription.device_id]
+                if not self._subscribers:
+                    # Nothing left to read; restarted by the next subscribe
+                    self._reader.cancel()
+                    self._reader = None
+                await self._pubsub.unsubscribe(update_channel(subscription.device_id))
+
+    def stats(self):
+        return {
+            "devices": len(self._subscribers),
+            "clients": sum(len(viewers) for viewers in self._subscribers.values()),
+        }
+
+    async def _read_loop(self):
+        prefix = f"{UPDATE_CHANNEL_PREFIX}:"
+        while True:
+            try:
+                message = await self._pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+                if message is None:
+                    continue
+                channel = message["channel"].decode()
+                self._dispatch(channel[len(prefix):], message["data"])
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                traceback.print_exc()
+                await asyncio.sleep(1)
+
+    def _dispatch(self, device_id, raw):
+        viewers = self._subscribers.get(device_id)
+        if not viewers:
+            return
+        try:
+            entry = decode(raw)
+        except Exception as e:
+            print(f"[stream] Failed to parse entry for {device_id}: {e}", flush=True)
+            return
+
+        for subscription in list(viewers):
+            subscription.push(("telemetry", entry))
+
+        for horizon in {s.horizon for s in viewers if s.horizon is not None}:
+            self._maybe_refresh_forecast(device_id, horizon)
+
+    def _maybe_refresh_forecast(self, device_id, horizon):
+        state = self._forecasts.setdefault((device_id, horizon), {"last": 0.0, "task": None})
+        if state["task"] is not None or time.monotonic() - state["last"] < STREAM_FORECAST_INTERVAL:
+            return
+        state["last"] = time.monotonic()
+        state["task"] = asyncio.create_task(self._refresh_forecast(device_id, horizon, state))
+
+    async def _refresh_forecast(self, device_id, horizon, state):
+        try:
+            forecast = await self.forecast_fn(device_id, horizon)
+            payload = {"horizon": horizon, "forecast": forecast}
+            for subscription in list(self._subscribers.get(device_id, ())):
+                if subscription.horizon == horizon:
+                    subscription.push(("forecast", payload))
+        except Exception as e:
+            # Not enough data yet or inference saturated: next sample retries
+            print(f"[stream] Forecast refresh for {device_id}/{horizon}s skipped: {e!r}", flush=True)
+        finally:
+            state["task"] = None
+
+    async def close(self):
+        if self._reader is not None:
+            self._reader.cancel()
+        if self._pubsub is not None:
+            await self._pubsub.aclose()
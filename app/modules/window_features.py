@@ -0,0 +1,137 @@
+import numpy as np
+from app.config.anomaly_detection import TELEMETRIES, WINDOW_SIZE
+from app.storage.telemetry_codec import to_epoch_seconds
+
+# Per-channel statistics, in the order the anomaly scaler was trained on
+FEATURE_STATS = ["mean", "std", "min", "max", "trend"]
+FEATURE_COLUMNS = [f"{col}_{stat}" for col in TELEMETRIES for stat in FEATURE_STATS]
+
+"""
+Convert window entries (dicts) into (timestamps, values) arrays sorted by time.
+values has shape (window, len(TELEMETRIES)).
+"""
+def window_to_array(raw_data):
+    if not raw_data:
+        raise ValueError("Raw data is empty. Cannot perform anomaly detection.")
+
+    try:
+        timestamps = np.array([to_epoch_seconds(entry["timestamp"]) for entry in raw_data], dtype=np.float64)
+        values = np.array([[entry[col] for col in TELEMETRIES] for entry in raw_data], dtype=np.float64)
+    except KeyError as e:
+        raise ValueError(f"Telemetry entry is missing field {e}")
+
+    order = np.argsort(timestamps, kind="stable")
+    return timestamps[order], values[order]
+
+"""
+Feature matrix for a stack of windows.
+windows: (n_windows, window, channels) array, channels in TELEMETRIES order.
+Returns (n_windows, len(FEATURE_COLUMNS)) with pandas semantics
+(sample std with ddof=1, NaNs skipped).
+"""
+def extract_features_array(windows):
+    windows = np.asarray(windows, dtype=np.float64)
+    if np.isnan(windows).any():
+        mean, std = np.nanmean(windows, axis=1), np.nanstd(windows, axis=1, ddof=1)
+        low, high = np.nanmin(windows, axis=1), np.nanmax(windows, axis=1)
+    else:
+        mean, std = windows.mean(axis=1), windows.std(axis=1, ddof=1)
+        low, high = windows.min(axis=1), windows.max(axis=1)
+    trend = windows[:, -1, :] - windows[:, 0, :]
+
+    # (n, stats, channels) -> (n, channels, stats) -> flat: col-major per channel
+    stacked = np.stack([mean, std, low, high, trend], axis=1)
+    return stacked.transpose(0, 2, 1).reshape(len(windows), -1)
+
+class RollingWindowFeatures:
+    """
+    Incrementally maintained window features for one device.
+
+    Keeps the last `window_size` samples in a ring buffer together with running
+    sums and sums of squares (shifted by the first sample for numerical
+    stability), so pushing STEP_SIZE new samples costs O(STEP_SIZE) instead of
+    recomputing every reduction over the whole window.
+    """
+
+    def __init__(self, window_size=WINDOW_SIZE, channels=len(TELEMETRIES)):
+        self.window_size = window_size
+        self.values = np.zeros((window_size, channels), dtype=np.float64)
+        self.timestamps = np.zeros(window_size, dtype=np.float64)
+        self.reset()
+
+    def reset(self):
+        self.count = 0
+        self.head = 0  # next write position
+        self.shift = None
+        self.sums = np.zeros(self.values.shape[1], dtype=np.float64)
+        self.sq_sums = np.zeros(self.values.shape[1], dtype=np.float64)
+        self.pushes_since_resync = 0
+
+    @property
+    def last_timestamp(self):
+        if self.count == 0:
+            return None
+        return self.timestamps[(self.head - 1) % self.window_size]
+
+    @property
+    def full(self):
+        return self.count == self.window_size
+
+    def push(self, timestamps, values):
+        """
+        Append samples (ascending timestamps, shape (k, channels)).
+        """
+        values = np.asarray(values, dtype=np.float64).reshape(-1, self.values.shape[1])
+        if np.isnan(values).any():
+            raise ValueError("RollingWindowFeatures does not accept missing values")
+        if self.shift is None and len(values):
+            self.shift = values[0].copy()
+
+        for ts, row in zip(timestamps, values):
+            shifted = row - self.shift
+            if self.full:
+                evicted = self.values[self.head] - self.shift
+                self.sums -= evicted
+                self.sq_sums -= evicted * evicted
+            else:
+                self.count += 1
+            self.values[self.head] = row
+            self.timestamps[self.head] = ts
+            self.sums += shifted
+            self.sq_sums += shifted * shifted
+            self.head = (self.head + 1) % self.window_size
+
+        # Re-derive the running sums once per window to bound float drift
+        self.pushes_since_resync += len(values)
+        if self.full and self.pushes_since_resync >= self.window_size:
+            shifted = self.values - self.shift
+            self.sums = shifted.sum(axis=0)
+            self.sq_sums = (shifted * shifted).sum(axis=0)
+            self.pushes_since_resync = 0
+
+    def ordered(self):
+        """
+        (timestamps, values) oldest first.
+        """
+        if not self.full:
+            return self.timestamps[:self.count], self.values[:self.count]
+        idx = np.roll(np.arange(self.window_size), -self.head)
+        return self.timestamps[idx], self.values[idx]
+
+    def features(self):
+        """
+        One feature row, identical in layout to extract_features_array.
+        """
+        if self.count < 2:
+            raise ValueError("Need at least two samples to compute window features")
+
+        n = self.count
+        timestamps, values = self.ordered()
+        mean_shifted = self.sums / n
+        var = (self.sq_sums - n * mean_shifted * mean_shifted) / (n - 1)
+
+        mean = mean_shifted + self.shift
+        std = np.sqrt(np.maximum(var, 0.0))
+        low, high = values.min(axis=0), values.max(axis=0)
+        trend = values[-1] - values[0]
+        return np.stack([mean, std, low, high, trend], axis=1).reshape(1, -1)
@@ -1,18 +1,156 @@
-from fastapi import FastAPI, HTTPException, Query
+import asyncio
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Query, Request
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from pydantic import BaseModel
 from datetime import datetime, timezone
-from app.modules.forecast import generate_forecast
-# from app.modules.persist import get_persist as get_persisted_telemetry
-from app.config.forecast import ALLOWED_HORIZONS, SEQUENCE_LENGTH
-from app.storage.telemetry_buffer import get_latest_buffer
+import numpy as np
+from app.modules.forecast import (
+    HISTORY_FIELDS, forecast_input_array, forecast_sequence, format_forecast, generate_forecasts, history_array,
+)
+from app.modules.stream import TelemetryHub, format_power_point, sse_event
+from app.modules.persist import get_persist as get_persisted_telemetry, get_history
+from app.config.forecast import (
+    ALLOWED_HORIZONS, SEQUENCE_LENGTH, FORECAST_CACHE_ENABLED, FORECAST_BATCH_MAX_ITEMS,
+    FORECAST_PERSISTED_FALLBACK, FORECAST_PRECOMPUTED,
+)
+from app.config.persist import HISTORY_DEFAULT_POINTS, HISTORY_MAX_ROWS
+from app.config.stream import STREAM_BACKFILL_SECONDS, STREAM_HEARTBEAT_INTERVAL
+from app.config.inference import INFERENCE_BACKEND
+from app.config.anomaly_detection import TELEMETRIES
+from app.interfaces.forecast_batch import ForecastBatchRequest
+from app.storage import async_telemetry_buffer as telemetry_buffer
+from app.storage import forecast_cache
+from app.storage import precomputed_forecasts
+from app.storage import database
+from app.storage.telemetry_codec import to_epoch_seconds
+from app.storage.model_cache import model_cache
+from app.utils.model_loader import preload_models
+from app.utils import inference_executor, inference_pool
+from app.utils import metrics
+from app.utils import fast_json
+from app.utils.inference_executor import InferenceOverloaded, run_inference
 import traceback
 
-app = FastAPI(title="CermatListrik Inference Server", version="1.0")
+@asynccontextmanager
+async def lifespan(app):
+    if INFERENCE_BACKEND == "process":
+        # Model hosts preload their own share of the models
+        inference_pool.pool.start()
+    else:
+        # Warm forecasting models so first requests skip the load_model hit
+        await asyncio.to_thread(preload_models, None, True, False)
+    yield
+    await hub.close()
+    inference_executor.shutdown()
+    inference_pool.pool.close()
+    await telemetry_buffer.close()
+    database.close()
+
+app = FastAPI(title="CermatListrik Inference Server", version="1.0", lifespan=lifespan)
+app.add_middleware(metrics.MetricsMiddleware)
 
 allowed_horizons = ", ".join(map(str, ALLOWED_HORIZONS))
 
+# "points": one object per sample (default). "columns": one array per field,
+# epoch-second timestamps, serialized straight from arrays.
+RESPONSE_FORMATS = ("points", "columns")
+response_format_query = Query(
+    "points", alias="format", description=f"Response layout. One of {', '.join(RESPONSE_FORMATS)}."
+)
+
+def check_response_format(response_format):
+    if response_format not in RESPONSE_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Invalid format. Must be one of {', '.join(RESPONSE_FORMATS)}.")
+
+"""
+Already serialized JSON, skipping FastAPI's per-item encoding.
+"""
+def json_response(content):
+    body = content if isinstance(content, bytes) else fast_json.dumps(content)
+    return Response(content=body, media_type="application/json")
+
+@app.exception_handler(InferenceOverloaded)
+async def inference_overloaded_handler(request: Request, exc: InferenceOverloaded):
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "Inference capacity exhausted, retry later."},
+        headers={"Retry-After": str(exc.retry_after)},
+    )
+
+"""
+Persisted samples older than ends_before, or [] when Postgres is unavailable.
+"""
+async def get_persisted_history(device_id, limit, ends_before=None):
+    if not FORECAST_PERSISTED_FALLBACK:
+        return []
+    try:
+        return await asyncio.to_thread(get_persisted_telemetry, device_id, None, ends_before, limit)
+    except Exception as e:
+        print(f"[forecast] Persisted history unavailable for {device_id}: {e!r}", flush=True)
+        return []
+
+"""
+Forecast a history array (see forecast_input_array) on the configured inference backend.
+"""
+async def run_forecast(device_id, history, horizon):
+    X_seq, timestamps = forecast_input_array(history)
+    if INFERENCE_BACKEND == "process":
+        powers = await inference_pool.pool.predict(device_id, X_seq, horizon)
+        return format_forecast(timestamps[-1], horizon, powers.tolist())
+    return await run_inference(forecast_sequence, device_id, X_seq, timestamps[-1], horizon)
+
+"""
+Forecast many (device_id, history_data, horizon) requests on the configured
+inference backend; per request, the forecast or the exception it raised.
+"""
+async def run_forecasts(requests):
+    if INFERENCE_BACKEND == "process":
+        return await inference_pool.pool.forecasts(requests)
+    return await run_inference(generate_forecasts, requests)
+
+"""
+Latest forecast for a device, served from the forecast cache when the
+buffer has not moved since it was computed. Short or cold buffers are
+completed with persisted samples.
+"""
+async def forecast_for(device_id, horizon):
+    # Forecasts only change when new telemetry lands
+    latest_ts = await telemetry_buffer.get_latest_timestamp(device_id)
+    persisted = None
+    if latest_ts is None:
+        # Cold buffer, e.g. after a Redis restart
+        persisted = await get_persisted_history(device_id, SEQUENCE_LENGTH)
+        if not persisted:
+            raise HTTPException(status_code=400, detail="Waiting for buffered data")
+        latest_ts = persisted[-1]["timestamp"]
+
+    async def compute():
+        if persisted is not None:
+            history = history_array(persisted)
+        else:
+            # The latest buffered window as an array, without per-entry dicts
+            history = await telemetry_buffer.get_latest_buffer_array(
+                device_id, seconds_prior=SEQUENCE_LENGTH, fields=HISTORY_FIELDS, latest_ts=latest_ts
+            )
+            if len(history) < SEQUENCE_LENGTH:
+                ends_before = float(history[0, 0]) if len(history) else latest_ts
+                older = await get_persisted_history(device_id, SEQUENCE_LENGTH - len(history), ends_before)
+                history = np.vstack([history_array(older), history])
+
+        if len(history) < SEQUENCE_LENGTH:
+            raise HTTPException(status_code=400, detail="Waiting for buffered data")
+
+        return await run_forecast(device_id, history, horizon)
+
+    if FORECAST_CACHE_ENABLED:
+        return await forecast_cache.get_or_compute(device_id, horizon, latest_ts, compute)
+    return await compute()
+
+hub = TelemetryHub(telemetry_buffer.ar, forecast_for)
+
 @app.get("/forecast/{device_id}")
-def get_forecasted_power(
+async def get_forecasted_power(
     device_id: str,
     horizon: int = Query(
         600,
@@ -23,43 +161,230 @@ def get_forecasted_power(
         raise HTTPException(status_code=400, detail=f"Invalid horizon. Must be one of {allowed_horizons}.")
 
     try:
-        # Get the latest buffered data for the past window length
-        history_data = get_latest_buffer(device_id, seconds_prior=SEQUENCE_LENGTH)
-
-        if not history_data or len(history_data) < SEQUENCE_LENGTH:
-            raise HTTPException(status_code=400, detail="Waiting for buffered data")
-            # history_data = get_latest_persisted_telemetry(device_id, starts_at)
-
-        forecast = generate_forecast(device_id, history_data, horizon)
-        return { "forecast": forecast }
+        if FORECAST_PRECOMPUTED:
+            # Kept fresh by app.workers.forecast_precompute; computed here only when missing
+            precomputed = await precomputed_forecasts.get_serialized(device_id, horizon)
+            if precomputed is not None:
+                return json_response(precomputed)
+        return { "forecast": await forecast_for(device_id, horizon) }
+    except (HTTPException, InferenceOverloaded):
+        raise
     except ValueError as ve:
         raise HTTPException(status_code=400, detail=str(ve))
     except Exception as e:
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=f"Internal error: {str(e)}")
 
+@app.post("/forecast/batch")
+async def get_forecasted_power_batch(request: ForecastBatchRequest):
+    items = request.items
+    if len(items) > FORECAST_BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=400, detail=f"Too many items. At most {FORECAST_BATCH_MAX_ITEMS} per batch.")
+
+    try:
+        # All device histories in one pipelined round trip
+        histories = await telemetry_buffer.get_latest_buffers(
+            [item.device_id for item in items], seconds_prior=SEQUENCE_LENGTH
+        )
+    except Exception as e:
+        traceback.print_exc()
+        raise HTTPException(status_code=500, detail=f"Failed to retrieve telemetry: {str(e)}")
+
+    results = [{"device_id": item.device_id, "horizon": item.horizon} for item in items]
+    pending = []
+    for i, item in enumerate(items):
+        history_data = histories.get(item.device_id, [])
+        if item.horizon not in ALLOWED_HORIZONS:
+            results[i]["error"] = f"Invalid horizon. Must be one of {allowed_horizons}."
+        elif len(history_data) < SEQUENCE_LENGTH:
+            results[i]["error"] = "Waiting for buffered data"
+        else:
+            pending.append((i, (item.device_id, history_data, item.horizon)))
+
+    if pending:
+        # One predict call per model for the whole batch
+        forecasts = await run_forecasts([request for _, request in pending])
+        for (i, _), forecast in zip(pending, forecasts):
+            if isinstance(forecast, ValueError):
+                results[i]["error"] = str(forecast)
+            elif isinstance(forecast, Exception):
+                print(f"[forecast/batch] {results[i]['device_id']}: {forecast!r}", flush=True)
+                results[i]["error"] = f"Internal error: {str(forecast)}"
+            else:
+                results[i]["forecast"] = forecast
+
+    return { "results": results }
+
+@app.get("/metrics")
+async def get_metrics():
+    body, content_type = metrics.render()
+    return Response(content=body, media_type=content_type)
+
+@app.get("/stats/forecast-cache")
+async def get_forecast_cache_stats():
+    return await forecast_cache.get_stats()
+
+@app.get("/stats/telemetry-cache")
+async def get_telemetry_cache_stats():
+    return telemetry_buffer.cache_stats()
+
+@app.get("/stats/inference")
+async def get_inference_stats():
+    if INFERENCE_BACKEND == "process":
+        return inference_pool.pool.stats()
+    return inference_executor.get_stats()
+
+@app.get("/stats/models")
+async def get_model_stats():
+    return model_cache.stats()
+
+@app.get("/stats/stream")
+async def get_stream_stats():
+    return hub.stats()
+
 @app.get("/telemetry/power-consumption/{device_id}/latest")
-def get_latest_power_consumption_by_device_id(
+async def get_latest_power_consumption_by_device_id(
     device_id: str,
+    response_format: str = response_format_query,
 ):
+    check_response_format(response_format)
     try:
-        latest_data = get_latest_buffer(device_id, seconds_prior=600)  # ~10 minutes if 1s frequency
+        if response_format == "columns":
+            data = await telemetry_buffer.get_latest_buffer_array(
+                device_id, seconds_prior=600, fields=["timestamp", "power"]
+            )
+            data = data[~np.isnan(data[:, 1])]
+            if not len(data):
+                raise HTTPException(status_code=404, detail="No recent power telemetry found.")
+            timestamps, power = data.T.copy()
+            return json_response({"latest_power": {"timestamps": timestamps, "power": power}})
+
+        latest_data = await telemetry_buffer.get_latest_buffer(device_id, seconds_prior=600)  # ~10 minutes if 1s frequency
 
         if not latest_data:
             raise HTTPException(status_code=404, detail="No recent power telemetry found.")
 
         formatted = [
-            {
-                # "timestamp": datetime.fromtimestamp(item["timestamp"], tz=timezone.utc).isoformat(),
-                "timestamp": datetime.fromtimestamp(item["timestamp"], tz=timezone.utc).replace(tzinfo=None).isoformat(),
-                "power": float(item.get("power", 0.0))
-            }
+            format_power_point(item)
             for item in latest_data
             if "timestamp" in item and "power" in item
         ]
 
         return { "latest_power": formatted }
 
+    except HTTPException:
+        raise
     except Exception as e:
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=f"Failed to retrieve telemetry: {str(e)}")
+
+@app.get("/telemetry/{device_id}/history")
+async def get_telemetry_history_by_device_id(
+    device_id: str,
+    start: float = Query(..., description="Range start, epoch seconds"),
+    end: float = Query(None, description="Range end, epoch seconds. Defaults to now."),
+    points: int = Query(
+        HISTORY_DEFAULT_POINTS, ge=1, le=HISTORY_MAX_ROWS,
+        description="Minimum number of points wanted; picks the coarsest resolution that still returns them."
+    ),
+    response_format: str = response_format_query,
+):
+    check_response_format(response_format)
+    end = datetime.now(tz=timezone.utc).timestamp() if end is None else end
+    if end <= start:
+        raise HTTPException(status_code=400, detail="end must be after start")
+
+    try:
+        resolution, history = await asyncio.to_thread(get_history, device_id, start, end, points)
+    except Exception as e:
+        traceback.print_exc()
+        raise HTTPException(status_code=500, detail=f"Failed to retrieve history: {str(e)}")
+
+    if response_format == "columns":
+        columns = {
+            "timestamps": [point["timestamp"] for point in history],
+            "count": [point["count"] for point in history],
+        }
+        for col in TELEMETRIES:
+            columns[col] = {stat: [point[col][stat] for point in history] for stat in ("min", "max", "mean", "sum")}
+        return json_response({"resolution": resolution, "history": columns})
+
+    for point in history:
+        point["timestamp"] = datetime.fromtimestamp(point["timestamp"], tz=timezone.utc).replace(tzinfo=None).isoformat()
+    return { "resolution": resolution, "history": history }
+
+@app.get("/telemetry/power-consumption/{device_id}/stream")
+async def stream_power_consumption_by_device_id(
+    device_id: str,
+    request: Request,
+    since: float = Query(
+        None,
+        description="Epoch seconds; only telemetry after it is replayed. Defaults to the Last-Event-ID header."
+    ),
+    horizon: int = Query(
+        None,
+        description=f"Also stream forecasts for this horizon. Only accepts {allowed_horizons}."
+    ),
+):
+    if horizon is not None and horizon not in ALLOWED_HORIZONS:
+        raise HTTPException(status_code=400, detail=f"Invalid horizon. Must be one of {allowed_horizons}.")
+
+    if since is None and request.headers.get("last-event-id"):
+        try:
+            since = float(request.headers["last-event-id"])
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid Last-Event-ID")
+
+    async def events():
+        subscription = None
+        try:
+            # Subscribe before the backfill read so nothing lands in between, and
+            # here rather than in the handler so the finally always cleans it up
+            subscription = await hub.subscribe(device_id, horizon)
+            if since is not None:
+                backfill = [
+                    item for item in await telemetry_buffer.get_range(device_id, since=since)
+                    if to_epoch_seconds(item["timestamp"]) > since
+                ]
+            else:
+                backfill = await telemetry_buffer.get_latest_buffer(device_id, seconds_prior=STREAM_BACKFILL_SECONDS)
+
+            last_sent = since
+            for item in backfill:
+                last_sent = to_epoch_seconds(item["timestamp"])
+                yield sse_event("telemetry", format_power_point(item), last_sent)
+
+            if horizon is not None:
+                try:
+                    forecast = await forecast_for(device_id, horizon)
+                    yield sse_event("forecast", {"horizon": horizon, "forecast": forecast})
+                except (HTTPException, InferenceOverloaded):
+                    pass
+
+            while not await request.is_disconnected():
+                try:
+                    kind, payload = await asyncio.wait_for(subscription.queue.get(), STREAM_HEARTBEAT_INTERVAL)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+
+                if kind == "close":
+                    break
+                if kind == "telemetry":
+                    # Already sent during backfill
+                    timestamp = to_epoch_seconds(payload["timestamp"])
+                    if last_sent is not None and timestamp <= last_sent:
+                        continue
+                    last_sent = timestamp
+                    yield sse_event("telemetry", format_power_point(payload), last_sent)
+                else:
+                    yield sse_event(kind, payload)
+        finally:
+            if subscription is not None:
+                await hub.unsubscribe(subscription)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -0,0 +1,156 @@
+"""
+Async read side of the telemetry buffer for the API server.
+Same keys and encodings as app.storage.telemetry_buffer.
+With TELEMETRY_CACHE_ENABLED, reads are answered from the in-process
+cache (app.storage.telemetry_ring) when it holds enough history, and
+entries read from Redis are normalized to the cache's shape.
+"""
+import asyncio
+import redis.asyncio as aioredis
+from app.config.buffer import (
+    REDIS_HOST, REDIS_MAX_CONNECTIONS, PUBLISH_UPDATES,
+    TELEMETRY_CACHE_ENABLED, TELEMETRY_CACHE_CAPACITY, TELEMETRY_CACHE_MEMORY_MB,
+)
+from app.storage.telemetry_buffer import _buffer_key, _decode_entries, _LATEST_WINDOW_LUA
+from app.storage.telemetry_ring import TelemetryRingCache, normalize_entries
+from app.storage.telemetry_codec import decode_array, to_epoch_seconds, RECORD_FIELDS
+from app.utils.metrics import timed, REDIS_ROUND_TRIP, BUFFER_DECODE
+
+pool = aioredis.ConnectionPool(host=REDIS_HOST, port=6379, db=0, max_connections=REDIS_MAX_CONNECTIONS)
+ar = aioredis.Redis(connection_pool=pool)
+
+async def _fetch_tail(device_id: str, n: int):
+    with timed(REDIS_ROUND_TRIP, "redis:last_n", operation="last_n"):
+        raw_entries = await ar.zrange(_buffer_key(device_id), -n, -1)
+    return _decode_entries(raw_entries, "get_last_n")
+
+# Kept current from the update channels, so it needs them published
+cache = (
+    TelemetryRingCache(ar, _fetch_tail, TELEMETRY_CACHE_CAPACITY, TELEMETRY_CACHE_MEMORY_MB)
+    if TELEMETRY_CACHE_ENABLED and PUBLISH_UPDATES else None
+)
+
+def _from_redis(raw_entries, caller: str):
+    entries = _decode_entries(raw_entries, caller)
+    # Whether a read hits the cache must not change what callers get back
+    return normalize_entries(entries) if cache is not None else entries
+
+async def get_latest_timestamp(device_id: str):
+    """
+    Epoch seconds of the most recent buffered entry, or None if the buffer is empty.
+    """
+    if cache is not None:
+        cached, latest = await cache.latest_timestamp(device_id)
+        if cached:
+            return latest
+    with timed(REDIS_ROUND_TRIP, "redis:latest_timestamp", operation="latest_timestamp"):
+        latest = await ar.zrange(_buffer_key(device_id), -1, -1, withscores=True)
+    if not latest:
+        return None
+    return latest[0][1]
+
+async def get_last_n(device_id: str, n: int):
+    """
+    Retrieve the n most recent buffered entries, ascending by timestamp.
+    """
+    if n <= 0:
+        return []
+    if cache is not None:
+        entries = await cache.last_n(device_id, n)
+        if entries is not None:
+            return entries
+        return normalize_entries(await _fetch_tail(device_id, n))
+    return await _fetch_tail(device_id, n)
+
+async def get_range(device_id: str, since=None, until=None):
+    """
+    Retrieve buffered entries with since <= timestamp <= until, ascending.
+    """
+    min_score = "-inf" if since is None else to_epoch_seconds(since)
+    max_score = "+inf" if until is None else to_epoch_seconds(until)
+    if cache is not None:
+        entries = await cache.range(
+            device_id,
+            None if since is None else min_score,
+            None if until is None else max_score,
+        )
+        if entries is not None:
+            return entries
+    with timed(REDIS_ROUND_TRIP, "redis:range", operation="range"):
+        raw_entries = await ar.zrangebyscore(_buffer_key(device_id), min_score, max_score)
+    return _from_redis(raw_entries, "get_range")
+
+async def get_latest_buffer(device_id: str, seconds_prior: int, latest_ts: float = None):
+    """
+    Retrieve entries newer than (latest timestamp - seconds_prior), ascending.
+    latest_ts pins the end of the range; defaults to the newest buffered entry.
+    """
+    if cache is not None:
+        entries = await cache.latest_buffer(device_id, seconds_prior, latest_ts)
+        if entries is not None:
+            return entries
+    if latest_ts is None:
+        latest_ts = await get_latest_timestamp(device_id)
+    if latest_ts is None:
+        return []
+
+    cutoff = latest_ts - seconds_prior
+    with timed(REDIS_ROUND_TRIP, "redis:latest_window", operation="latest_window"):
+        raw_entries = await ar.zrangebyscore(_buffer_key(device_id), f"({cutoff}", latest_ts)
+    return _from_redis(raw_entries, "get_latest_buffer")
+
+async def get_latest_buffer_array(device_id: str, seconds_prior: int, fields=RECORD_FIELDS, latest_ts: float = None):
+    """
+    Same range as get_latest_buffer, as an (n, len(fields)) float64 array
+    (NaN for missing values). Skips building per-entry dicts.
+    """
+    if cache is not None:
+        data = await cache.latest_buffer_array(device_id, seconds_prior, fields, latest_ts)
+        if data is not None:
+            return data
+    if latest_ts is None:
+        latest_ts = await get_latest_timestamp(device_id)
+    if latest_ts is None:
+        return decode_array([], fields)
+
+    cutoff = latest_ts - seconds_prior
+    with timed(REDIS_ROUND_TRIP, "redis:latest_window", operation="latest_window"):
+        raw_entries = await ar.zrangebyscore(_buffer_key(device_id), f"({cutoff}", latest_ts)
+    with timed(BUFFER_DECODE, "decode", caller="get_latest_buffer_array"):
+        return decode_array(raw_entries, fields)
+
+_latest_window_script = ar.register_script(_LATEST_WINDOW_LUA)
+
+async def get_latest_buffers(device_ids, seconds_prior: int):
+    """
+    get_latest_buffer for many devices in a single pipelined round trip.
+    Returns {device_id: entries}.
+    """
+    device_ids = list(dict.fromkeys(device_ids))
+    buffers = {}
+    if cache is not None:
+        cached = await asyncio.gather(*(cache.latest_buffer(device_id, seconds_prior) for device_id in device_ids))
+        for device_id, entries in zip(device_ids, cached):
+            if entries is not None:
+                buffers[device_id] = entries
+        device_ids = [device_id for device_id in device_ids if device_id not in buffers]
+    if not device_ids:
+        return buffers
+
+    pipe = ar.pipeline(transaction=False)
+    for device_id in device_ids:
+        await _latest_window_script(keys=[_buffer_key(device_id)], args=[seconds_prior], client=pipe)
+    with timed(REDIS_ROUND_TRIP, "redis:latest_windows", operation="latest_windows"):
+        responses = await pipe.execute()
+    for device_id, raw_entries in zip(device_ids, responses):
+        buffers[device_id] = _from_redis(raw_entries, "get_latest_buffers")
+    return buffers
+
+def cache_stats():
+    return cache.stats() if cache is not None else {"enabled": False}
+
+async def close():
+    if cache is not None:
+        await cache.close()
+    await ar.aclose()
+    await pool.disconnect()
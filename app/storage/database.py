@@ -0,0 +1,59 @@
+"""
+Postgres connections shared by the API server and the workers.
+"""
+import threading
+from contextlib import contextmanager
+import psycopg2
+from psycopg2.pool import ThreadedConnectionPool
+from app.config.database import (
+    POSTGRES_HOST, POSTGRES_DB, POSTGRES_USER, POSTGRES_PASSWORD,
+    POSTGRES_CONNECT_TIMEOUT, POSTGRES_POOL_SIZE,
+)
+
+_connect_args = dict(
+    host=POSTGRES_HOST,
+    database=POSTGRES_DB,
+    user=POSTGRES_USER,
+    password=POSTGRES_PASSWORD,
+    connect_timeout=POSTGRES_CONNECT_TIMEOUT,
+)
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def connect():
+    """
+    A dedicated connection, for long-running workers.
+    """
+    return psycopg2.connect(**_connect_args)
+
+def _get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ThreadedConnectionPool(1, POSTGRES_POOL_SIZE, **_connect_args)
+        return _pool
+
+@contextmanager
+def connection():
+    """
+    A pooled connection, committed on success and rolled back on error.
+    """
+    pool = _get_pool()
+    conn = pool.getconn()
+    try:
+        yield conn
+        conn.commit()
+    except Exception:
+        if not conn.closed:
+            conn.rollback()
+        raise
+    finally:
+        pool.putconn(conn, close=bool(conn.closed))
+
+def close():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.closeall()
+            _pool = None
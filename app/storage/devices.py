@@ -1,3 +1,15 @@
 devices = {
     "anonymous-smartlamp-001": True,
 }
+
+def get_devices():
+    """
+    IDs of all enabled devices.
+    """
+    return [device_id for device_id, enabled in devices.items() if enabled]
+
+def is_enabled(device_id: str) -> bool:
+    """
+    Whether telemetry from this device should be buffered and scored.
+    """
+    return devices.get(device_id, False)
@@ -0,0 +1,125 @@
+import asyncio
+import time
+import uuid
+from app.storage.async_telemetry_buffer import ar
+from app.utils.metrics import timed, REDIS_ROUND_TRIP
+from app.utils import fast_json
+from app.config.forecast import (
+    FORECAST_CACHE_TTL,
+    FORECAST_CACHE_MAX_ENTRIES,
+    FORECAST_CACHE_LOCK_TIMEOUT,
+    FORECAST_CACHE_POLL_INTERVAL,
+)
+
+CACHE_PREFIX = "forecast_cache"
+INDEX_KEY = f"{CACHE_PREFIX}:index"
+STATS_KEY = f"{CACHE_PREFIX}:stats"
+
+# Store a result and evict the oldest entries beyond the size bound.
+# KEYS[1] = entry key, KEYS[2] = index key
+# ARGV[1] = value, ARGV[2] = ttl seconds, ARGV[3] = now, ARGV[4] = max entries
+_STORE_LUA = """
+redis.call('SET', KEYS[1], ARGV[1], 'EX', ARGV[2])
+redis.call('ZADD', KEYS[2], ARGV[3], KEYS[1])
+redis.call('ZREMRANGEBYSCORE', KEYS[2], '-inf', tonumber(ARGV[3]) - tonumber(ARGV[2]))
+local overflow = redis.call('ZCARD', KEYS[2]) - tonumber(ARGV[4])
+if overflow > 0 then
+    local oldest = redis.call('ZRANGE', KEYS[2], 0, overflow - 1)
+    redis.call('DEL', unpack(oldest))
+    redis.call('ZREMRANGEBYRANK', KEYS[2], 0, overflow - 1)
+end
+return overflow > 0 and overflow or 0
+"""
+_store_script = ar.register_script(_STORE_LUA)
+
+# Delete the lock only if we still own it
+_RELEASE_LUA = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+_release_script = ar.register_script(_RELEASE_LUA)
+
+def _cache_key(device_id: str, horizon: int, last_timestamp: float) -> str:
+    return f"{CACHE_PREFIX}:{device_id}:{horizon}:{last_timestamp}"
+
+def _lock_key(cache_key: str) -> str:
+    return f"{cache_key}:lock"
+
+async def _record(field: str, amount: int = 1):
+    await ar.hincrby(STATS_KEY, field, amount)
+
+async def get_cached(device_id: str, horizon: int, last_timestamp: float):
+    """
+    Cached forecast for this (device, horizon, latest sample), or None.
+    """
+    raw = await ar.get(_cache_key(device_id, horizon, last_timestamp))
+    return None if raw is None else fast_json.loads(raw)
+
+async def store(device_id: str, horizon: int, last_timestamp: float, forecast):
+    key = _cache_key(device_id, horizon, last_timestamp)
+    with timed(REDIS_ROUND_TRIP, "redis:forecast_cache_store", operation="forecast_cache_store"):
+        evicted = await _store_script(
+            keys=[key, INDEX_KEY],
+            args=[fast_json.dumps(forecast), FORECAST_CACHE_TTL, time.time(), FORECAST_CACHE_MAX_ENTRIES],
+        )
+    if evicted:
+        await _record("evictions", evicted)
+
+async def get_or_compute(device_id: str, horizon: int, last_timestamp: float, compute):
+    """
+    Return the cached forecast for (device_id, horizon, last_timestamp) or await compute().
+
+    Only one caller across all API workers computes a given key: others wait
+    for its result (up to FORECAST_CACHE_LOCK_TIMEOUT) instead of running
+    the model again. Exceptions from compute() propagate to its caller.
+    """
+    key = _cache_key(device_id, horizon, last_timestamp)
+    lock_key = _lock_key(key)
+    deadline = time.monotonic() + FORECAST_CACHE_LOCK_TIMEOUT
+    waited = False
+
+    while True:
+        with timed(REDIS_ROUND_TRIP, "redis:forecast_cache_get", operation="forecast_cache_get"):
+            raw = await ar.get(key)
+        if raw is not None:
+            await _record("waited_hits" if waited else "hits")
+            return fast_json.loads(raw)
+
+        token = uuid.uuid4().hex
+        if await ar.set(lock_key, token, nx=True, px=int(FORECAST_CACHE_LOCK_TIMEOUT * 1000)):
+            try:
+                # Another worker may have finished between our read and the lock
+                raw = await ar.get(key)
+                if raw is not None:
+                    await _record("waited_hits" if waited else "hits")
+                    return fast_json.loads(raw)
+
+                await _record("misses")
+                forecast = await compute()
+                await store(device_id, horizon, last_timestamp, forecast)
+                return forecast
+            finally:
+                await _release_script(keys=[lock_key], args=[token])
+
+        if time.monotonic() >= deadline:
+            # The computing worker is stuck or gone: do the work ourselves
+            await _record("lock_timeouts")
+            return await compute()
+
+        waited = True
+        await asyncio.sleep(FORECAST_CACHE_POLL_INTERVAL)
+
+async def get_stats():
+    """
+    Hit/miss counters shared by all API workers, plus the current entry count.
+    """
+    stats = {k.decode(): int(v) for k, v in (await ar.hgetall(STATS_KEY)).items()}
+    for field in ("hits", "waited_hits", "misses", "evictions", "lock_timeouts"):
+        stats.setdefault(field, 0)
+
+    lookups = stats["hits"] + stats["waited_hits"] + stats["misses"]
+    stats["hit_ratio"] = (stats["hits"] + stats["waited_hits"]) / lookups if lookups else 0.0
+    stats["entries"] = await ar.zcard(INDEX_KEY)
+    return stats
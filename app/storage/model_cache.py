@@ -1 +1,128 @@
-_model_cache = {}
+import os
+import threading
+import time
+from collections import OrderedDict
+from app.config.models import MODEL_MEMORY_BUDGET_MB, MODEL_RELOAD_CHECK_INTERVAL
+
+class ModelRegistry:
+    """
+    LRU cache of loaded models bounded by an approximate memory budget.
+
+    Entries are keyed by a tag and remember the files they were loaded from:
+    a changed modification time triggers a reload. Concurrent first requests
+    for a tag share a single load.
+    """
+
+    def __init__(self, memory_budget_bytes, reload_check_interval=MODEL_RELOAD_CHECK_INTERVAL):
+        self.memory_budget_bytes = memory_budget_bytes
+        self.reload_check_interval = reload_check_interval
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._load_locks = {}
+        self._stats = {
+            "hits": 0,
+            "misses": 0,
+            "loads": 0,
+            "reloads": 0,
+            "evictions": 0,
+            "load_seconds_total": 0.0,
+            "last_load_seconds": 0.0,
+        }
+
+    @staticmethod
+    def _mtimes(paths):
+        return tuple(os.stat(path).st_mtime_ns for path in paths)
+
+    def _is_stale(self, entry):
+        now = time.monotonic()
+        if now - entry["checked_at"] < self.reload_check_interval:
+            return False
+        entry["checked_at"] = now
+        try:
+            return self._mtimes(entry["paths"]) != entry["mtimes"]
+        except OSError:
+            # Files being replaced: keep serving the loaded copy
+            return False
+
+    def _lookup(self, tag):
+        with self._lock:
+            entry = self._entries.get(tag)
+            if entry is None:
+                return None
+            self._entries.move_to_end(tag)
+        if self._is_stale(entry):
+            return None
+        return entry
+
+    def get(self, tag, paths, loader):
+        """
+        Return the cached value for tag, loading it with loader() on a miss.
+        loader returns (value, size_bytes); paths are the files it reads.
+        """
+        entry = self._lookup(tag)
+        if entry is not None:
+            with self._lock:
+                self._stats["hits"] += 1
+            return entry["value"]
+
+        with self._lock:
+            load_lock = self._load_locks.setdefault(tag, threading.Lock())
+
+        with load_lock:
+            # Someone else may have loaded it while we waited
+            entry = self._lookup(tag)
+            if entry is not None:
+                with self._lock:
+                    self._stats["hits"] += 1
+                return entry["value"]
+
+            mtimes = self._mtimes(paths)
+            started = time.perf_counter()
+            value, size = loader()
+            elapsed = time.perf_counter() - started
+
+            with self._lock:
+                reloaded = tag in self._entries
+                self._entries.pop(tag, None)
+                self._entries[tag] = {
+                    "value": value,
+                    "size": size,
+                    "paths": tuple(paths),
+                    "mtimes": mtimes,
+                    "checked_at": time.monotonic(),
+                    "loaded_at": time.time(),
+                }
+                self._stats["misses"] += 1
+                self._stats["loads"] += 1
+                self._stats["reloads"] += int(reloaded)
+                self._stats["load_seconds_total"] += elapsed
+                self._stats["last_load_seconds"] = elapsed
+                self._evict()
+
+            print(f"[model_cache] Loaded {tag} in {elapsed:.2f}s", flush=True)
+            return value
+
+    def _evict(self):
+        # Caller holds self._lock; never evicts the most recently used entry
+        while len(self._entries) > 1 and self.resident_bytes() > self.memory_budget_bytes:
+            tag, _ = self._entries.popitem(last=False)
+            self._stats["evictions"] += 1
+            print(f"[model_cache] Evicted {tag}", flush=True)
+
+    def resident_bytes(self):
+        return sum(entry["size"] for entry in self._entries.values())
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats["resident_models"] = len(self._entries)
+            stats["resident_bytes"] = self.resident_bytes()
+            stats["memory_budget_bytes"] = self.memory_budget_bytes
+            stats["resident"] = list(self._entries)
+        return stats
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+model_cache = ModelRegistry(MODEL_MEMORY_BUDGET_MB * 1024 * 1024)
@@ -0,0 +1,41 @@
+"""
+Forecasts precomputed by app.workers.forecast_precompute, one key per
+device and horizon: {"forecast", "last_timestamp", "computed_at"}, where
+last_timestamp is the newest sample the forecast is based on.
+Written by the worker (sync client), read by the API (async client).
+"""
+import time
+from app.storage.telemetry_buffer import r
+from app.storage.async_telemetry_buffer import ar
+from app.utils.metrics import timed, REDIS_ROUND_TRIP
+from app.utils import fast_json
+from app.config.forecast import FORECAST_PRECOMPUTE_TTL
+
+PRECOMPUTED_PREFIX = "forecast_precomputed"
+
+def _key(device_id: str, horizon: int) -> str:
+    return f"{PRECOMPUTED_PREFIX}:{device_id}:{horizon}"
+
+def store_many(results):
+    """
+    Store (device_id, horizon, last_timestamp, forecast) tuples in one round trip.
+    """
+    computed_at = time.time()
+    pipe = r.pipeline(transaction=False)
+    for device_id, horizon, last_timestamp, forecast in results:
+        value = {"forecast": forecast, "last_timestamp": last_timestamp, "computed_at": computed_at}
+        pipe.set(_key(device_id, horizon), fast_json.dumps(value), ex=FORECAST_PRECOMPUTE_TTL)
+    with timed(REDIS_ROUND_TRIP, "redis:precomputed_store", operation="precomputed_store"):
+        pipe.execute()
+
+async def get_serialized(device_id: str, horizon: int):
+    """
+    The precomputed forecast for (device_id, horizon) as stored (JSON bytes),
+    or None when there is none younger than FORECAST_PRECOMPUTE_TTL.
+    """
+    with timed(REDIS_ROUND_TRIP, "redis:precomputed_get", operation="precomputed_get"):
+        return await ar.get(_key(device_id, horizon))
+
+async def get(device_id: str, horizon: int):
+    raw = await get_serialized(device_id, horizon)
+    return None if raw is None else fast_json.loads(raw)
@@ -0,0 +1,232 @@
+"""
+Columnar archive of telemetry on disk, for long-range reads.
+
+    ARCHIVE_DIR/<device_id>/<partition start>/<first seq>-<last seq>/<field>.npy
+
+Each device's samples are split into time partitions of
+ARCHIVE_PARTITION_SECONDS (named by their start, epoch seconds). A partition
+holds chunks, one per archive write, numbered in write order; each chunk is
+one .npy file per RECORD_FIELDS field (float64, NaN for missing values).
+Chunks are written under a temporary name and renamed into place, so readers
+never see a partial one. compact() merges a partition's chunks into one chunk
+named after the whole sequence range, which supersedes the chunks it covers.
+
+Readers memory-map only the partitions and fields a range needs. A single
+writer (app.workers.archive) is assumed.
+"""
+import os
+import shutil
+import numpy as np
+from urllib.parse import quote, unquote
+from app.storage.telemetry_codec import RECORD_FIELDS, to_epoch_seconds
+from app.config.archive import ARCHIVE_DIR, ARCHIVE_PARTITION_SECONDS
+
+# Newest archived timestamp per device, filled from disk on first use
+_newest = {}
+
+def _device_dir(device_id: str) -> str:
+    return os.path.join(ARCHIVE_DIR, quote(device_id, safe=""))
+
+def _partitions(device_id: str):
+    """
+    [(start, path)] of a device's partitions, ascending.
+    """
+    try:
+        names = os.listdir(_device_dir(device_id))
+    except FileNotFoundError:
+        return []
+    return sorted(
+        (int(name), os.path.join(_device_dir(device_id), name))
+        for name in names if name.isdigit()
+    )
+
+def _chunks(partition_path: str):
+    """
+    [(first seq, last seq, path)] of the live chunks of a partition, in time
+    order. Chunks covered by a compacted one are left out.
+    """
+    ranges = []
+    for name in os.listdir(partition_path):
+        if name.startswith("."):
+            continue
+        first, last = name.split("-")
+        ranges.append((int(first), int(last), os.path.join(partition_path, name)))
+
+    live = []
+    for first, last, path in sorted(ranges, key=lambda c: (c[0], -c[1])):
+        if live and last <= live[-1][1]:
+            continue
+        live.append((first, last, path))
+    return live
+
+def _load(chunk_path: str, field: str, mmap_mode="r"):
+    return np.load(os.path.join(chunk_path, f"{field}.npy"), mmap_mode=mmap_mode)
+
+def list_devices():
+    """
+    Device IDs with archived telemetry.
+    """
+    try:
+        return sorted(unquote(name) for name in os.listdir(ARCHIVE_DIR))
+    except FileNotFoundError:
+        return []
+
+def newest_timestamp(device_id: str):
+    """
+    Epoch seconds of the newest archived sample, or None if there is none.
+    """
+    if device_id not in _newest:
+        newest = None
+        for _, path in reversed(_partitions(device_id)):
+            chunks = _chunks(path)
+            if chunks:
+                newest = float(_load(chunks[-1][2], "timestamp")[-1])
+                break
+        _newest[device_id] = newest
+    return _newest[device_id]
+
+def _write_chunk(partition_path: str, name: str, columns):
+    os.makedirs(partition_path, exist_ok=True)
+    tmp = os.path.join(partition_path, f".{name}.tmp")
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+    for field, column in zip(RECORD_FIELDS, columns):
+        np.save(os.path.join(tmp, f"{field}.npy"), np.ascontiguousarray(column))
+    os.rename(tmp, os.path.join(partition_path, name))
+
+def _partition_start(timestamp) -> int:
+    return int(timestamp // ARCHIVE_PARTITION_SECONDS * ARCHIVE_PARTITION_SECONDS)
+
+def append(device_id: str, entries) -> int:
+    """
+    Archive a device's entries. Entries not newer than the newest archived
+    sample are skipped. Returns the number written.
+    """
+    timestamps = np.array([to_epoch_seconds(entry["timestamp"]) for entry in entries], dtype=np.float64)
+    values = np.array(
+        [[np.nan if entry.get(field) is None else float(entry[field]) for field in RECORD_FIELDS[1:]] for entry in entries],
+        dtype=np.float64,
+    ).reshape(len(entries), len(RECORD_FIELDS) - 1)
+    order = np.argsort(timestamps, kind="stable")
+    timestamps, values = timestamps[order], values[order]
+    newest = newest_timestamp(device_id)
+    if newest is not None:
+        newer = timestamps > newest
+        timestamps, values = timestamps[newer], values[newer]
+    if not len(timestamps):
+        return 0
+
+    partition_starts = timestamps // ARCHIVE_PARTITION_SECONDS
+    bounds = np.flatnonzero(np.diff(partition_starts)) + 1
+    for block_timestamps, block_values in zip(np.split(timestamps, bounds), np.split(values, bounds)):
+        partition_path = os.path.join(_device_dir(device_id), str(_partition_start(block_timestamps[0])))
+        existing = _chunks(partition_path) if os.path.isdir(partition_path) else []
+        seq = existing[-1][1] + 1 if existing else 0
+        _write_chunk(partition_path, f"{seq:08d}-{seq:08d}", [block_timestamps, *block_values.T])
+        _newest[device_id] = float(block_timestamps[-1])
+    return len(timestamps)
+
+def compact(device_id: str, before: float) -> int:
+    """
+    Merge the chunks of every partition that starts before `before` (epoch
+    seconds) into a single chunk. Returns the number of partitions compacted.
+    """
+    compacted = 0
+    for start, path in _partitions(device_id):
+        if start >= before:
+            break
+        chunks = _chunks(path)
+        if len(chunks) < 2:
+            continue
+        columns = [
+            np.concatenate([_load(chunk_path, field, mmap_mode=None) for _, _, chunk_path in chunks])
+            for field in RECORD_FIELDS
+        ]
+        _write_chunk(path, f"{chunks[0][0]:08d}-{chunks[-1][1]:08d}", columns)
+        # Readers skip the superseded chunks already; removing them only frees the space
+        for _, _, chunk_path in chunks:
+            shutil.rmtree(chunk_path, ignore_errors=True)
+        compacted += 1
+    return compacted
+
+def iter_chunks(device_id: str, start=None, end=None, fields=RECORD_FIELDS):
+    """
+    Yield (timestamps, {field: values}) for each archived chunk with samples in
+    start <= timestamp < end (epoch seconds, None for unbounded), in time order.
+    The arrays are read-only memory-mapped slices; only the fields asked for are mapped.
+    """
+    partitions = _partitions(device_id)
+    for i, (partition_start, path) in enumerate(partitions):
+        if end is not None and partition_start >= end:
+            break
+        next_start = partitions[i + 1][0] if i + 1 < len(partitions) else None
+        if start is not None and next_start is not None and next_start <= start:
+            continue
+
+        for attempt in range(3):
+            try:
+                opened = [
+                    (_load(chunk_path, "timestamp"), {field: _load(chunk_path, field) for field in fields})
+                    for _, _, chunk_path in _chunks(path)
+                ]
+                break
+            except FileNotFoundError:
+                # Compacted while listing: the merged chunk is in place now
+                if attempt == 2:
+                    raise
+
+        for timestamps, columns in opened:
+            lo = 0 if start is None else np.searchsorted(timestamps, start, side="left")
+            hi = len(timestamps) if end is None else np.searchsorted(timestamps, end, side="left")
+            if lo < hi:
+                yield timestamps[lo:hi], {field: column[lo:hi] for field, column in columns.items()}
+
+def read_array(device_id: str, start=None, end=None, fields=RECORD_FIELDS) -> np.ndarray:
+    """
+    Archived samples with start <= timestamp < end as an (n, len(fields))
+    float64 array, ascending, like telemetry_buffer.get_range_array.
+    """
+    blocks = [
+        np.column_stack([columns[field] for field in fields])
+        for _, columns in iter_chunks(device_id, start, end, fields)
+    ]
+    if not blocks:
+        return np.empty((0, len(fields)), dtype=np.float64)
+    return np.concatenate(blocks)
+
+def bucket_stats(device_id: str, start: float, end: float, resolution: int, fields):
+    """
+    Per-bucket statistics of archived samples in start <= timestamp < end, with
+    buckets of `resolution` seconds aligned to the epoch. Reads one chunk at a
+    time. Returns (bucket starts, sample counts, and for each field arrays of
+    min, max, sum and non-missing counts), all ascending by bucket.
+    """
+    partials = []
+    for timestamps, columns in iter_chunks(device_id, start, end, fields):
+        buckets = timestamps // resolution * resolution
+        starts = np.concatenate([[0], np.flatnonzero(np.diff(buckets)) + 1])
+        values = np.column_stack([columns[field] for field in fields])
+        missing = np.isnan(values)
+        partials.append((
+            buckets[starts],
+            np.diff(np.append(starts, len(buckets))),
+            np.minimum.reduceat(np.where(missing, np.inf, values), starts),
+            np.maximum.reduceat(np.where(missing, -np.inf, values), starts),
+            np.add.reduceat(np.where(missing, 0.0, values), starts),
+            np.add.reduceat(~missing, starts),
+        ))
+    if not partials:
+        empty = np.empty((0, len(fields)))
+        return np.empty(0), np.empty(0, dtype=np.int64), empty, empty, empty, empty.astype(np.int64)
+
+    # A bucket can span chunks; merge its partial statistics
+    buckets, counts, mins, maxs, sums, valid = (np.concatenate(parts) for parts in zip(*partials))
+    starts = np.concatenate([[0], np.flatnonzero(np.diff(buckets)) + 1])
+    return (
+        buckets[starts],
+        np.add.reduceat(counts, starts),
+        np.minimum.reduceat(mins, starts),
+        np.maximum.reduceat(maxs, starts),
+        np.add.reduceat(sums, starts),
+        np.add.reduceat(valid, starts),
+    )
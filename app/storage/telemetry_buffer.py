@@ -1,23 +1,177 @@
 import redis
-import json
-from datetime import datetime, timezone, timedelta
-from app.config.buffer import MAX_BUFFER_SIZE, REDIS_HOST
+import numpy as np
+from datetime import datetime
+from app.config.buffer import (
+    MAX_BUFFER_SIZE, REDIS_HOST,
+    BUFFER_KEY_PREFIX, LEGACY_BUFFER_KEY_PREFIX,
+    INGEST_CHUNK_SIZE, BUFFER_CODEC,
+    UPDATE_CHANNEL_PREFIX, PUBLISH_UPDATES,
+)
+from app.config.sharding import WINDOW_STATE_KEY
+from app.storage.telemetry_codec import encode, decode, decode_array, to_epoch_seconds, RECORD_FIELDS
+from app.utils.metrics import timed, REDIS_ROUND_TRIP, BUFFER_DECODE, UNPARSEABLE_ENTRIES
+from app.utils import fast_json
 
 r = redis.Redis(host=REDIS_HOST, port=6379, db=0)
 
 def _buffer_key(device_id: str) -> str:
-    return f"telemetry_buffer:{device_id}"
+    return f"{BUFFER_KEY_PREFIX}:{device_id}"
+
+def update_channel(device_id: str) -> str:
+    """
+    Pub/sub channel that carries every newly buffered entry of a device.
+    """
+    return f"{UPDATE_CHANNEL_PREFIX}:{device_id}"
+
+def _legacy_buffer_key(device_id: str) -> str:
+    return f"{LEGACY_BUFFER_KEY_PREFIX}:{device_id}"
+
+def entry_timestamp(entry: dict) -> float:
+    """
+    Epoch seconds of a telemetry entry, whatever timestamp format it carries.
+    """
+    return to_epoch_seconds(entry["timestamp"])
+
+def _encode_entry(entry: dict, score: float):
+    if BUFFER_CODEC == "json":
+        return encode(entry)
+    # Packed records store the timestamp as epoch seconds
+    return encode({**entry, "timestamp": score}, BUFFER_CODEC)
+
+def _decode_entries(raw_entries, caller: str):
+    result = []
+    with timed(BUFFER_DECODE, "decode", caller=caller):
+        for raw in raw_entries:
+            try:
+                result.append(decode(raw))
+            except Exception as e:
+                UNPARSEABLE_ENTRIES.labels(source="buffer").inc()
+                print(f"[{caller}] Failed to parse entry: {e}")
+    return result
+
+# Push, trim, count and (optionally) read the newest window in one atomic call.
+# New entries are also published for streaming subscribers; an entry that is
+# already buffered (e.g. added by another replica) is not published again.
+# KEYS[1] = buffer key
+# ARGV[1] = max buffer size, ARGV[2] = window size (0 to skip the read)
+# ARGV[3] = update channel ("" to skip publishing)
+# ARGV[4..] = score, member pairs to add
+_INGEST_LUA = """
+local key = KEYS[1]
+local max_size = tonumber(ARGV[1])
+local window = tonumber(ARGV[2])
+local channel = ARGV[3]
+for i = 4, #ARGV, 2 do
+    local added = redis.call('ZADD', key, ARGV[i], ARGV[i + 1])
+    if channel ~= '' and added == 1 then
+        redis.call('PUBLISH', channel, ARGV[i + 1])
+    end
+end
+redis.call('ZREMRANGEBYRANK', key, 0, -max_size - 1)
+local count = redis.call('ZCARD', key)
+local entries = {}
+if window > 0 then
+    entries = redis.call('ZRANGE', key, -window, -1)
+end
+return {count, entries}
+"""
+_ingest_script = r.register_script(_INGEST_LUA)
+
+def _ingest_args(device_id: str, entries, window_size: int):
+    channel = update_channel(device_id) if PUBLISH_UPDATES else ""
+    args = [MAX_BUFFER_SIZE, window_size, channel]
+    for entry in entries:
+        score = to_epoch_seconds(entry["timestamp"])
+        args.append(score)
+        args.append(_encode_entry(entry, score))
+    return args
+
+def add_and_fetch_window(device_id: str, entry: dict, window_size: int):
+    """
+    Add a telemetry entry and read back the newest window_size entries
+    in a single round trip.
+    Returns (buffer_count, window_entries ascending by timestamp).
+    """
+    with timed(REDIS_ROUND_TRIP, "redis:ingest", operation="ingest"):
+        count, raw_entries = _ingest_script(
+            keys=[_buffer_key(device_id)],
+            args=_ingest_args(device_id, [entry], window_size),
+        )
+    return count, _decode_entries(raw_entries, "add_and_fetch_window")
 
 def add_to_buffer(device_id: str, entry: dict) -> int:
     """
     Add a telemetry entry to the buffer for the specific device_id.
     Returns the buffer count.
     """
+    count, _ = add_and_fetch_window(device_id, entry, 0)
+    return count
+
+def add_many(device_id: str, entries) -> int:
+    """
+    Add a batch of telemetry entries (backfills, reconnect bursts).
+    All chunks go out in one pipelined round trip.
+    Returns the buffer count.
+    """
+    entries = list(entries)
+    if not entries:
+        return r.zcard(_buffer_key(device_id))
+
+    key = _buffer_key(device_id)
+    pipe = r.pipeline(transaction=True)
+    for i in range(0, len(entries), INGEST_CHUNK_SIZE):
+        chunk = entries[i:i + INGEST_CHUNK_SIZE]
+        _ingest_script(keys=[key], args=_ingest_args(device_id, chunk, 0), client=pipe)
+    with timed(REDIS_ROUND_TRIP, "redis:ingest_many", operation="ingest_many"):
+        results = pipe.execute()
+    return results[-1][0]
+
+def get_range(device_id: str, since=None, until=None):
+    """
+    Retrieve buffered entries with since <= timestamp <= until, ascending.
+    Either bound may be omitted to leave that side open.
+    """
+    key = _buffer_key(device_id)
+    min_score = "-inf" if since is None else to_epoch_seconds(since)
+    max_score = "+inf" if until is None else to_epoch_seconds(until)
+    return _decode_entries(r.zrangebyscore(key, min_score, max_score), "get_range")
+
+def get_last_n(device_id: str, n: int):
+    """
+    Retrieve the n most recent buffered entries, ascending by timestamp.
+    """
+    if n <= 0:
+        return []
+    key = _buffer_key(device_id)
+    return _decode_entries(r.zrange(key, -n, -1), "get_last_n")
+
+def get_last_n_array(device_id: str, n: int, fields=RECORD_FIELDS) -> np.ndarray:
+    """
+    The n most recent entries as an (n, len(fields)) float64 array, ascending.
+    Packed buffers decode with a single np.frombuffer.
+    """
+    if n <= 0:
+        return decode_array([], fields)
+    key = _buffer_key(device_id)
+    return decode_array(r.zrange(key, -n, -1), fields)
+
+def get_range_array(device_id: str, since=None, until=None, fields=RECORD_FIELDS) -> np.ndarray:
+    """
+    Same as get_range, decoded into an (n, len(fields)) float64 array.
+    """
     key = _buffer_key(device_id)
-    r.rpush(key, json.dumps(entry))
-    # Keep only latest entries
-    r.ltrim(key, -MAX_BUFFER_SIZE, -1)
-    return r.llen(key)
+    min_score = "-inf" if since is None else to_epoch_seconds(since)
+    max_score = "+inf" if until is None else to_epoch_seconds(until)
+    return decode_array(r.zrangebyscore(key, min_score, max_score), fields)
+
+def get_latest_timestamp(device_id: str):
+    """
+    Epoch seconds of the most recent buffered entry, or None if the buffer is empty.
+    """
+    latest = r.zrange(_buffer_key(device_id), -1, -1, withscores=True)
+    if not latest:
+        return None
+    return latest[0][1]
 
 def get_buffer(device_id: str, starts_at: datetime = None):
     """
@@ -25,64 +179,100 @@ def get_buffer(device_id: str, starts_at: datetime = None):
     If starts_at is provided, only return entries with timestamp > starts_at.
     """
     key = _buffer_key(device_id)
-    raw_entries = r.lrange(key, 0, -1)
-    
-    result = []
-    for raw in raw_entries:
-        try:
-            entry = json.loads(raw)
-            if starts_at:
-                entry_ts = datetime.fromtimestamp(entry['timestamp'], tz=timezone.utc)
-                if entry_ts <= starts_at:
-                    continue
-            result.append(entry)
-        except Exception as e:
-            print(f"[get_buffer] Failed to parse entry: {e}")
-            continue
-    return result
+    min_score = "-inf" if starts_at is None else f"({to_epoch_seconds(starts_at)}"
+    return _decode_entries(r.zrangebyscore(key, min_score, "+inf"), "get_buffer")
 
-def get_latest_buffer(device_id: str, seconds_prior: int):
-    buffer = get_buffer(device_id)
-    if not buffer:
+def get_latest_buffer(device_id: str, seconds_prior: int, latest_ts: float = None):
+    """
+    Retrieve entries newer than (latest timestamp - seconds_prior), ascending.
+    latest_ts pins the end of the range; defaults to the newest buffered entry.
+    """
+    if latest_ts is None:
+        latest_ts = get_latest_timestamp(device_id)
+    if latest_ts is None:
         return []
 
-    # Assume buffer is sorted ascending by timestamp; otherwise sort it
-    buffer_sorted = sorted(buffer, key=lambda x: x['timestamp'])
-
-    latest_entry = buffer_sorted[-1]
-    latest_ts = latest_entry['timestamp']
+    key = _buffer_key(device_id)
+    cutoff = latest_ts - seconds_prior
+    raw_entries = r.zrangebyscore(key, f"({cutoff}", latest_ts)
+    return _decode_entries(raw_entries, "get_latest_buffer")
 
-    # Convert latest_ts to datetime if needed (handle int or iso string)
-    if isinstance(latest_ts, int):
-        latest_dt = datetime.fromtimestamp(latest_ts, tz=timezone.utc)
-    else:
-        latest_dt = datetime.fromisoformat(latest_ts)
-        if latest_dt.tzinfo is None:
-            latest_dt = latest_dt.replace(tzinfo=timezone.utc)
+# Entries newer than (newest score - seconds_prior) in one server-side call.
+# KEYS[1] = buffer key, ARGV[1] = seconds_prior
+_LATEST_WINDOW_LUA = """
+local latest = redis.call('ZRANGE', KEYS[1], -1, -1, 'WITHSCORES')
+if #latest == 0 then
+    return {}
+end
+local cutoff = tonumber(latest[2]) - tonumber(ARGV[1])
+return redis.call('ZRANGEBYSCORE', KEYS[1], '(' .. cutoff, latest[2])
+"""
+_latest_window_script = r.register_script(_LATEST_WINDOW_LUA)
 
-    cutoff_time = latest_dt - timedelta(seconds=seconds_prior)
-    
-    # Now fetch buffer starting from cutoff_time
-    return get_buffer(device_id, starts_at=cutoff_time)
+def get_latest_buffers(device_ids, seconds_prior: int):
+    """
+    get_latest_buffer for many devices in a single pipelined round trip.
+    Returns {device_id: entries}.
+    """
+    device_ids = list(dict.fromkeys(device_ids))
+    pipe = r.pipeline(transaction=False)
+    for device_id in device_ids:
+        _latest_window_script(keys=[_buffer_key(device_id)], args=[seconds_prior], client=pipe)
+    with timed(REDIS_ROUND_TRIP, "redis:latest_windows", operation="latest_windows"):
+        responses = pipe.execute()
+    return {
+        device_id: _decode_entries(raw_entries, "get_latest_buffers")
+        for device_id, raw_entries in zip(device_ids, responses)
+    }
 
 def get_buffer_slice(device_id: str, start_idx: int, length: int):
     """
     Retrieve a slice from the buffer starting at start_idx for length entries.
-    Uses Redis lrange or similar with indices: lrange start_idx to start_idx+length-1.
+    Indices are ranks in timestamp order (negative indices count from the end).
     """
     key = _buffer_key(device_id)
     end_idx = start_idx + length - 1
-    raw_entries = r.lrange(key, start_idx, end_idx)  # Redis lrange supports this indexing
+    raw_entries = r.zrange(key, start_idx, end_idx)
+    return _decode_entries(raw_entries, "get_buffer_slice")
 
-    result = []
-    for raw in raw_entries:
-        try:
-            entry = json.loads(raw)
-            result.append(entry)
-        except Exception as e:
-            print(f"[get_buffer_slice] Failed to parse entry: {e}")
-    return result
+def get_window_end(device_id: str):
+    """
+    Timestamp of the newest sample in the device's last detection window, or None.
+    Kept in Redis so the window position survives a device moving between workers.
+    """
+    value = r.hget(WINDOW_STATE_KEY, device_id)
+    return None if value is None else float(value)
 
+def set_window_end(device_id: str, timestamp: float):
+    r.hset(WINDOW_STATE_KEY, device_id, timestamp)
+
+def get_buffers_since(watermarks: dict):
+    """
+    Entries newer than each device's watermark (epoch seconds, None for all),
+    for many devices in one pipelined round trip. Returns {device_id: entries}.
+    """
+    pipe = r.pipeline(transaction=False)
+    device_ids = list(watermarks)
+    for device_id in device_ids:
+        since = watermarks[device_id]
+        min_score = "-inf" if since is None else f"({since}"
+        pipe.zrangebyscore(_buffer_key(device_id), min_score, "+inf")
+    with timed(REDIS_ROUND_TRIP, "redis:buffers_since", operation="buffers_since"):
+        raw_buffers = pipe.execute()
+    return {
+        device_id: _decode_entries(raw_entries, "get_buffers_since")
+        for device_id, raw_entries in zip(device_ids, raw_buffers)
+    }
+
+def list_buffered_devices():
+    """
+    Device IDs that currently have a buffer, found with SCAN (non-blocking).
+    """
+    prefix = f"{BUFFER_KEY_PREFIX}:"
+    return [
+        key.decode()[len(prefix):]
+        for key in r.scan_iter(match=f"{prefix}*", count=500)
+    ]
 
 def clear_buffer(device_id: str):
     """
@@ -90,3 +280,48 @@ def clear_buffer(device_id: str):
     """
     key = _buffer_key(device_id)
     r.delete(key)
+
+def migrate_legacy_buffer(device_id: str) -> int:
+    """
+    Move a pre-index list buffer into the sorted set and delete the list.
+    Entries are re-encoded with the configured BUFFER_CODEC.
+    Safe to run repeatedly: identical entries collapse into one member.
+    Returns the number of entries migrated.
+    """
+    legacy_key = _legacy_buffer_key(device_id)
+    if r.type(legacy_key) != b"list":
+        return 0
+
+    mapping = {}
+    for raw in r.lrange(legacy_key, 0, -1):
+        try:
+            entry = fast_json.loads(raw)
+            score = to_epoch_seconds(entry["timestamp"])
+            mapping[_encode_entry(entry, score)] = score
+        except Exception as e:
+            print(f"[migrate_legacy_buffer] Dropping unparseable entry: {e}")
+
+    key = _buffer_key(device_id)
+    pipe = r.pipeline(transaction=True)
+    if mapping:
+        pipe.zadd(key, mapping)
+        pipe.zremrangebyrank(key, 0, -MAX_BUFFER_SIZE - 1)
+    pipe.delete(legacy_key)
+    pipe.execute()
+    return len(mapping)
+
+def migrate_legacy_buffers() -> dict:
+    """
+    Migrate every legacy list buffer found in Redis.
+    Returns {device_id: migrated_count}.
+    """
+    prefix = f"{LEGACY_BUFFER_KEY_PREFIX}:"
+    migrated = {}
+    for key in r.scan_iter(match=f"{prefix}*", count=500):
+        device_id = key.decode()[len(prefix):]
+        migrated[device_id] = migrate_legacy_buffer(device_id)
+    return migrated
+
+if __name__ == "__main__":
+    for device_id, count in migrate_legacy_buffers().items():
+        print(f"Migrated {count} entries for {device_id}", flush=True)
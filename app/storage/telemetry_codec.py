@@ -0,0 +1,134 @@
+"""
+Encoding of buffered telemetry entries.
+
+JSON entries always start with '{'. Packed entries start with a 3-byte
+header (2-byte magic + 1-byte version) followed by a fixed-width record,
+so both formats can live side by side in one buffer during rollout.
+"""
+import struct
+import numpy as np
+from datetime import datetime, timezone
+from app.utils import fast_json
+
+MAGIC = b"\xceL"
+HEADER_SIZE = len(MAGIC) + 1
+
+# Record layout shared by every packed version (order matters)
+RECORD_FIELDS = ["timestamp", "voltage", "current", "power", "energy", "frequency", "pf", "is_on"]
+
+# version -> per-field struct codes (timestamp always float64)
+_VERSIONS = {
+    1: "<" + "d" * len(RECORD_FIELDS),
+    2: "<d" + "f" * (len(RECORD_FIELDS) - 1),
+}
+
+_STRUCTS = {version: struct.Struct(fmt) for version, fmt in _VERSIONS.items()}
+
+_DTYPES = {
+    version: np.dtype(
+        [("header", f"V{HEADER_SIZE}")]
+        + [(field, "<" + code) for field, code in zip(RECORD_FIELDS, fmt[1:])]
+    )
+    for version, fmt in _VERSIONS.items()
+}
+
+CODECS = {
+    "json": None,
+    "packed64": 1,
+    "packed32": 2,
+}
+
+def to_epoch_seconds(value) -> float:
+    """
+    Convert a timestamp (epoch int/float, numeric string, ISO string or datetime)
+    into epoch seconds. Naive datetimes are treated as UTC.
+    """
+    if isinstance(value, datetime):
+        if value.tzinfo is None:
+            value = value.replace(tzinfo=timezone.utc)
+        return value.timestamp()
+    if isinstance(value, (int, float)):
+        return float(value)
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return to_epoch_seconds(datetime.fromisoformat(value))
+
+def _pack(entry: dict, version: int) -> bytes:
+    values = []
+    for field in RECORD_FIELDS:
+        value = entry.get(field)
+        values.append(float("nan") if value is None else float(value))
+    return MAGIC + bytes([version]) + _STRUCTS[version].pack(*values)
+
+def _unpack(raw: bytes) -> dict:
+    version = raw[len(MAGIC)]
+    values = _STRUCTS[version].unpack_from(raw, HEADER_SIZE)
+
+    entry = {}
+    for field, value in zip(RECORD_FIELDS, values):
+        if value != value:  # NaN marks a missing field
+            continue
+        if field == "timestamp" and value.is_integer():
+            value = int(value)
+        elif field == "is_on":
+            value = bool(value)
+        entry[field] = value
+    return entry
+
+def _packed_version(raw):
+    if isinstance(raw, (bytes, bytearray)) and raw[:len(MAGIC)] == MAGIC:
+        return raw[len(MAGIC)]
+    return None
+
+def encode(entry: dict, codec: str = "json"):
+    """
+    Encode a telemetry entry with the named codec.
+    """
+    if codec not in CODECS:
+        raise ValueError(f"Unknown buffer codec '{codec}'. Must be one of {', '.join(CODECS)}.")
+
+    version = CODECS[codec]
+    if version is None:
+        return fast_json.dumps(entry)
+    return _pack(entry, version)
+
+def decode(raw) -> dict:
+    """
+    Decode a single buffered entry, whichever format it was written in.
+    """
+    if _packed_version(raw) is not None:
+        return _unpack(raw)
+    return fast_json.loads(raw)
+
+def decode_array(raw_entries, fields=RECORD_FIELDS) -> np.ndarray:
+    """
+    Decode buffered entries straight into an (n, len(fields)) float64 array.
+    When every entry shares one packed version this is a single np.frombuffer;
+    mixed or JSON entries fall back to per-entry decoding.
+    Missing values come back as NaN.
+    """
+    if not raw_entries:
+        return np.empty((0, len(fields)), dtype=np.float64)
+
+    version = _packed_version(raw_entries[0])
+    if version in _DTYPES and all(_packed_version(raw) == version for raw in raw_entries):
+        records = np.frombuffer(b"".join(raw_entries), dtype=_DTYPES[version])
+        out = np.empty((len(records), len(fields)), dtype=np.float64)
+        for i, field in enumerate(fields):
+            out[:, i] = records[field]
+        return out
+
+    rows = []
+    for raw in raw_entries:
+        try:
+            entry = decode(raw)
+            rows.append([
+                np.nan if entry.get(field) is None
+                else to_epoch_seconds(entry[field]) if field == "timestamp"
+                else float(entry[field])
+                for field in fields
+            ])
+        except Exception as e:
+            print(f"[decode_array] Failed to parse entry: {e}")
+    return np.array(rows, dtype=np.float64).reshape(len(rows), len(fields))
@@ -0,0 +1,328 @@
+"""
+In-process cache of recent telemetry for the API (TELEMETRY_CACHE_ENABLED).
+
+Each cached device keeps its newest TELEMETRY_CACHE_CAPACITY samples in
+NumPy arrays: timestamps plus one column per telemetry field. A device is
+loaded from Redis on its first read and then kept current from the update
+channels, which a single pattern subscription per process follows. Reads
+the cache cannot answer return None and the caller goes to Redis:
+  - the device is not held far enough back
+  - a sample arrived out of order (the device is dropped and reloaded)
+  - the pub/sub connection failed (everything is dropped)
+Entries come back as _to_entries builds them; normalize_entries gives
+entries read from Redis the same shape.
+"""
+import asyncio
+import traceback
+from collections import OrderedDict
+import numpy as np
+from app.storage.telemetry_codec import decode, to_epoch_seconds, RECORD_FIELDS
+from app.config.buffer import UPDATE_CHANNEL_PREFIX
+
+VALUE_FIELDS = RECORD_FIELDS[1:]
+
+def _row(entry):
+    return [np.nan if entry.get(field) is None else float(entry[field]) for field in VALUE_FIELDS]
+
+def _to_entries(timestamps, values):
+    # Same shape as decoded packed entries: epoch timestamps, missing fields left out
+    entries = []
+    for timestamp, row in zip(timestamps.tolist(), values.tolist()):
+        entry = {"timestamp": int(timestamp) if timestamp.is_integer() else timestamp}
+        for field, value in zip(VALUE_FIELDS, row):
+            if value == value:
+                entry[field] = bool(value) if field == "is_on" else value
+        entries.append(entry)
+    return entries
+
+def normalize_entries(entries):
+    """
+    Decoded buffer entries in the shape cache reads return them, so a read
+    looks the same whether the cache or Redis answered it: epoch timestamps,
+    RECORD_FIELDS only, missing fields left out, is_on a bool.
+    """
+    if not entries:
+        return []
+    timestamps = np.array([to_epoch_seconds(entry["timestamp"]) for entry in entries], dtype=np.float64)
+    return _to_entries(timestamps, np.array([_row(entry) for entry in entries], dtype=np.float64))
+
+class DeviceRing:
+    """
+    Newest `capacity` samples of one device, ascending by timestamp.
+    Every sample is written twice, capacity apart, so the held samples
+    are always one contiguous slice of the arrays.
+    """
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.timestamps = np.empty(2 * capacity, dtype=np.float64)
+        self.values = np.empty((2 * capacity, len(VALUE_FIELDS)), dtype=np.float64)
+        self.start = 0
+        self.count = 0
+        # True while nothing older than the held samples existed in Redis
+        self.complete = False
+
+    @staticmethod
+    def bytes_for(capacity):
+        return 2 * capacity * 8 * (1 + len(VALUE_FIELDS))
+
+    def view(self):
+        """
+        (timestamps, values) of the held samples, oldest first.
+        """
+        end = self.start + self.count
+        return self.timestamps[self.start:end], self.values[self.start:end]
+
+    def newest(self):
+        return float(self.timestamps[self.start + self.count - 1]) if self.count else None
+
+    def append(self, timestamp, row):
+        """
+        Add a sample newer than every held one; returns False (and holds
+        nothing new) for a sample that is not.
+        """
+        if self.count and timestamp <= self.timestamps[self.start + self.count - 1]:
+            return False
+        if self.count == self.capacity:
+            self.start = (self.start + 1) % self.capacity
+            self.complete = False
+        else:
+            self.count += 1
+        i = (self.start + self.count - 1) % self.capacity
+        self.timestamps[i] = self.timestamps[i + self.capacity] = timestamp
+        self.values[i] = self.values[i + self.capacity] = row
+        return True
+
+    def covers(self, since):
+        """
+        Whether every sample at or after `since` (None for all) is held.
+        """
+        if self.complete:
+            return True
+        return since is not None and self.count > 0 and since >= self.timestamps[self.start]
+
+    def entries(self, lo, hi):
+        timestamps, values = self.view()
+        return _to_entries(timestamps[lo:hi], values[lo:hi])
+
+class TelemetryRingCache:
+    """
+    DeviceRings for the most recently read devices, bounded by memory_mb.
+    fetch_tail(device_id, n) reads a device's newest n entries from Redis.
+    """
+
+    def __init__(self, redis, fetch_tail, capacity, memory_mb):
+        self.redis = redis
+        self.fetch_tail = fetch_tail
+        self.capacity = capacity
+        self.max_devices = max(1, memory_mb * 2**20 // DeviceRing.bytes_for(capacity))
+        self._rings = OrderedDict()
+        self._fills = {}
+        self._pending = {}  # device_id -> samples received while it loads
+        self._pubsub = None
+        self._reader = None
+        self._started = None
+        self._healthy = False
+        # Bumped whenever updates may have been missed; loads spanning it are discarded
+        self._epoch = 0
+        self._stats = {"hits": 0, "misses": 0, "loads": 0, "evictions": 0, "invalidations": 0}
+
+    async def _start(self):
+        self._pubsub = self.redis.pubsub(ignore_subscribe_messages=True)
+        await self._pubsub.psubscribe(f"{UPDATE_CHANNEL_PREFIX}:*")
+        self._healthy = True
+        self._reader = asyncio.create_task(self._read_loop())
+
+    def _can_hold(self, seconds):
+        # Telemetry arrives at least once a second, so a longer span never fits
+        return seconds <= self.capacity
+
+    async def _ring(self, device_id, load=True):
+        """
+        The device's ring, loading it unless load is False (for a read the
+        ring could not answer anyway), or None when not cached.
+        """
+        if self._started is None:
+            self._started = asyncio.ensure_future(self._start())
+        try:
+            await self._started
+        except Exception:
+            self._started = None
+            raise
+        if not self._healthy:
+            return None
+
+        ring = self._rings.get(device_id)
+        if ring is not None:
+            self._rings.move_to_end(device_id)
+            return ring
+
+        # Concurrent first reads share one load
+        fill = self._fills.get(device_id)
+        if fill is None and not load:
+            return None
+        if fill is None:
+            fill = self._fills[device_id] = asyncio.ensure_future(self._fill(device_id))
+        return await asyncio.shield(fill)
+
+    async def _fill(self, device_id):
+        epoch = self._epoch
+        self._pending[device_id] = []
+        try:
+            entries = await self.fetch_tail(device_id, self.capacity)
+            ring = DeviceRing(self.capacity)
+            for entry in entries:
+                ring.append(to_epoch_seconds(entry["timestamp"]), _row(entry))
+            ring.complete = len(entries) < self.capacity
+
+            for timestamp, row in self._pending[device_id]:
+                if ring.append(timestamp, row):
+                    continue
+                # Published before the read (so already held) unless it is missing
+                timestamps, _ = ring.view()
+                i = np.searchsorted(timestamps, timestamp)
+                if i == len(timestamps) or timestamps[i] != timestamp:
+                    return None
+
+            if epoch != self._epoch:
+                return None
+            self._stats["loads"] += 1
+            self._rings[device_id] = ring
+            while len(self._rings) > self.max_devices:
+                self._rings.popitem(last=False)
+                self._stats["evictions"] += 1
+            return ring
+        finally:
+            del self._pending[device_id]
+            del self._fills[device_id]
+
+    async def _read_loop(self):
+        prefix = f"{UPDATE_CHANNEL_PREFIX}:"
+        while True:
+            try:
+                message = await self._pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+                # Reconnected and resubscribed after a failure
+                self._healthy = True
+                if message is not None:
+                    self._dispatch(message["channel"].decode()[len(prefix):], message["data"])
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                traceback.print_exc()
+                # Updates may have been lost while the connection was down
+                self._healthy = False
+                self._epoch += 1
+                self._stats["invalidations"] += len(self._rings)
+                self._rings.clear()
+                await asyncio.sleep(1)
+
+    def _dispatch(self, device_id, raw):
+        ring = self._rings.get(device_id)
+        pending = self._pending.get(device_id)
+        if ring is None and pending is None:
+            return
+        try:
+            entry = decode(raw)
+            sample = (to_epoch_seconds(entry["timestamp"]), _row(entry))
+        except Exception:
+            sample = None
+
+        if pending is not None and sample is not None:
+            pending.append(sample)
+        elif ring is not None and (sample is None or not ring.append(*sample)):
+            # Late or unreadable sample: reload the device on its next read
+            del self._rings[device_id]
+            self._stats["invalidations"] += 1
+
+    def _count(self, hit):
+        self._stats["hits" if hit else "misses"] += 1
+
+    async def latest_timestamp(self, device_id):
+        """
+        (True, newest timestamp or None), or (False, None) when not cached.
+        """
+        ring = await self._ring(device_id)
+        if ring is None:
+            self._count(False)
+            return False, None
+        self._count(True)
+        return True, ring.newest()
+
+    async def _latest_slice(self, device_id, seconds_prior, latest_ts):
+        """
+        (ring, lo, hi) of the samples with latest - seconds_prior < timestamp <= latest,
+        or None when not cached.
+        """
+        ring = await self._ring(device_id, load=self._can_hold(seconds_prior))
+        latest = latest_ts if latest_ts is not None or ring is None else ring.newest()
+        if ring is None or (latest is not None and not ring.covers(latest - seconds_prior)):
+            self._count(False)
+            return None
+        self._count(True)
+        if latest is None:
+            return ring, 0, 0
+        timestamps, _ = ring.view()
+        lo = np.searchsorted(timestamps, latest - seconds_prior, side="right")
+        hi = np.searchsorted(timestamps, latest, side="right")
+        return ring, lo, hi
+
+    async def latest_buffer(self, device_id, seconds_prior, latest_ts=None):
+        """
+        Entries with latest - seconds_prior < timestamp <= latest, or None when not cached.
+        """
+        found = await self._latest_slice(device_id, seconds_prior, latest_ts)
+        if found is None:
+            return None
+        ring, lo, hi = found
+        return ring.entries(lo, hi)
+
+    async def latest_buffer_array(self, device_id, seconds_prior, fields, latest_ts=None):
+        """
+        Same range as latest_buffer as an (n, len(fields)) array, or None when not cached.
+        """
+        found = await self._latest_slice(device_id, seconds_prior, latest_ts)
+        if found is None:
+            return None
+        ring, lo, hi = found
+        timestamps, values = ring.view()
+        return np.column_stack([
+            timestamps[lo:hi] if field == "timestamp" else values[lo:hi, VALUE_FIELDS.index(field)]
+            for field in fields
+        ])
+
+    async def last_n(self, device_id, n):
+        ring = await self._ring(device_id, load=n <= self.capacity)
+        if ring is None or (n > ring.count and not ring.complete):
+            self._count(False)
+            return None
+        self._count(True)
+        return ring.entries(max(ring.count - n, 0), ring.count)
+
+    async def range(self, device_id, since=None, until=None):
+        bounded = since is not None and until is not None
+        ring = await self._ring(device_id, load=not bounded or self._can_hold(until - since))
+        if ring is None or not ring.covers(since):
+            self._count(False)
+            return None
+        self._count(True)
+        timestamps, _ = ring.view()
+        lo = 0 if since is None else np.searchsorted(timestamps, since, side="left")
+        hi = len(timestamps) if until is None else np.searchsorted(timestamps, until, side="right")
+        return ring.entries(lo, hi)
+
+    def stats(self):
+        return {
+            "enabled": True,
+            **self._stats,
+            "devices": len(self._rings),
+            "max_devices": self.max_devices,
+            "capacity": self.capacity,
+            "resident_bytes": len(self._rings) * DeviceRing.bytes_for(self.capacity),
+            "healthy": self._healthy,
+        }
+
+    async def close(self):
+        if self._reader is not None:
+            self._reader.cancel()
+        if self._pubsub is not None:
+            await self._pubsub.aclose()
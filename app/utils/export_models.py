@@ -0,0 +1,127 @@
+"""
+Export .keras models and joblib scalers to the TensorFlow-free NumPy runtime.
+
+    python -m app.utils.export_models [--verify] [--tolerance 1e-4] [paths...]
+
+Each models/<dir>/<name>.keras gets a <name>.npz next to it and each
+<name>.pkl scaler a <name>.npz. With --verify every exported model is run
+against the original Keras model on random inputs and the export fails
+when outputs differ by more than the tolerance (parity check).
+Needs tensorflow, joblib and scikit-learn, which the serving images do not.
+"""
+import argparse
+import glob
+import json
+import os
+import sys
+import numpy as np
+from app.utils.filesystem import with_current_dir
+from app.utils.numpy_runtime import NumpyModel, ExportedScaler, LAYERS
+
+# Layers with no weights or inference-time effect
+SKIPPED_LAYERS = {"InputLayer"}
+
+def lean_path(path):
+    return os.path.splitext(path)[0] + ".npz"
+
+def export_model(path):
+    from tensorflow.keras.models import load_model
+
+    model = load_model(path)
+    layers, arrays = [], {}
+    for layer in model.layers:
+        class_name = type(layer).__name__
+        if class_name in SKIPPED_LAYERS:
+            continue
+        if class_name not in LAYERS:
+            raise ValueError(f"{path}: layer '{class_name}' is not supported by the NumPy runtime")
+
+        config = layer.get_config()
+        index = len(layers)
+        layers.append({
+            "class_name": class_name,
+            "activation": config.get("activation"),
+            "recurrent_activation": config.get("recurrent_activation"),
+            "return_sequences": config.get("return_sequences", False),
+        })
+        for variable in layer.weights:
+            # e.g. "kernel", "recurrent_kernel", "bias"
+            name = variable.path.split("/")[-1]
+            arrays[f"{index}/{name}"] = np.asarray(variable.numpy(), dtype=np.float32)
+
+    out = lean_path(path)
+    np.savez(out, config=np.array(json.dumps(layers)), **arrays)
+    return model, out
+
+def export_scaler(path):
+    import joblib
+
+    scaler = joblib.load(path)
+    kind = type(scaler).__name__
+    if kind not in ("StandardScaler", "MinMaxScaler"):
+        raise ValueError(f"{path}: scaler '{kind}' is not supported by the NumPy runtime")
+
+    params = {"kind": np.array(kind)}
+    for name in ("mean_", "scale_", "min_", "feature_range", "with_mean", "with_std", "clip"):
+        value = getattr(scaler, name, None)
+        if value is not None:
+            params[name] = np.asarray(value)
+    names = getattr(scaler, "feature_names_in_", None)
+    if names is not None:
+        params["feature_names_in_"] = np.asarray(names, dtype=str)
+
+    out = lean_path(path)
+    np.savez(out, **params)
+    return scaler, out
+
+def verify_model(keras_model, lean_file, tolerance, samples=64):
+    shape = [dim or samples for dim in keras_model.input_shape]
+    x = np.random.default_rng(0).normal(size=shape).astype(np.float32)
+    expected = keras_model.predict(x, verbose=0)
+    actual = NumpyModel.load(lean_file).predict(x)
+    diff = float(np.max(np.abs(expected - actual)))
+    return diff <= tolerance, diff
+
+def verify_scaler(scaler, lean_file, tolerance, samples=64):
+    x = np.random.default_rng(0).normal(size=(samples, scaler.n_features_in_))
+    exported = ExportedScaler.load(lean_file)
+    from app.utils.scaling import transform
+
+    columns = exported.feature_names_in_ or list(range(scaler.n_features_in_))
+    diff = float(np.max(np.abs(scaler.transform(x) - transform(exported, x, columns))))
+    return diff <= tolerance, diff
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export models to the NumPy runtime")
+    parser.add_argument("paths", nargs="*", help="Model/scaler files (default: everything under app/models)")
+    parser.add_argument("--verify", action="store_true", help="Check parity against the original artifacts")
+    parser.add_argument("--tolerance", type=float, default=1e-4)
+    args = parser.parse_args(argv)
+
+    paths = args.paths or sorted(
+        glob.glob(with_current_dir("../", "models", "**", "*.keras"), recursive=True)
+        + glob.glob(with_current_dir("../", "models", "**", "*.pkl"), recursive=True)
+    )
+
+    failures = 0
+    for path in paths:
+        is_model = path.endswith(".keras")
+        try:
+            original, out = export_model(path) if is_model else export_scaler(path)
+        except Exception as e:
+            failures += 1
+            print(f"[export] FAILED {path}: {e}", flush=True)
+            continue
+
+        if args.verify:
+            verify = verify_model if is_model else verify_scaler
+            ok, diff = verify(original, out, args.tolerance)
+            failures += int(not ok)
+            print(f"[export] {'OK' if ok else 'MISMATCH'} {out} (max abs diff {diff:.2e})", flush=True)
+        else:
+            print(f"[export] {out}", flush=True)
+
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,50 @@
+"""
+JSON for the hot paths: MQTT ingest, buffered entries, pub/sub payloads
+and API responses.
+
+Uses orjson when it is installed and the standard library otherwise.
+dumps always returns compact UTF-8 bytes and accepts NumPy scalars and
+arrays. Both write NaN and infinities as null, which every reader accepts.
+"""
+import json
+import math
+import numpy as np
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# orjson.JSONDecodeError subclasses it, so one except clause covers both
+JSONDecodeError = json.JSONDecodeError
+
+def _default(value):
+    # Non-contiguous arrays and NumPy scalars orjson does not take natively
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError(f"Type is not JSON serializable: {type(value).__name__}")
+
+if orjson is not None:
+    def dumps(value) -> bytes:
+        return orjson.dumps(value, default=_default, option=orjson.OPT_SERIALIZE_NUMPY)
+
+    loads = orjson.loads
+else:
+    def _finite(value):
+        # orjson's handling of NaN and infinities; json would write bare NaN
+        if isinstance(value, float):
+            return value if math.isfinite(value) else None
+        if isinstance(value, dict):
+            return {key: _finite(item) for key, item in value.items()}
+        if isinstance(value, (list, tuple)):
+            return [_finite(item) for item in value]
+        if isinstance(value, (np.ndarray, np.generic)):
+            return _finite(_default(value))
+        return value
+
+    def dumps(value) -> bytes:
+        return json.dumps(_finite(value), separators=(",", ":"), default=_default, allow_nan=False).encode()
+
+    loads = json.loads
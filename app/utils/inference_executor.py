@@ -0,0 +1,55 @@
+import asyncio
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from app.config.inference import (
+    INFERENCE_CONCURRENCY,
+    INFERENCE_QUEUE_DEPTH,
+    INFERENCE_RETRY_AFTER,
+)
+
+class InferenceOverloaded(Exception):
+    """
+    Raised when the inference queue is full; callers should retry later.
+    """
+    def __init__(self, retry_after=INFERENCE_RETRY_AFTER):
+        super().__init__("Inference queue is full")
+        self.retry_after = retry_after
+
+# Dedicated pool so model calls never occupy the event loop or the default threadpool
+_executor = ThreadPoolExecutor(max_workers=INFERENCE_CONCURRENCY, thread_name_prefix="inference")
+
+# Running + waiting model calls; only touched from the event loop thread
+_in_flight = 0
+
+def get_stats():
+    return {
+        "in_flight": _in_flight,
+        "running_limit": INFERENCE_CONCURRENCY,
+        "queue_limit": INFERENCE_QUEUE_DEPTH,
+    }
+
+def _finished():
+    global _in_flight
+    _in_flight -= 1
+
+async def run_inference(fn, *args):
+    """
+    Run a blocking model call on the inference pool.
+    Raises InferenceOverloaded instead of queueing past INFERENCE_QUEUE_DEPTH.
+    """
+    global _in_flight
+    if _in_flight >= INFERENCE_CONCURRENCY + INFERENCE_QUEUE_DEPTH:
+        raise InferenceOverloaded()
+
+    loop = asyncio.get_running_loop()
+    # Carry the request's context (e.g. its trace) into the pool thread
+    context = contextvars.copy_context()
+    future = _executor.submit(context.run, fn, *args)
+    _in_flight += 1
+    # Counted until the pool is done with the call, not until the caller stops
+    # waiting: a cancelled request's model call keeps its thread busy
+    future.add_done_callback(lambda _: loop.call_soon_threadsafe(_finished))
+    return await asyncio.wrap_future(future)
+
+def shutdown():
+    _executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,316 @@
+"""
+Process-pool inference backend for the API (INFERENCE_BACKEND=process).
+
+A fixed set of model-hosting processes runs every forecast, so predict calls
+use all cores instead of sharing the API process's GIL. Requests are routed
+by model artifact, so each model is loaded by exactly one host, or by device
+(INFERENCE_POOL_ROUTING=device) to spread a shared model over hosts. Inputs and
+predictions travel through a shared-memory arena of fixed-size slots; the
+queues and pipes only carry slot numbers:
+
+    API process                               host
+    forecast_input -> slot input  --(slot, device, horizon)-->  scale + predict
+    format_forecast <- slot output <--(slot, error)--            write powers
+
+The API process never loads a model. Each host answers on its own pipe, so
+a host that dies, even mid-answer, fails only its own in-flight forecasts
+and is restarted with a fresh pipe.
+"""
+import asyncio
+import itertools
+import multiprocessing
+import multiprocessing.connection
+import queue
+import threading
+import time
+import zlib
+from multiprocessing import shared_memory
+import numpy as np
+from app.modules.forecast import features, forecast_input, format_forecast, predict_sequences
+from app.utils.inference_executor import InferenceOverloaded
+from app.utils.model_manifest import resolve_forecast_artifacts
+from app.config.forecast import ALLOWED_HORIZONS, SEQUENCE_LENGTH
+from app.config.inference import (
+    INFERENCE_PROCESSES, INFERENCE_SHARED_SLOTS, INFERENCE_POOL_ROUTING, INFERENCE_POOL_TIMEOUT,
+)
+
+INPUT_SHAPE = (SEQUENCE_LENGTH, len(features))
+INPUT_FLOATS = SEQUENCE_LENGTH * len(features)
+SLOT_FLOATS = INPUT_FLOATS + max(ALLOWED_HORIZONS)
+
+# Seconds between host liveness checks
+HOST_CHECK_INTERVAL = 1.0
+
+def _arena(buffer, slots):
+    """
+    (inputs, outputs) float64 views of the shared arena:
+    inputs[slot] is one model input, outputs[slot, :horizon] its powers.
+    """
+    array = np.ndarray((slots, SLOT_FLOATS), dtype=np.float64, buffer=buffer)
+    return array[:, :INPUT_FLOATS].reshape(slots, *INPUT_SHAPE), array[:, INPUT_FLOATS:]
+
+def route(device_id, horizon, processes):
+    """
+    Host index serving the device's model for this horizon. With "model"
+    routing, devices sharing a model artifact land on the same host.
+    """
+    if INFERENCE_POOL_ROUTING == "device":
+        return zlib.crc32(device_id.encode()) % processes
+    try:
+        key = resolve_forecast_artifacts(device_id, horizon)["model"]
+    except ValueError:
+        # The host raises the proper error when it resolves the model
+        key = device_id
+    return zlib.crc32(key.encode()) % processes
+
+def _portable(error):
+    # Exceptions cross the process boundary pickled; keep to builtin types
+    if isinstance(error, ValueError):
+        return ValueError(str(error))
+    return RuntimeError(f"{type(error).__name__}: {error}")
+
+def _preload(index, processes):
+    from app.utils.model_loader import get_forecasting_model, get_preload_devices
+
+    for device_id in get_preload_devices():
+        for horizon in ALLOWED_HORIZONS:
+            if route(device_id, horizon, processes) != index:
+                continue
+            try:
+                get_forecasting_model(device_id, horizon)
+            except Exception as e:
+                print(f"[inference_pool] Host {index} failed to preload {device_id}/{horizon}s: {e}", flush=True)
+
+def _host_main(index, processes, requests, responses, shm_name, slots):
+    """
+    Body of a model-hosting process: drain queued requests, run them
+    grouped by model, write the powers into their slots and answer on
+    the `responses` pipe.
+    """
+    shm = shared_memory.SharedMemory(name=shm_name)
+    inputs, outputs = _arena(shm.buf, slots)
+    _preload(index, processes)
+
+    stopping = False
+    while not stopping:
+        batch = [requests.get()]
+        while len(batch) < slots:
+            try:
+                batch.append(requests.get_nowait())
+            except queue.Empty:
+                break
+        if None in batch:
+            stopping = True
+            batch = [item for item in batch if item is not None]
+
+        results = predict_sequences([(device_id, inputs[slot], horizon) for slot, _, device_id, horizon in batch])
+        for (slot, ticket, _, horizon), result in zip(batch, results):
+            if isinstance(result, Exception):
+                responses.send((slot, ticket, _portable(result)))
+            else:
+                outputs[slot, :horizon] = result
+                responses.send((slot, ticket, None))
+
+class ModelHostPool:
+    """
+    The API side of the pool. forecast()/forecasts() must be awaited from one event loop.
+    """
+
+    def __init__(self, processes=INFERENCE_PROCESSES, slots=INFERENCE_SHARED_SLOTS):
+        self.processes = processes
+        self.slots = slots
+        self.restarts = 0
+        self._started = False
+
+    def start(self):
+        # spawn: hosts must not inherit the API's event loop, threads or Redis connections
+        self._context = multiprocessing.get_context("spawn")
+        self._shm = shared_memory.SharedMemory(create=True, size=self.slots * SLOT_FLOATS * 8)
+        self._inputs, self._outputs = _arena(self._shm.buf, self.slots)
+        self._hosts = [self._spawn(index) for index in range(self.processes)]
+
+        # Only touched from the event loop thread
+        self._free = list(range(self.slots))
+        self._pending = {}  # slot -> (future, host index, horizon, ticket)
+        # Per host, when it last answered or was handed work while idle
+        self._progress = [time.monotonic()] * self.processes
+        self._tickets = itertools.count()
+        self._loop = None
+
+        self._started = True
+        self._collector = threading.Thread(target=self._collect, name="inference-pool", daemon=True)
+        self._collector.start()
+        print(f"[inference_pool] Started {self.processes} model hosts, {self.slots} slots", flush=True)
+
+    def _spawn(self, index):
+        requests = self._context.Queue()
+        responses, writer = self._context.Pipe(duplex=False)
+        process = self._context.Process(
+            target=_host_main,
+            args=(index, self.processes, requests, writer, self._shm.name, self.slots),
+            name=f"model-host-{index}",
+            daemon=True,
+        )
+        process.start()
+        # Only the host holds the write end, so the read end sees EOF once it exits
+        writer.close()
+        return process, requests, responses
+
+    def _collect(self):
+        """
+        Collector thread: hands responses to the event loop and notices dead hosts.
+        """
+        readers = {}  # read end -> host index
+        drained = set()  # read ends at EOF, until their host is replaced
+        last_check = time.monotonic()
+        while self._started:
+            current = {responses: index for index, (_, _, responses) in enumerate(self._hosts)}
+            drained &= set(current)
+            # A replaced host's read end stays until it is drained to EOF
+            readers.update((responses, index) for responses, index in current.items() if responses not in drained)
+
+            dead = set()
+            for responses in multiprocessing.connection.wait(list(readers), timeout=HOST_CHECK_INTERVAL):
+                index = readers[responses]
+                try:
+                    response = responses.recv()
+                except (EOFError, OSError):
+                    # The host exited, possibly halfway through an answer
+                    del readers[responses]
+                    responses.close()
+                    drained.add(responses)
+                    dead.add(index)
+                    continue
+                if self._loop is not None:
+                    self._loop.call_soon_threadsafe(self._complete, *response)
+
+            # Also on a timer: a host can exit before its pipe is seen closed
+            if dead or time.monotonic() - last_check >= HOST_CHECK_INTERVAL:
+                last_check = time.monotonic()
+                dead.update(index for index, (process, _, _) in enumerate(self._hosts) if not process.is_alive())
+                if dead and self._loop is not None and self._started:
+                    self._loop.call_soon_threadsafe(self._restart, sorted(dead))
+
+        for responses in readers:
+            responses.close()
+
+    def _release(self, slot):
+        future, _, horizon, _ = self._pending.pop(slot)
+        self._free.append(slot)
+        return future, horizon
+
+    def _complete(self, slot, ticket, error):
+        entry = self._pending.get(slot)
+        if entry is None or entry[3] != ticket:
+            # Answer for a forecast already failed by a host restart
+            return
+        self._progress[entry[1]] = time.monotonic()
+        future, horizon = self._release(slot)
+        if future.done():
+            return
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(self._outputs[slot, :horizon].copy())
+
+    def _restart(self, dead):
+        for index in dead:
+            process, _, _ = self._hosts[index]
+            if process.is_alive() or not self._started:
+                continue
+            print(f"[inference_pool] Model host {index} exited with {process.exitcode}, restarting", flush=True)
+            for slot in [slot for slot, entry in self._pending.items() if entry[1] == index]:
+                future, _ = self._release(slot)
+                if not future.done():
+                    future.set_exception(RuntimeError(f"Model host {index} exited"))
+            self._hosts[index] = self._spawn(index)
+            self._progress[index] = time.monotonic()
+            self.restarts += 1
+
+    async def predict(self, device_id, X_seq, horizon):
+        """
+        Predicted powers for one unscaled model input (see forecast_input).
+        Raises InferenceOverloaded when every slot is taken, and RuntimeError
+        when its host answers nothing for INFERENCE_POOL_TIMEOUT.
+        """
+        if not self._free:
+            raise InferenceOverloaded()
+        self._loop = self._loop or asyncio.get_running_loop()
+
+        slot = self._free.pop()
+        self._inputs[slot] = X_seq
+        index = route(device_id, horizon, self.processes)
+        future = self._loop.create_future()
+        ticket = next(self._tickets)
+        if not any(entry[1] == index for entry in self._pending.values()):
+            # An idle host's silence so far is not a stall
+            self._progress[index] = time.monotonic()
+        self._pending[slot] = (future, index, horizon, ticket)
+        self._hosts[index][1].put((slot, ticket, device_id, horizon))
+
+        # The slot is released by _complete or _restart, even if this request is
+        # cancelled or fails: the host may still write to it until then
+        try:
+            while True:
+                # Waiting behind other forecasts is fine while the host keeps answering
+                remaining = self._progress[index] + INFERENCE_POOL_TIMEOUT - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    return await asyncio.wait_for(asyncio.shield(future), remaining)
+                except asyncio.TimeoutError:
+                    continue
+            # The host is stuck; _restart fails its other forecasts and frees their slots
+            print(f"[inference_pool] Model host {index} answered nothing for {INFERENCE_POOL_TIMEOUT}s, stopping it", flush=True)
+            self._hosts[index][0].kill()
+            raise RuntimeError(f"Model host {index} timed out")
+        finally:
+            future.cancel()
+
+    async def forecast(self, device_id, history_data, horizon):
+        """
+        Same result as generate_forecast, computed by the pool.
+        """
+        X_seq, timestamps = forecast_input(history_data)
+        powers = await self.predict(device_id, X_seq, horizon)
+        return format_forecast(timestamps[-1], horizon, powers.tolist())
+
+    async def forecasts(self, requests):
+        """
+        Same result as generate_forecasts: per request, the forecast or its exception.
+        """
+        if len(requests) > len(self._free):
+            raise InferenceOverloaded()
+        return await asyncio.gather(
+            *(self.forecast(*request) for request in requests),
+            return_exceptions=True,
+        )
+
+    def stats(self):
+        return {
+            "backend": "process",
+            "processes": self.processes,
+            "alive": sum(process.is_alive() for process, _, _ in self._hosts) if self._started else 0,
+            "restarts": self.restarts,
+            "slots": self.slots,
+            "slots_in_use": self.slots - len(self._free) if self._started else 0,
+        }
+
+    def close(self):
+        if not self._started:
+            return
+        self._started = False
+        for _, requests, _ in self._hosts:
+            requests.put(None)
+        for process, _, _ in self._hosts:
+            process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()
+        self._collector.join(timeout=2 * HOST_CHECK_INTERVAL)
+
+        # The arena views must go before the segment can be closed
+        self._inputs = self._outputs = None
+        self._shm.close()
+        self._shm.unlink()
+
+pool = ModelHostPool()
@@ -1,41 +1,118 @@
-import joblib
-from tensorflow.keras.models import load_model
-from app.utils.filesystem import with_current_dir
-from app.storage.model_cache import _model_cache
-from app.config.forecast import THRESHOLD
+import os
+from app.utils.numpy_runtime import NumpyModel, ExportedScaler
+from app.utils.model_manifest import with_model_dir, resolve_anomaly_artifacts, resolve_forecast_artifacts
+from app.storage.model_cache import model_cache
+from app.storage.devices import get_devices
+from app.config.forecast import ALLOWED_HORIZONS
+from app.config.models import PRELOAD_DEVICES, MODEL_RUNTIME
 
-def with_model_dir(model):
-    return with_current_dir("../", "models", model)
+def _model_size(model, path):
+    # float32 weights; fall back to artifact size on disk
+    try:
+        return model.count_params() * 4
+    except Exception:
+        return os.path.getsize(path)
 
 """
-Loads forecasting model and its components
+Path of the exported NumPy artifact to serve instead of path, or None for the original.
+"auto" only uses an export that is at least as new as its source file.
 """
-def get_forecasting_model(device_id, horizon):
-    namespace = f"{device_id}/forecast"
-    tag = f"{namespace}.{horizon}s"
+def _lean_artifact(path):
+    if MODEL_RUNTIME == "keras":
+        return None
 
-    if tag not in _model_cache:
-        _model_cache[tag] = {
-            "model": load_model(with_model_dir(f"{tag}.keras")),
-            "scaler_X": joblib.load(with_model_dir(f"{namespace}.scaler_x.pkl")),
-            "scaler_y": joblib.load(with_model_dir(f"{namespace}.scaler_y.pkl")),
-        }
+    lean = os.path.splitext(path)[0] + ".npz"
+    if MODEL_RUNTIME == "numpy":
+        if not os.path.exists(lean):
+            raise FileNotFoundError(f"{lean} not found; run python -m app.utils.export_models")
+        return lean
 
-    cached = _model_cache[tag]
-    return cached["model"], cached["scaler_X"], cached["scaler_y"]
+    if os.path.exists(lean) and (
+        not os.path.exists(path) or os.path.getmtime(lean) >= os.path.getmtime(path)
+    ):
+        return lean
+    return None
+
+"""
+Load a model artifact once; devices sharing the artifact share the instance
+"""
+def get_model(artifact):
+    path = with_model_dir(artifact)
+    lean = _lean_artifact(path)
+
+    def load():
+        if lean:
+            model = NumpyModel.load(lean)
+        else:
+            # TensorFlow is only imported when an artifact has no NumPy export
+            from tensorflow.keras.models import load_model
+            model = load_model(path)
+        return model, _model_size(model, lean or path)
+
+    return model_cache.get(f"model:{artifact}", [lean or path], load)
+
+"""
+Load a scaler artifact once
+"""
+def get_scaler(artifact):
+    path = with_model_dir(artifact)
+    lean = _lean_artifact(path)
+
+    def load():
+        if lean:
+            return ExportedScaler.load(lean), os.path.getsize(lean)
+        import joblib
+        return joblib.load(path), os.path.getsize(path)
+
+    return model_cache.get(f"scaler:{artifact}", [lean or path], load)
+
+"""
+Loads forecasting model and its components
+"""
+def get_forecasting_model(device_id, horizon):
+    artifacts = resolve_forecast_artifacts(device_id, horizon)
+    return (
+        get_model(artifacts["model"]),
+        get_scaler(artifacts["scaler_x"]),
+        get_scaler(artifacts["scaler_y"]),
+    )
 
 """
 Loads anomaly detection model and its components
 """
 def get_anomaly_detection_model(device_id):
-    namespace = f"{device_id}/anomaly-detection"
+    artifacts = resolve_anomaly_artifacts(device_id)
+    return (
+        get_model(artifacts["model"]),
+        get_scaler(artifacts["scaler"]),
+        artifacts["threshold"],
+    )
 
-    if namespace not in _model_cache:
-        _model_cache[namespace] = {
-            "model": load_model(with_model_dir(f"{namespace}.keras")),
-            "scaler": joblib.load(with_model_dir(f"{namespace}.scaler.pkl")),
-            "threshold": THRESHOLD,
-        }
+"""
+Devices listed in PRELOAD_DEVICES ("all" means every enabled device)
+"""
+def get_preload_devices():
+    if PRELOAD_DEVICES.strip().lower() == "all":
+        return get_devices()
+    return [device_id.strip() for device_id in PRELOAD_DEVICES.split(",") if device_id.strip()]
 
-    cached = _model_cache[namespace]
-    return cached["model"], cached["scaler"], cached["threshold"]
+"""
+Load models ahead of the first request.
+Failures are logged and skipped so one bad device does not block startup.
+"""
+def preload_models(device_ids=None, forecasting=True, anomaly_detection=True):
+    device_ids = get_preload_devices() if device_ids is None else device_ids
+    for device_id in device_ids:
+        loaders = []
+        if anomaly_detection:
+            loaders.append(lambda: get_anomaly_detection_model(device_id))
+        if forecasting:
+            loaders.extend(
+                (lambda horizon=horizon: get_forecasting_model(device_id, horizon))
+                for horizon in ALLOWED_HORIZONS
+            )
+        for load in loaders:
+            try:
+                load()
+            except Exception as e:
+                print(f"[preload_models] Failed to preload models for {device_id}: {e}", flush=True)
@@ -0,0 +1,108 @@
+"""
+Resolves which model artifacts serve a device.
+
+models/manifest.json declares device classes (shared models and scalers)
+and assigns devices to them:
+
+    {
+      "default_class": "smartlamp",
+      "classes": {
+        "smartlamp": {
+          "anomaly_detection": {"model": "...keras", "scaler": "...pkl", "threshold": 1.67},
+          "forecast": {"models": {"60": "...keras"}, "scaler_x": "...pkl", "scaler_y": "...pkl"}
+        }
+      },
+      "devices": {
+        "device-id": {"class": "smartlamp", "forecast": {"scaler_x": "..."}}
+      }
+    }
+
+Resolution for one artifact, first match wins:
+  1. an explicit path in the device's manifest entry
+  2. the device's own file under models/<device_id>/ (per-device scalers or models)
+  3. the device's class, or default_class for unlisted devices
+Paths are relative to the models directory.
+"""
+import json
+import os
+from app.utils.filesystem import with_current_dir
+from app.storage.model_cache import model_cache
+from app.config.models import MODEL_MANIFEST
+from app.config.forecast import THRESHOLD
+
+def with_model_dir(*parts):
+    return with_current_dir("../", "models", *parts)
+
+def _manifest_path():
+    return MODEL_MANIFEST or with_model_dir("manifest.json")
+
+def load_manifest():
+    """
+    Parsed manifest, cached and reloaded when the file changes.
+    """
+    path = _manifest_path()
+    if not os.path.exists(path):
+        return {}
+
+    def load():
+        with open(path) as f:
+            return json.load(f), 0
+
+    return model_cache.get("manifest", [path], load)
+
+def _device_file(device_id, filename):
+    relative = f"{device_id}/{filename}"
+    return relative if os.path.exists(with_model_dir(relative)) else None
+
+def _device_and_class(device_id):
+    manifest = load_manifest()
+    device = manifest.get("devices", {}).get(device_id, {})
+    class_name = device.get("class", manifest.get("default_class"))
+    device_class = manifest.get("classes", {}).get(class_name, {}) if class_name else {}
+    return device, device_class
+
+def _pick(device_id, device_spec, class_spec, key, device_filename):
+    return (
+        device_spec.get(key)
+        or _device_file(device_id, device_filename)
+        or class_spec.get(key)
+    )
+
+def resolve_anomaly_artifacts(device_id):
+    """
+    {"model", "scaler", "threshold"} for the device's anomaly detector.
+    """
+    device, device_class = _device_and_class(device_id)
+    device_spec = device.get("anomaly_detection", {})
+    class_spec = device_class.get("anomaly_detection", {})
+
+    artifacts = {
+        "model": _pick(device_id, device_spec, class_spec, "model", "anomaly-detection.keras"),
+        "scaler": _pick(device_id, device_spec, class_spec, "scaler", "anomaly-detection.scaler.pkl"),
+        "threshold": device_spec.get("threshold", class_spec.get("threshold", THRESHOLD)),
+    }
+    if not artifacts["model"] or not artifacts["scaler"]:
+        raise ValueError(f"No anomaly detection model is configured for device '{device_id}'")
+    return artifacts
+
+def resolve_forecast_artifacts(device_id, horizon):
+    """
+    {"model", "scaler_x", "scaler_y"} for the device's forecaster at this horizon.
+    """
+    device, device_class = _device_and_class(device_id)
+    device_spec = device.get("forecast", {})
+    class_spec = device_class.get("forecast", {})
+
+    model = (
+        device_spec.get("models", {}).get(str(horizon))
+        or _device_file(device_id, f"forecast.{horizon}s.keras")
+        or class_spec.get("models", {}).get(str(horizon))
+    )
+    artifacts = {
+        "model": model,
+        "scaler_x": _pick(device_id, device_spec, class_spec, "scaler_x", "forecast.scaler_x.pkl"),
+        "scaler_y": _pick(device_id, device_spec, class_spec, "scaler_y", "forecast.scaler_y.pkl"),
+    }
+    if not all(artifacts.values()):
+        raise ValueError(f"No {horizon}s forecasting model is configured for device '{device_id}'")
+    return artifacts
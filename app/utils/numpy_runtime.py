@@ -0,0 +1,116 @@
+"""
+TensorFlow-free inference for the exported models (see app/utils/export_models.py).
+
+An exported model is an .npz holding a JSON layer list under "config" and
+each layer's weights under "<layer index>/<weight name>". Supported layers
+cover the models in this repo: Dense, LSTM and Dropout (identity at inference).
+Exported scalers hold the fitted parameters of a StandardScaler or MinMaxScaler.
+"""
+import json
+import numpy as np
+
+ACTIVATIONS = {
+    "linear": lambda x: x,
+    "relu": lambda x: np.maximum(x, 0.0),
+    "sigmoid": lambda x: 1.0 / (1.0 + np.exp(-x)),
+    "tanh": np.tanh,
+}
+
+def _activation(name):
+    if name not in ACTIVATIONS:
+        raise ValueError(f"Unsupported activation '{name}'")
+    return ACTIVATIONS[name]
+
+def _dense(layer, weights, x):
+    y = x @ weights["kernel"]
+    if "bias" in weights:
+        y = y + weights["bias"]
+    return _activation(layer["activation"])(y)
+
+def _lstm(layer, weights, x):
+    # Keras gate order: input, forget, cell, output
+    kernel, recurrent_kernel = weights["kernel"], weights["recurrent_kernel"]
+    bias = weights.get("bias", 0.0)
+    activation = _activation(layer["activation"])
+    recurrent_activation = _activation(layer["recurrent_activation"])
+
+    units = recurrent_kernel.shape[0]
+    batch, steps, _ = x.shape
+    h = np.zeros((batch, units), dtype=x.dtype)
+    c = np.zeros((batch, units), dtype=x.dtype)
+
+    # Input projection for every step at once, recurrence step by step
+    projected = x @ kernel + bias
+    outputs = []
+    for t in range(steps):
+        z = projected[:, t] + h @ recurrent_kernel
+        i = recurrent_activation(z[:, :units])
+        f = recurrent_activation(z[:, units:2 * units])
+        g = activation(z[:, 2 * units:3 * units])
+        o = recurrent_activation(z[:, 3 * units:])
+        c = f * c + i * g
+        h = o * activation(c)
+        if layer.get("return_sequences"):
+            outputs.append(h)
+
+    return np.stack(outputs, axis=1) if layer.get("return_sequences") else h
+
+LAYERS = {
+    "Dense": _dense,
+    "LSTM": _lstm,
+    "Dropout": lambda layer, weights, x: x,
+}
+
+class NumpyModel:
+    """
+    Sequential model evaluated with NumPy, mirroring keras Model.predict.
+    """
+
+    def __init__(self, layers, weights):
+        for layer in layers:
+            if layer["class_name"] not in LAYERS:
+                raise ValueError(f"Unsupported layer '{layer['class_name']}'")
+        self.layers = layers
+        self.weights = weights
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as data:
+            layers = json.loads(str(data["config"]))
+            weights = [{} for _ in layers]
+            for name in data.files:
+                if name == "config":
+                    continue
+                index, weight_name = name.split("/", 1)
+                weights[int(index)][weight_name] = data[name]
+        return cls(layers, weights)
+
+    def predict(self, x, verbose=0, batch_size=None):
+        x = np.asarray(x, dtype=np.float32)
+        for layer, weights in zip(self.layers, self.weights):
+            x = LAYERS[layer["class_name"]](layer, weights, x)
+        return x
+
+    def count_params(self):
+        return sum(w.size for layer_weights in self.weights for w in layer_weights.values())
+
+class ExportedScaler:
+    """
+    Fitted StandardScaler/MinMaxScaler parameters without scikit-learn.
+    Exposes the attributes app.utils.scaling reads.
+    """
+
+    def __init__(self, params):
+        self.kind = str(params["kind"])
+        self.feature_names_in_ = list(params["feature_names_in_"]) if "feature_names_in_" in params else None
+        for name in ("mean_", "scale_", "min_", "feature_range"):
+            if name in params:
+                setattr(self, name, np.asarray(params[name], dtype=np.float64))
+        for name in ("with_mean", "with_std", "clip"):
+            if name in params:
+                setattr(self, name, bool(params[name]))
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as data:
+            return cls({name: data[name] for name in data.files})
@@ -0,0 +1,65 @@
+import numpy as np
+import pandas as pd
+
+"""
+Apply a fitted scikit-learn scaler to a NumPy matrix whose columns are `columns`.
+Columns are reordered to the scaler's training order when it recorded one.
+StandardScaler and MinMaxScaler (or their exported parameters) are applied
+directly; anything else goes through scaler.transform on a DataFrame.
+"""
+def transform(scaler, X, columns):
+    X = _align(scaler, np.asarray(X, dtype=np.float64), columns)
+    kind = _kind(scaler)
+
+    if kind == "StandardScaler":
+        if scaler.with_mean:
+            X = X - scaler.mean_
+        if scaler.with_std:
+            X = X / scaler.scale_
+        return X
+
+    if kind == "MinMaxScaler":
+        X = X * scaler.scale_ + scaler.min_
+        if getattr(scaler, "clip", False):
+            X = np.clip(X, *scaler.feature_range)
+        return X
+
+    return scaler.transform(pd.DataFrame(X, columns=_fitted_columns(scaler, columns)))
+
+"""
+Inverse of a fitted scaler for a NumPy matrix (target scalers have no column names to align).
+"""
+def inverse_transform(scaler, X):
+    X = np.asarray(X, dtype=np.float64)
+    kind = _kind(scaler)
+
+    if kind == "StandardScaler":
+        if scaler.with_std:
+            X = X * scaler.scale_
+        if scaler.with_mean:
+            X = X + scaler.mean_
+        return X
+
+    if kind == "MinMaxScaler":
+        return (X - scaler.min_) / scaler.scale_
+
+    return scaler.inverse_transform(X)
+
+def _kind(scaler):
+    # Exported scalers (app.utils.numpy_runtime) name the scaler they replace
+    return getattr(scaler, "kind", type(scaler).__name__)
+
+def _fitted_columns(scaler, columns):
+    names = getattr(scaler, "feature_names_in_", None)
+    return list(columns) if names is None else list(names)
+
+def _align(scaler, X, columns):
+    fitted = _fitted_columns(scaler, columns)
+    if fitted == list(columns):
+        return X
+
+    missing = set(fitted) - set(columns)
+    if missing:
+        raise ValueError(f"Scaler expects columns that are not available: {sorted(missing)}")
+    order = [list(columns).index(name) for name in fitted]
+    return X[:, order]
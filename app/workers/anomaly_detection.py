@@ -1,69 +1,186 @@
 import paho.mqtt.client as mqtt
-import json
-from app.storage.telemetry_buffer import add_to_buffer, get_buffer_slice
-from app.modules.anomaly_detection import detect_anomalies
+import signal
+import time
+from app.storage import telemetry_buffer
+from app.storage.telemetry_buffer import (
+    add_and_fetch_window, entry_timestamp, migrate_legacy_buffers,
+    get_window_end, set_window_end,
+)
+from app.storage.devices import get_devices, is_enabled
+from app.modules.inference_scheduler import AnomalyBatchScheduler
+from app.modules.window_features import RollingWindowFeatures, window_to_array
+from app.modules.sharding import ShardMembership
+from app.interfaces.power_telemetry import parse_power_telemetry
+from app.utils import fast_json
+from app.utils.model_loader import preload_models
+from app.utils.metrics import (
+    timed, start_trace, finish_trace, start_exporter,
+    FEATURE_EXTRACTION, BUFFER_SIZE, UNPARSEABLE_ENTRIES,
+)
 from app.config.mqtt import (
     MQTT_BROKER, POWER_TELEMETRY_SUBTOPIC, ANOMALY_SUBTOPIC,
-    MQTT_BASE_TOPIC, DEVICE_ID
+    MQTT_BASE_TOPIC, POWER_TELEMETRY_WILDCARD_TOPIC, TELEMETRY_VALIDATION,
+)
+from app.config.anomaly_detection import (
+    WINDOW_SIZE, STEP_SIZE,
+    DETECTION_QUEUE_SIZE, INFERENCE_BATCH_SIZE,
+    INFERENCE_BATCH_DEADLINE_MS, INFERENCE_STATS_INTERVAL,
+    INCREMENTAL_FEATURES,
 )
-from app.config.anomaly_detection import WINDOW_SIZE, STEP_SIZE
-from datetime import datetime, timezone
+from app.config.sharding import SHARDING_ENABLED, WORKER_ID
 import traceback
 
-MQTT_SUB_TOPIC = f"{MQTT_BASE_TOPIC}/{DEVICE_ID}/{POWER_TELEMETRY_SUBTOPIC}"
-MQTT_PUB_TOPIC = f"{MQTT_BASE_TOPIC}/{DEVICE_ID}/{ANOMALY_SUBTOPIC}"
+# Per-device sliding-window state: device_id -> timestamp of the newest
+# sample in the last window handed to detection. Keyed on timestamps so
+# it does not drift when the buffer trims old entries. A local cache of
+# the copy in Redis, which a device's next owner picks up after a rebalance.
+last_window_end = {}
+
+# Per-device running window statistics (INCREMENTAL_FEATURES only)
+rolling_features = {}
+
+def device_id_from_topic(topic: str):
+    prefix = f"{MQTT_BASE_TOPIC}/"
+    suffix = f"/{POWER_TELEMETRY_SUBTOPIC}"
+    if not (topic.startswith(prefix) and topic.endswith(suffix)):
+        return None
+    return topic[len(prefix):-len(suffix)] or None
+
+def anomaly_topic(device_id: str) -> str:
+    return f"{MQTT_BASE_TOPIC}/{device_id}/{ANOMALY_SUBTOPIC}"
 
-last_processed_index = None
+# MQTT client used to publish results from the scheduler thread
+mqtt_client = mqtt.Client()
+
+def send_anomalies_to_clients(device_id, result):
+    mqtt_client.publish(anomaly_topic(device_id), fast_json.dumps(result))
+
+# Ready windows from all devices, scored in micro-batches off the network thread
+scheduler = AnomalyBatchScheduler(
+    on_result=send_anomalies_to_clients,
+    max_batch_size=INFERENCE_BATCH_SIZE,
+    max_delay_ms=INFERENCE_BATCH_DEADLINE_MS,
+    queue_size=DETECTION_QUEUE_SIZE,
+    stats_interval=INFERENCE_STATS_INTERVAL,
+)
+
+def on_rebalance(ring):
+    """
+    Forget local state of devices that moved to another replica; if they
+    come back, the window position is reloaded from Redis.
+    """
+    for state in (last_window_end, rolling_features):
+        for device_id in list(state):
+            if ring.owner(device_id) != WORKER_ID:
+                state.pop(device_id, None)
+
+# This replica's share of the devices (see app/modules/sharding.py)
+membership = ShardMembership(telemetry_buffer.r, WORKER_ID, on_change=on_rebalance)
 
 def on_connect(client, userdata, flags, rc):
-    print("Connected to MQTT broker", flush=True)
-    client.subscribe(MQTT_SUB_TOPIC)
+    print(f"Connected to MQTT broker, watching {len(get_devices())} devices", flush=True)
+    client.subscribe(POWER_TELEMETRY_WILDCARD_TOPIC)
+
+def window_ready(device_id, window):
+    """
+    Whether STEP_SIZE new samples arrived since the device's last window.
+    Advances the device's window state when it returns True.
+    """
+    newest = entry_timestamp(window[-1])
+    if device_id not in last_window_end:
+        last_window_end[device_id] = get_window_end(device_id)
+    last_end = last_window_end[device_id]
+
+    if last_end is not None:
+        new_samples = sum(1 for entry in window if entry_timestamp(entry) > last_end)
+        if new_samples < STEP_SIZE:
+            return False
+
+    last_window_end[device_id] = newest
+    set_window_end(device_id, newest)
+    return True
+
+def update_rolling_features(device_id, window):
+    """
+    Push the samples that are newer than the device's rolling state.
+    Returns the state; its features() are only computed for ready windows.
+    """
+    rolling = rolling_features.setdefault(device_id, RollingWindowFeatures(WINDOW_SIZE))
+    timestamps, values = window_to_array(window)
+
+    last = rolling.last_timestamp
+    if last is None or timestamps[0] > last:
+        # Fresh device or a gap wider than the window: rebuild from this window
+        rolling.reset()
+        rolling.push(timestamps, values)
+    else:
+        newer = timestamps > last
+        rolling.push(timestamps[newer], values[newer])
+    return rolling
 
 def on_message(client, userdata, msg):
-    global last_processed_index
+    received_at = time.monotonic()
+    trace = start_trace(msg.topic)
     try:
-        data = json.loads(msg.payload.decode())
-        buffer_count = add_to_buffer(DEVICE_ID, data)
-
-        if buffer_count >= WINDOW_SIZE:
-            if last_processed_index is None:
-                # First time: start from the end of buffer minus WINDOW_SIZE (or 0 if smaller)
-                start_idx = max(0, buffer_count - WINDOW_SIZE)
-                # Fetch last WINDOW_SIZE entries (if get_buffer_slice supports it)
-                buffer = get_buffer_slice(DEVICE_ID, start_idx, WINDOW_SIZE)
-
-                result = detect_anomalies(DEVICE_ID, buffer)
-                if result:
-                    send_anomalies_to_clients(client, result)
-                
-                # Set last_processed_index to the index of last processed entry
-                last_processed_index = start_idx + WINDOW_SIZE - STEP_SIZE  # leave STEP_SIZE for next detection
-            else:
-                next_start = last_processed_index + STEP_SIZE
-
-                # Fetch STEP_SIZE entries from buffer starting at next_start
-                buffer = get_buffer_slice(DEVICE_ID, next_start, STEP_SIZE)
-                if len(buffer) < STEP_SIZE:
-                    return
-
-                # Run detection only on this STEP_SIZE chunk
-                result = detect_anomalies(DEVICE_ID, buffer)
-                if result:
-                    send_anomalies_to_clients(client, result)
-
-                # Update last_processed_index
-                last_processed_index = next_start
+        device_id = device_id_from_topic(msg.topic)
+        if device_id is None or not is_enabled(device_id):
+            return
+
+        try:
+            # Parsed and checked in one pass, before anything reaches the buffer
+            data = parse_power_telemetry(msg.payload) if TELEMETRY_VALIDATION else fast_json.loads(msg.payload)
+        except ValueError as e:
+            UNPARSEABLE_ENTRIES.labels(source="mqtt").inc()
+            print(f"Invalid telemetry from {device_id}: {e}", flush=True)
+            return
+
+        # Only the owner buffers and scores a device. Right after a rebalance the
+        # previous owner keeps buffering it too, so the buffer has no gap while
+        # the replicas' views of the fleet disagree
+        owned = not SHARDING_ENABLED or membership.owns(device_id)
+        if not owned and not membership.handing_over(device_id):
+            return
+
+        # Push, trim, count and read the newest window in one round trip
+        buffer_count, window = add_and_fetch_window(device_id, data, WINDOW_SIZE if owned else 0)
+        if not owned:
+            return
+        BUFFER_SIZE.labels(device_id=device_id).set(buffer_count)
+
+        rolling = update_rolling_features(device_id, window) if INCREMENTAL_FEATURES else None
+
+        if buffer_count >= WINDOW_SIZE and window_ready(device_id, window):
+            features = None
+            if rolling is not None and rolling.full:
+                with timed(FEATURE_EXTRACTION, "features:rolling", task="anomaly_rolling"):
+                    features = rolling.features()
+            scheduler.submit(device_id, window, features, received_at)
 
     except Exception as e:
         traceback.print_exc()
         print(f"Error: {e}")
+    finally:
+        finish_trace(trace)
 
-def send_anomalies_to_clients(client, result):
-    client.publish(MQTT_PUB_TOPIC, json.dumps(result))
+def exit_on_signal(signum, frame):
+    raise SystemExit(0)
 
 if __name__ == "__main__":
-    client = mqtt.Client()
-    client.on_connect = on_connect
-    client.on_message = on_message
-    client.connect(MQTT_BROKER, 1883, 60)
-    client.loop_forever()
+    migrate_legacy_buffers()
+    preload_models(forecasting=False)
+
+    start_exporter()
+    scheduler.start()
+    if SHARDING_ENABLED:
+        membership.start()
+    # docker stop / fleet shutdown: hand devices over instead of waiting for the lease to expire
+    signal.signal(signal.SIGTERM, exit_on_signal)
+
+    mqtt_client.on_connect = on_connect
+    mqtt_client.on_message = on_message
+    mqtt_client.connect(MQTT_BROKER, 1883, 60)
+    try:
+        mqtt_client.loop_forever()
+    finally:
+        if SHARDING_ENABLED:
+            membership.leave()
@@ -0,0 +1,70 @@
+"""
+Run several anomaly worker shards on one machine.
+
+    python -m app.workers.anomaly_fleet --shards 4 [--metrics-port 9100]
+
+Each shard is a separate `python -m app.workers.anomaly_detection` process
+(its own GIL) with its own WORKER_ID and METRICS_PORT (metrics-port + i).
+Shards split devices through the same Redis leases as replicas on separate
+hosts. A shard that exits is restarted, and the others cover its devices
+until it rejoins. Ctrl-C or SIGTERM stops every shard.
+"""
+import argparse
+import os
+import signal
+import socket
+import subprocess
+import sys
+import time
+
+RESTART_DELAY = 5 # seconds
+
+def spawn(index, metrics_port):
+    env = dict(
+        os.environ,
+        WORKER_ID=f"{socket.gethostname()}-shard-{index}",
+        METRICS_PORT=str(metrics_port + index),
+        SHARDING_ENABLED="true",
+    )
+    return subprocess.Popen([sys.executable, "-m", "app.workers.anomaly_detection"], env=env)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run anomaly worker shards locally")
+    parser.add_argument("--shards", type=int, default=os.cpu_count() or 2)
+    parser.add_argument("--metrics-port", type=int, default=int(os.getenv("METRICS_PORT", "9100")))
+    args = parser.parse_args(argv)
+
+    stopping = False
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+
+    shards = [spawn(i, args.metrics_port) for i in range(args.shards)]
+    exited_at = {}
+    print(f"[fleet] Started {args.shards} shards", flush=True)
+
+    while not stopping:
+        time.sleep(1)
+        for i, shard in enumerate(shards):
+            if shard.poll() is None:
+                continue
+            # Back off so a crash loop does not churn the ring
+            exited_at.setdefault(i, time.monotonic())
+            if time.monotonic() - exited_at[i] >= RESTART_DELAY:
+                print(f"[fleet] Shard {i} exited with {shard.returncode}, restarting", flush=True)
+                shards[i] = spawn(i, args.metrics_port)
+                del exited_at[i]
+
+    for shard in shards:
+        if shard.poll() is None:
+            shard.terminate()
+    for shard in shards:
+        shard.wait()
+    print("[fleet] Stopped", flush=True)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,314 @@
+"""
+Offline anomaly scoring of historical telemetry.
+
+    python -m app.workers.anomaly_replay telemetry.jsonl [--device-id ID]
+    python -m app.workers.anomaly_replay --from-db --start 2024-05-01 [--end 2024-06-01] [--device-id ID]
+    python -m app.workers.anomaly_replay --from-archive [--start ...] [--end ...] [--device-id ID]
+
+        [--output anomalies.jsonl] [--chunk-size 100000] [--batch-size 4096] [--processes N]
+
+Reads a JSONL dump (one telemetry entry per line, with a device_id field
+unless --device-id is given), persisted samples or the columnar archive,
+chunk_size entries at a time. Windows are cut exactly as the live worker cuts them: WINDOW_SIZE
+samples, every STEP_SIZE samples, per device. Each chunk's windows are
+strided views; their features are computed in one pass per device. JSON
+parsing, scaling and model calls run across a process pool, the model in
+batch_size blocks.
+Anomalies are written as JSONL ({"device_id", ...anomaly result}) in input
+order, followed by a throughput report. Memory stays bounded by the chunk
+size, the WINDOW_SIZE - 1 samples carried per device, and the chunks
+and batches in flight (a few per process).
+
+Each device's entries must be in time order, as dumps and database reads
+are. Samples older than the device's previous chunk are skipped and counted.
+"""
+import argparse
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+from app.config.anomaly_detection import WINDOW_SIZE, STEP_SIZE, TELEMETRIES
+from app.storage.telemetry_codec import to_epoch_seconds
+from app.utils import fast_json
+
+def _rows(timestamps, rows):
+    """
+    (timestamps, values) arrays for one device's samples, sorted by time.
+    """
+    timestamps = np.array(timestamps, dtype=np.float64)
+    values = np.array(rows, dtype=np.float64).reshape(len(rows), len(TELEMETRIES))
+    order = np.argsort(timestamps, kind="stable")
+    return timestamps[order], values[order]
+
+def parse_lines(lines, device_id=None):
+    """
+    Pool task: ({device_id: (timestamps, values)}, unparseable line count) for JSONL lines.
+    A line counts as unparseable unless it is a JSON object with a device,
+    a readable timestamp and numeric (or missing) telemetry values.
+    """
+    samples, unparseable = {}, 0
+    for line in lines:
+        try:
+            entry = fast_json.loads(line)
+            device = device_id or entry["device_id"]
+            timestamp = to_epoch_seconds(entry["timestamp"])
+            row = [np.nan if entry.get(col) is None else float(entry[col]) for col in TELEMETRIES]
+        except (ValueError, KeyError, TypeError, AttributeError):
+            unparseable += 1
+            continue
+        device_timestamps, device_rows = samples.setdefault(device, ([], []))
+        device_timestamps.append(timestamp)
+        device_rows.append(row)
+    return {device: _rows(*device_samples) for device, device_samples in samples.items()}, unparseable
+
+def read_jsonl(path, device_id=None, chunk_size=100_000, stats=None, pool=None, prefetch=1):
+    """
+    Yield {device_id: (timestamps, values)} for every chunk_size lines of a JSONL dump.
+    With a pool, up to prefetch chunks are parsed ahead in it; chunks still come out in file order.
+    """
+    def lines():
+        block = []
+        with open(path) as f:
+            for line in f:
+                if line.strip():
+                    block.append(line)
+                if len(block) >= chunk_size:
+                    yield block
+                    block = []
+        if block:
+            yield block
+
+    def finish(parsed):
+        chunk, unparseable = parsed
+        if stats is not None:
+            stats["unparseable"] += unparseable
+        return chunk
+
+    if pool is None:
+        for block in lines():
+            yield finish(parse_lines(block, device_id))
+        return
+
+    pending = deque()
+    for block in lines():
+        pending.append(pool.submit(parse_lines, block, device_id))
+        if len(pending) > prefetch:
+            yield finish(pending.popleft().result())
+    while pending:
+        yield finish(pending.popleft().result())
+
+def read_persisted(start, end=None, device_id=None, chunk_size=100_000):
+    """
+    Yield {device_id: (timestamps, values)} for every chunk_size persisted
+    samples, read with a server-side cursor.
+    """
+    from app.storage.database import connect
+
+    conditions, params = ["ts >= (to_timestamp(%s) AT TIME ZONE 'UTC')"], [start]
+    if end is not None:
+        conditions.append("ts < (to_timestamp(%s) AT TIME ZONE 'UTC')")
+        params.append(end)
+    if device_id is not None:
+        conditions.append("device_id = %s")
+        params.append(device_id)
+
+    conn = connect()
+    try:
+        with conn.cursor(name="anomaly_replay") as cur:
+            cur.itersize = chunk_size
+            cur.execute(
+                f"SELECT device_id, EXTRACT(EPOCH FROM ts), {', '.join(TELEMETRIES)} "
+                f"FROM telemetry_samples WHERE {' AND '.join(conditions)} ORDER BY device_id, ts",
+                params,
+            )
+            while True:
+                rows = cur.fetchmany(chunk_size)
+                if not rows:
+                    break
+                chunk = {}
+                for row in rows:
+                    chunk.setdefault(row[0], []).append(row[1:])
+                yield {
+                    device: (
+                        np.array([row[0] for row in device_rows], dtype=np.float64),
+                        np.array([row[1:] for row in device_rows], dtype=np.float64),
+                    )
+                    for device, device_rows in chunk.items()
+                }
+    finally:
+        conn.close()
+
+def read_archived(start=None, end=None, device_id=None, chunk_size=100_000):
+    """
+    Yield {device_id: (timestamps, values)} for up to chunk_size archived
+    samples at a time, straight from the memory-mapped columns.
+    """
+    from app.storage import telemetry_archive
+
+    for device in [device_id] if device_id else telemetry_archive.list_devices():
+        for timestamps, columns in telemetry_archive.iter_chunks(device, start, end, TELEMETRIES):
+            for i in range(0, len(timestamps), chunk_size):
+                yield {device: (
+                    np.asarray(timestamps[i:i + chunk_size]),
+                    np.column_stack([columns[col][i:i + chunk_size] for col in TELEMETRIES]),
+                )}
+
+class WindowCutter:
+    """
+    Cuts each device's stream into WINDOW_SIZE windows every STEP_SIZE
+    samples, carrying the samples of the next window over to the next chunk.
+    """
+
+    def __init__(self, window_size=WINDOW_SIZE, step_size=STEP_SIZE):
+        self.window_size = window_size
+        self.step_size = step_size
+        self._carry = {}
+        self.out_of_order = 0
+
+    def cut(self, device_id, timestamps, values):
+        """
+        (window timestamps (k, window), windows (k, window, channels)) as views.
+        """
+        carried = self._carry.get(device_id)
+        if carried is not None:
+            newer = timestamps > carried[0][-1] if len(carried[0]) else slice(None)
+            self.out_of_order += len(timestamps) - len(timestamps[newer])
+            timestamps = np.concatenate([carried[0], timestamps[newer]])
+            values = np.concatenate([carried[1], values[newer]])
+
+        n = len(timestamps)
+        if n < self.window_size:
+            self._carry[device_id] = (timestamps, values)
+            return None
+        count = (n - self.window_size) // self.step_size + 1
+        next_start = count * self.step_size
+        # Copies, so the chunk they came from can be freed
+        self._carry[device_id] = (timestamps[next_start:].copy(), values[next_start:].copy())
+
+        window_timestamps = sliding_window_view(timestamps, self.window_size)[::self.step_size]
+        windows = sliding_window_view(values, self.window_size, axis=0)[::self.step_size]
+        return window_timestamps, windows.transpose(0, 2, 1)
+
+def score_batch(device_id, features, window_timestamps):
+    """
+    Pool task: anomaly results for a block of one device's windows
+    (None for normal windows), scored with one forward pass.
+    """
+    from app.modules.anomaly_detection import score_windows
+    from app.modules.window_features import FEATURE_COLUMNS
+    from app.utils.model_loader import get_anomaly_detection_model
+    from app.utils.scaling import transform
+
+    model, scaler, threshold = get_anomaly_detection_model(device_id)
+    X_scaled = transform(scaler, features, FEATURE_COLUMNS)
+    prepared = [
+        {"timestamps": timestamps, "feature_names": FEATURE_COLUMNS, "X_scaled": row[np.newaxis]}
+        for timestamps, row in zip(window_timestamps, X_scaled)
+    ]
+    return score_windows(model, threshold, prepared)
+
+def replay(chunks, output, pool, batch_size=4096, max_in_flight=2, stats=None):
+    """
+    Score every window in chunks on pool (a ProcessPoolExecutor), writing
+    anomalies to output (a text file). Returns the run's stats.
+    """
+    from app.modules.window_features import extract_features_array
+
+    stats = stats if stats is not None else {"unparseable": 0}
+    stats.update(samples=0, windows=0, anomalies=0, errors=0)
+    cutter = WindowCutter()
+    in_flight = deque()
+    started = time.perf_counter()
+
+    def collect():
+        device_id, future = in_flight.popleft()
+        try:
+            results = future.result()
+        except Exception as e:
+            stats["errors"] += 1
+            print(f"[anomaly_replay] Scoring failed for {device_id}: {e!r}", file=sys.stderr, flush=True)
+            return
+        for result in results:
+            if result is not None:
+                stats["anomalies"] += 1
+                output.write(fast_json.dumps({"device_id": device_id, **result}).decode() + "\n")
+
+    for chunk in chunks:
+        for device_id, (timestamps, values) in chunk.items():
+            stats["samples"] += len(timestamps)
+            cut = cutter.cut(device_id, timestamps, values)
+            if cut is None:
+                continue
+            window_timestamps, windows = cut
+            features = extract_features_array(windows)
+            stats["windows"] += len(features)
+            for i in range(0, len(features), batch_size):
+                if len(in_flight) >= max_in_flight:
+                    collect()
+                in_flight.append((device_id, pool.submit(
+                    score_batch, device_id, features[i:i + batch_size],
+                    np.ascontiguousarray(window_timestamps[i:i + batch_size]),
+                )))
+    while in_flight:
+        collect()
+
+    stats["out_of_order"] = cutter.out_of_order
+    stats["seconds"] = time.perf_counter() - started
+    stats["windows_per_sec"] = stats["windows"] / stats["seconds"] if stats["seconds"] else 0.0
+    return stats
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Score historical telemetry for anomalies")
+    parser.add_argument("input", nargs="?", help="JSONL telemetry dump")
+    parser.add_argument("--from-db", action="store_true", help="Read persisted samples instead of a file")
+    parser.add_argument("--from-archive", action="store_true", help="Read the columnar archive instead of a file")
+    parser.add_argument("--start", help="With --from-db/--from-archive: first timestamp (ISO or epoch seconds)")
+    parser.add_argument("--end", help="With --from-db/--from-archive: end timestamp, exclusive")
+    parser.add_argument("--device-id", help="Only this device (for a file: the device every line belongs to)")
+    parser.add_argument("--output", default="anomalies.jsonl")
+    parser.add_argument("--chunk-size", type=int, default=100_000, help="Entries read at a time")
+    parser.add_argument("--batch-size", type=int, default=4096, help="Windows per model call")
+    parser.add_argument("--processes", type=int, default=os.cpu_count())
+    args = parser.parse_args(argv)
+
+    if args.from_db and not args.start:
+        parser.error("--from-db needs --start")
+    if not args.from_db and not args.from_archive and not args.input:
+        parser.error("give a JSONL file, --from-db or --from-archive")
+
+    stats = {"unparseable": 0}
+    processes = args.processes or 1
+    with ProcessPoolExecutor(max_workers=processes) as pool, open(args.output, "w") as output:
+        if args.from_db:
+            chunks = read_persisted(
+                to_epoch_seconds(args.start),
+                None if args.end is None else to_epoch_seconds(args.end),
+                args.device_id,
+                args.chunk_size,
+            )
+        elif args.from_archive:
+            chunks = read_archived(
+                None if args.start is None else to_epoch_seconds(args.start),
+                None if args.end is None else to_epoch_seconds(args.end),
+                args.device_id,
+                args.chunk_size,
+            )
+        else:
+            # Parsing is the costliest step for JSON dumps, so it runs on the pool too
+            chunks = read_jsonl(args.input, args.device_id, args.chunk_size, stats, pool, prefetch=processes)
+        stats = replay(chunks, output, pool, args.batch_size, 2 * processes, stats)
+
+    print(
+        f"[anomaly_replay] {stats['samples']} samples, {stats['windows']} windows, "
+        f"{stats['anomalies']} anomalies in {stats['seconds']:.1f}s "
+        f"({stats['windows_per_sec']:.0f} windows/sec); "
+        f"{stats['unparseable']} unparseable, {stats['out_of_order']} out of order, "
+        f"{stats['errors']} failed batches. Anomalies written to {args.output}",
+        flush=True,
+    )
+
+if __name__ == "__main__":
+    main()
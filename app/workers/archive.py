@@ -0,0 +1,106 @@
+import argparse
+import time
+import logging
+from app.config.archive import ARCHIVE_INTERVAL, ARCHIVE_PARTITION_SECONDS
+from app.config.persist import PERSIST_PAGE_SIZE
+from app.storage import telemetry_archive
+from app.storage.telemetry_buffer import get_buffers_since, list_buffered_devices
+from app.workers.persist import SAMPLE_COLUMNS
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
+
+def archive_cycle(new_entries):
+    """
+    Append every device's new entries to the archive, then compact the
+    partitions each device has moved past. Returns the number of samples written.
+    """
+    archived = 0
+    for device_id, entries in new_entries.items():
+        if not entries:
+            continue
+        archived += telemetry_archive.append(device_id, entries)
+        newest = telemetry_archive.newest_timestamp(device_id)
+        telemetry_archive.compact(device_id, before=newest // ARCHIVE_PARTITION_SECONDS * ARCHIVE_PARTITION_SECONDS)
+    return archived
+
+def backfill(start, end=None, device_id=None):
+    """
+    Archive persisted samples (telemetry_samples) newer than what each device
+    already has, reading with a server-side cursor. For a new archive, or after
+    the worker was down longer than the Redis buffers reach back.
+    """
+    from app.storage.database import connect
+
+    conditions, params = ["ts >= (to_timestamp(%s) AT TIME ZONE 'UTC')"], [start]
+    if end is not None:
+        conditions.append("ts < (to_timestamp(%s) AT TIME ZONE 'UTC')")
+        params.append(end)
+    if device_id is not None:
+        conditions.append("device_id = %s")
+        params.append(device_id)
+
+    conn = connect()
+    archived = 0
+    try:
+        with conn.cursor(name="telemetry_archive_backfill") as cur:
+            cur.itersize = PERSIST_PAGE_SIZE
+            cur.execute(
+                f"""
+                SELECT device_id, extract(epoch from ts), {", ".join(SAMPLE_COLUMNS)}
+                FROM telemetry_samples WHERE {" AND ".join(conditions)}
+                ORDER BY device_id, ts
+                """,
+                params,
+            )
+            while True:
+                rows = cur.fetchmany(PERSIST_PAGE_SIZE * 20)
+                if not rows:
+                    break
+                new_entries = {}
+                for row in rows:
+                    entry = {"timestamp": float(row[1]), **dict(zip(SAMPLE_COLUMNS, row[2:]))}
+                    new_entries.setdefault(row[0], []).append(entry)
+                archived += archive_cycle(new_entries)
+                logging.info(f"Backfilled {archived} samples")
+    finally:
+        conn.close()
+    return archived
+
+def main():
+    parser = argparse.ArgumentParser(description="Archive buffered telemetry to columnar files")
+    parser.add_argument("--from-db", action="store_true", help="Backfill from persisted samples and exit")
+    parser.add_argument("--start", type=float, help="With --from-db: range start, epoch seconds")
+    parser.add_argument("--end", type=float, help="With --from-db: range end, epoch seconds")
+    parser.add_argument("--device-id", help="With --from-db: only this device")
+    args = parser.parse_args()
+
+    if args.from_db:
+        if args.start is None:
+            parser.error("--from-db needs --start")
+        archived = backfill(args.start, args.end, args.device_id)
+        logging.info(f"Backfill done: {archived} samples archived")
+        return
+
+    logging.info("Starting telemetry archive worker")
+    while True:
+        started = time.monotonic()
+        try:
+            device_ids = list_buffered_devices()
+            new_entries = get_buffers_since({
+                device_id: telemetry_archive.newest_timestamp(device_id) for device_id in device_ids
+            })
+            archived = archive_cycle(new_entries)
+            logging.info(
+                f"Archived {archived} samples from {sum(1 for e in new_entries.values() if e)}"
+                f"/{len(device_ids)} devices in {time.monotonic() - started:.2f}s"
+            )
+        except Exception:
+            # Nothing is marked as archived until its chunk is in place, so the next cycle retries
+            logging.exception("Archive cycle failed")
+
+        logging.info(f"Sleeping for {ARCHIVE_INTERVAL} seconds...")
+        time.sleep(ARCHIVE_INTERVAL)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""
+Keeps precomputed forecasts for every horizon up to date as telemetry arrives.
+
+    python -m app.workers.forecast_precompute
+
+Follows the telemetry update channels (PUBLISH_UPDATES) and recomputes a
+device once FORECAST_PRECOMPUTE_EVERY seconds of new data have arrived, at
+most every FORECAST_PRECOMPUTE_MIN_INTERVAL seconds. Results land in Redis
+(app.storage.precomputed_forecasts), where the API serves them when
+FORECAST_PRECOMPUTED is set.
+"""
+import traceback
+from app.storage import telemetry_buffer
+from app.storage.telemetry_codec import decode, to_epoch_seconds
+from app.storage.devices import is_enabled
+from app.modules.forecast_precompute import ForecastPrecomputer
+from app.utils.model_loader import preload_models
+from app.utils.metrics import start_exporter, UNPARSEABLE_ENTRIES
+from app.config.buffer import UPDATE_CHANNEL_PREFIX
+from app.config.forecast import (
+    FORECAST_PRECOMPUTE_EVERY, FORECAST_PRECOMPUTE_MIN_INTERVAL, FORECAST_PRECOMPUTE_BATCH_SIZE,
+)
+from app.config.anomaly_detection import INFERENCE_STATS_INTERVAL
+
+precomputer = ForecastPrecomputer(
+    every_seconds=FORECAST_PRECOMPUTE_EVERY,
+    min_interval=FORECAST_PRECOMPUTE_MIN_INTERVAL,
+    batch_size=FORECAST_PRECOMPUTE_BATCH_SIZE,
+    stats_interval=INFERENCE_STATS_INTERVAL,
+)
+
+def on_update(message):
+    device_id = message["channel"].decode()[len(UPDATE_CHANNEL_PREFIX) + 1:]
+    if not is_enabled(device_id):
+        return
+    try:
+        timestamp = to_epoch_seconds(decode(message["data"])["timestamp"])
+    except Exception as e:
+        UNPARSEABLE_ENTRIES.labels(source="precompute").inc()
+        print(f"[forecast_precompute] Failed to parse update for {device_id}: {e}", flush=True)
+        return
+    precomputer.notify(device_id, timestamp)
+
+def main():
+    preload_models(anomaly_detection=False)
+    start_exporter()
+    precomputer.start()
+
+    pubsub = telemetry_buffer.r.pubsub(ignore_subscribe_messages=True)
+    pubsub.psubscribe(f"{UPDATE_CHANNEL_PREFIX}:*")
+    print("[forecast_precompute] Following telemetry updates", flush=True)
+    for message in pubsub.listen():
+        if message["type"] != "pmessage":
+            continue
+        try:
+            on_update(message)
+        except Exception:
+            traceback.print_exc()
+
+if __name__ == "__main__":
+    main()
@@ -1,55 +1,71 @@
-import os
+import argparse
 import time
 import logging
-from datetime import datetime, timedelta
-import redis
-import psycopg2
+from datetime import datetime
 from psycopg2.extras import execute_values
-import json
-from app.config.persist import PERSIST_INTERVAL
+from app.config.persist import PERSIST_INTERVAL, PERSIST_PAGE_SIZE
+from app.modules.persist import ROLLUP_SCHEMA, update_rollups
+from app.storage.database import connect
+from app.storage.telemetry_buffer import get_buffers_since, list_buffered_devices, entry_timestamp
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
 
-# Environment config
-REDIS_HOST = os.getenv("REDIS_HOST", "localhost")
-POSTGRES_HOST = os.getenv("POSTGRES_HOST", "localhost")
-POSTGRES_DB = os.getenv("POSTGRES_DB", "yourdb")
-POSTGRES_USER = os.getenv("POSTGRES_USER", "youruser")
-POSTGRES_PASSWORD = os.getenv("POSTGRES_PASSWORD", "yourpassword")
-
-# Redis client
-r = redis.Redis(host=REDIS_HOST, port=6379, db=0)
-
-def _buffer_key(device_id: str) -> str:
-    return f"telemetry_buffer:{device_id}"
-
-def get_devices():
-    """
-    Retrieve all device IDs from Redis keys pattern.
-    Assumes telemetry buffers are stored as telemetry_buffer:<device_id>
-    """
-    keys = r.keys("telemetry_buffer:*")
-    device_ids = [k.decode().split(":")[1] for k in keys]
-    return device_ids
+SAMPLE_COLUMNS = ["voltage", "current", "power", "energy", "frequency", "pf", "is_on"]
+
+"""
+Tables written by this worker. Samples are keyed by (device_id, ts) and
+the per-device watermark is committed in the same transaction as the rows
+it covers, so a crashed cycle is simply redone and never double-counted.
+"""
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS telemetry_samples (
+    device_id TEXT NOT NULL,
+    ts TIMESTAMP NOT NULL,
+    voltage FLOAT,
+    current FLOAT,
+    power FLOAT,
+    energy FLOAT,
+    frequency FLOAT,
+    pf FLOAT,
+    is_on BOOLEAN,
+    PRIMARY KEY (device_id, ts)
+);
+CREATE TABLE IF NOT EXISTS telemetry_aggregates (
+    id SERIAL PRIMARY KEY,
+    device_id TEXT NOT NULL,
+    avg_voltage FLOAT,
+    avg_current FLOAT,
+    avg_pf FLOAT,
+    sample_count INT,
+    aggregated_at TIMESTAMP
+);
+ALTER TABLE telemetry_aggregates ADD COLUMN IF NOT EXISTS period_start TIMESTAMP;
+ALTER TABLE telemetry_aggregates ADD COLUMN IF NOT EXISTS period_end TIMESTAMP;
+CREATE UNIQUE INDEX IF NOT EXISTS telemetry_aggregates_period
+    ON telemetry_aggregates (device_id, period_end);
+CREATE TABLE IF NOT EXISTS telemetry_persist_watermarks (
+    device_id TEXT PRIMARY KEY,
+    persisted_until DOUBLE PRECISION NOT NULL
+);
+"""
+
+def ensure_schema(conn):
+    with conn.cursor() as cur:
+        cur.execute(SCHEMA)
+        cur.execute(ROLLUP_SCHEMA)
+    conn.commit()
 
-def get_buffer(device_id, starts_at=None):
+def get_watermarks(conn):
     """
-    Retrieve buffered telemetry for a device, optionally filtering by timestamp.
+    Epoch seconds of the newest persisted sample, per device.
     """
-    raw_entries = r.lrange(_buffer_key(device_id), 0, -1)
-    entries = []
-    for raw in raw_entries:
-        try:
-            entry = json.loads(raw)
-            if starts_at:
-                entry_ts = datetime.fromisoformat(entry["timestamp"])
-                if entry_ts <= starts_at:
-                    continue
-            entries.append(entry)
-        except Exception as e:
-            logging.warning(f"Failed to parse telemetry for device {device_id}: {e}")
-    return entries
+    with conn.cursor() as cur:
+        cur.execute("SELECT device_id, persisted_until FROM telemetry_persist_watermarks")
+        watermarks = dict(cur.fetchall())
+    # Don't hold the read transaction open through the Redis reads and the sleep
+    conn.commit()
+    return watermarks
 
 def aggregate_telemetry(entries):
     """
@@ -75,58 +91,122 @@ def aggregate_telemetry(entries):
         "avg_current": current_sum / count,
         "avg_pf": pf_sum / count,
         "sample_count": count,
-        "aggregated_at": datetime.utcnow().isoformat()
+        "aggregated_at": datetime.utcnow().isoformat(),
+        "period_start": entry_timestamp(entries[0]),
+        "period_end": entry_timestamp(entries[-1]),
     }
 
-def persist_aggregation(conn, device_id, agg):
+def sample_row(device_id, entry):
+    row = [device_id, entry_timestamp(entry)]
+    for column in SAMPLE_COLUMNS:
+        value = entry.get(column)
+        row.append(bool(value) if column == "is_on" and value is not None else value)
+    return row
+
+def persist_cycle(conn, new_entries):
     """
-    Insert aggregated data into PostgreSQL table.
-    Assumes a table like:
-    CREATE TABLE telemetry_aggregates (
-        id SERIAL PRIMARY KEY,
-        device_id TEXT NOT NULL,
-        avg_voltage FLOAT,
-        avg_current FLOAT,
-        avg_pf FLOAT,
-        sample_count INT,
-        aggregated_at TIMESTAMP
-    );
+    Write every device's new samples, aggregates, rollups and watermarks in one
+    transaction: one batched statement per table for the whole cycle.
     """
+    samples, aggregates, watermarks = [], [], []
+    for device_id, entries in new_entries.items():
+        if not entries:
+            continue
+        samples.extend(sample_row(device_id, entry) for entry in entries)
+        agg = aggregate_telemetry(entries)
+        aggregates.append((
+            device_id, agg["avg_voltage"], agg["avg_current"], agg["avg_pf"],
+            agg["sample_count"], agg["aggregated_at"], agg["period_start"], agg["period_end"],
+        ))
+        watermarks.append((device_id, agg["period_end"]))
+
+    if not samples:
+        return 0
+
+    epoch = "(to_timestamp(%s) AT TIME ZONE 'UTC')"
     with conn.cursor() as cur:
-        cur.execute(
+        execute_values(
+            cur,
+            f"""
+            INSERT INTO telemetry_samples (device_id, ts, {", ".join(SAMPLE_COLUMNS)})
+            VALUES %s
+            ON CONFLICT (device_id, ts) DO NOTHING
+            """,
+            samples,
+            template=f"(%s, {epoch}, %s, %s, %s, %s, %s, %s, %s)",
+            page_size=PERSIST_PAGE_SIZE,
+        )
+        execute_values(
+            cur,
             """
             INSERT INTO telemetry_aggregates
-            (device_id, avg_voltage, avg_current, avg_pf, sample_count, aggregated_at)
-            VALUES (%s, %s, %s, %s, %s, %s)
+            (device_id, avg_voltage, avg_current, avg_pf, sample_count, aggregated_at, period_start, period_end)
+            VALUES %s
+            ON CONFLICT (device_id, period_end) DO NOTHING
+            """,
+            aggregates,
+            template=f"(%s, %s, %s, %s, %s, %s, {epoch}, {epoch})",
+            page_size=PERSIST_PAGE_SIZE,
+        )
+        execute_values(
+            cur,
+            """
+            INSERT INTO telemetry_persist_watermarks (device_id, persisted_until)
+            VALUES %s
+            ON CONFLICT (device_id) DO UPDATE
+            SET persisted_until = GREATEST(telemetry_persist_watermarks.persisted_until, EXCLUDED.persisted_until)
             """,
-            (device_id, agg["avg_voltage"], agg["avg_current"], agg["avg_pf"], agg["sample_count"], agg["aggregated_at"])
+            watermarks,
         )
+        # Rebuild the rollup buckets this cycle's samples fall into
+        update_rollups(cur, {row[0]: row[6] for row in aggregates})
+    conn.commit()
+    return len(samples)
+
+def rebuild_rollups(conn):
+    """
+    Recompute every rollup from the persisted samples, e.g. after changing ROLLUP_RESOLUTIONS.
+    """
+    with conn.cursor() as cur:
+        cur.execute("SELECT device_id, extract(epoch from min(ts)) FROM telemetry_samples GROUP BY device_id")
+        update_rollups(cur, {device_id: float(since) for device_id, since in cur.fetchall()})
     conn.commit()
 
 def main():
+    parser = argparse.ArgumentParser(description="Persist buffered telemetry to Postgres")
+    parser.add_argument("--rebuild-rollups", action="store_true", help="Recompute all rollups and exit")
+    args = parser.parse_args()
+
     logging.info("Starting telemetry persist worker")
-    pg_conn = psycopg2.connect(
-        host=POSTGRES_HOST,
-        database=POSTGRES_DB,
-        user=POSTGRES_USER,
-        password=POSTGRES_PASSWORD
-    )
+    pg_conn = connect()
+    ensure_schema(pg_conn)
+
+    if args.rebuild_rollups:
+        rebuild_rollups(pg_conn)
+        logging.info("Rebuilt telemetry rollups")
+        return
 
     while True:
-        start_time = datetime.utcnow() - timedelta(seconds=PERSIST_INTERVAL)
-        device_ids = get_devices()
-        logging.info(f"Found devices to aggregate: {device_ids}")
-
-        for device_id in device_ids:
-            entries = get_buffer(device_id, starts_at=start_time)
-            if not entries:
-                logging.info(f"No new data for device {device_id}, skipping.")
-                continue
-
-            agg = aggregate_telemetry(entries)
-            if agg:
-                persist_aggregation(pg_conn, device_id, agg)
-                logging.info(f"Persisted aggregation for device {device_id}")
+        started = time.monotonic()
+        try:
+            device_ids = list_buffered_devices()
+            watermarks = get_watermarks(pg_conn)
+            new_entries = get_buffers_since({
+                device_id: watermarks.get(device_id) for device_id in device_ids
+            })
+            persisted = persist_cycle(pg_conn, new_entries)
+            logging.info(
+                f"Persisted {persisted} samples from {sum(1 for e in new_entries.values() if e)}"
+                f"/{len(device_ids)} devices in {time.monotonic() - started:.2f}s"
+            )
+        except Exception:
+            # Postgres or Redis failed. Nothing from this cycle was committed;
+            # the watermarks make the retry exact
+            logging.exception("Persist cycle failed, rolling back")
+            if pg_conn.closed:
+                pg_conn = connect()
+            else:
+                pg_conn.rollback()
 
         logging.info(f"Sleeping for {PERSIST_INTERVAL} seconds...")
         time.sleep(PERSIST_INTERVAL)
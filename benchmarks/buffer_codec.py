@@ -0,0 +1,79 @@
+"""
+Per-device memory and decode-speed comparison of the buffer codecs.
+
+    python -m benchmarks.buffer_codec [--entries 3600] [--repeat 20] [--redis]
+
+With --redis, each encoded buffer is also written to a scratch sorted set
+on REDIS_HOST and measured with MEMORY USAGE.
+"""
+import argparse
+import json
+import random
+import time
+from app.config.buffer import MAX_BUFFER_SIZE
+from app.config.anomaly_detection import TELEMETRIES, WINDOW_SIZE
+from app.storage.telemetry_codec import CODECS, encode, decode, decode_array
+
+def synthetic_entries(count, start=1_700_000_000):
+    entries = []
+    energy = 0.0
+    for i in range(count):
+        voltage = random.uniform(215.0, 235.0)
+        current = random.uniform(0.0, 0.5)
+        pf = random.uniform(0.5, 1.0)
+        power = voltage * current * pf
+        energy += power / 3600
+        entries.append({
+            "timestamp": start + i,
+            "voltage": voltage,
+            "current": current,
+            "pf": pf,
+            "is_on": True,
+            "power": power,
+            "energy": energy,
+            "frequency": random.uniform(49.9, 50.1),
+        })
+    return entries
+
+def _timed(fn, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat * 1000
+
+def redis_memory_usage(encoded):
+    from app.storage.telemetry_buffer import r
+    key = "benchmark:buffer_codec"
+    r.delete(key)
+    r.zadd(key, {raw: i for i, raw in enumerate(encoded)})
+    usage = r.memory_usage(key)
+    r.delete(key)
+    return usage
+
+def run(entries_count, repeat, use_redis):
+    entries = synthetic_entries(entries_count)
+    fields = ["timestamp", *TELEMETRIES]
+    results = {}
+
+    for codec in CODECS:
+        encoded = [encode(entry, codec) for entry in entries]
+        encoded = [raw.encode() if isinstance(raw, str) else raw for raw in encoded]
+        window = encoded[-WINDOW_SIZE:]
+
+        results[codec] = {
+            "payload_bytes": sum(len(raw) for raw in encoded),
+            "redis_bytes": redis_memory_usage(encoded) if use_redis else None,
+            "decode_dicts_ms": _timed(lambda: [decode(raw) for raw in encoded], repeat),
+            "decode_array_ms": _timed(lambda: decode_array(encoded, fields), repeat),
+            "decode_window_array_ms": _timed(lambda: decode_array(window, fields), repeat),
+        }
+    return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--entries", type=int, default=MAX_BUFFER_SIZE)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--redis", action="store_true")
+    args = parser.parse_args()
+
+    print(json.dumps(run(args.entries, args.repeat, args.redis), indent=2))
@@ -0,0 +1,71 @@
+"""
+Per-request forecast preprocessing latency: the previous DataFrame path
+against the NumPy path in app.modules.forecast.
+
+    python -m benchmarks.forecast_preprocessing [--history 600] [--horizon 600] [--repeat 200]
+
+Both paths turn a buffered history into the model input rows and the
+future output timestamps; scaling and inference are left out.
+"""
+import argparse
+import json
+import time
+from datetime import timedelta
+import numpy as np
+import pandas as pd
+from app.config.forecast import SEQUENCE_LENGTH
+from app.modules.forecast import features, forecast_input, future_timestamps
+from benchmarks.buffer_codec import synthetic_entries
+
+def dataframe_preprocess(history_data, horizon):
+    history = pd.DataFrame(history_data)
+
+    history['timestamp'] = pd.to_datetime(history['timestamp'], unit='s')
+    history['minute'] = history['timestamp'].dt.minute
+    history['hour'] = history['timestamp'].dt.hour
+    history['minute_sin'] = np.sin(2 * np.pi * history['minute'] / 60)
+    history['minute_cos'] = np.cos(2 * np.pi * history['minute'] / 60)
+    history['hour_sin'] = np.sin(2 * np.pi * history['hour'] / 24)
+    history['hour_cos'] = np.cos(2 * np.pi * history['hour'] / 24)
+
+    X_seq = history[features].values[-SEQUENCE_LENGTH:]
+    last_time = history['timestamp'].iloc[-1]
+    timestamps = [(last_time + timedelta(seconds=i+1)).isoformat() for i in range(horizon)]
+    return X_seq, timestamps
+
+def numpy_preprocess(history_data, horizon):
+    X_seq, epoch = forecast_input(history_data)
+    return X_seq, future_timestamps(epoch[-1], horizon)
+
+def _timed(fn, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat * 1000
+
+def run(history, horizon, repeat):
+    entries = synthetic_entries(history)
+
+    X_before, ts_before = dataframe_preprocess(entries, horizon)
+    X_after, ts_after = numpy_preprocess(entries, horizon)
+
+    before_ms = _timed(lambda: dataframe_preprocess(entries, horizon), repeat)
+    after_ms = _timed(lambda: numpy_preprocess(entries, horizon), repeat)
+    return {
+        "history": history,
+        "horizon": horizon,
+        "dataframe_ms": before_ms,
+        "numpy_ms": after_ms,
+        "speedup": before_ms / after_ms,
+        "max_abs_diff": float(np.max(np.abs(X_before - X_after))),
+        "timestamps_equal": ts_before == ts_after,
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--history", type=int, default=600)
+    parser.add_argument("--horizon", type=int, default=600)
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    print(json.dumps(run(args.history, args.horizon, args.repeat), indent=2))
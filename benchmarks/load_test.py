@@ -0,0 +1,230 @@
+"""
+End-to-end load test against local stand-ins (see benchmarks/standins.py).
+
+    python -m benchmarks.load_test [--devices 50] [--messages 300]
+        [--requests 2000] [--concurrency 32] [--inference-backend thread|process]
+        [--output PATH] [--compare BASELINE]
+
+Measures, with fakeredis, an in-process MQTT broker and random-weight models:
+  ingest    telemetry msgs/sec through the anomaly worker's on_message
+  anomaly   per-window detection latency, alone and in micro-batches
+  api       p50/p99 latency of /forecast (cached and uncached) and
+            /telemetry/.../latest under concurrent requests
+
+Results are written as JSON (by default benchmarks/results/load_test-<commit>.json);
+--compare prints the relative change of every metric against an earlier result.
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import tempfile
+import time
+from datetime import datetime, timezone
+import numpy as np
+from benchmarks import standins
+
+def _percentiles(latencies_ms):
+    latencies = np.asarray(latencies_ms)
+    return {
+        "count": int(latencies.size),
+        "p50_ms": float(np.percentile(latencies, 50)),
+        "p99_ms": float(np.percentile(latencies, 99)),
+        "mean_ms": float(latencies.mean()),
+    }
+
+def _device_ids(count):
+    return [f"benchmark-device-{i:04d}" for i in range(count)]
+
+def run_ingest(broker, device_ids, messages_per_device):
+    from benchmarks.buffer_codec import synthetic_entries
+    from app.config.mqtt import MQTT_BASE_TOPIC, POWER_TELEMETRY_SUBTOPIC
+    from app.workers import anomaly_detection as worker
+
+    worker.mqtt_client = broker.client()
+    subscriber = broker.client()
+    subscriber.on_connect = worker.on_connect
+    subscriber.on_message = worker.on_message
+    subscriber.connect()
+    worker.scheduler.start()
+
+    # Interleave devices the way a live fleet reports: one sample each per second
+    entries = synthetic_entries(messages_per_device, start=int(time.time()) - messages_per_device)
+    payloads = [
+        (f"{MQTT_BASE_TOPIC}/{device_id}/{POWER_TELEMETRY_SUBTOPIC}", json.dumps(entry))
+        for entry in entries
+        for device_id in device_ids
+    ]
+
+    publisher = broker.client()
+    started = time.perf_counter()
+    for topic, payload in payloads:
+        publisher.publish(topic, payload)
+    elapsed = time.perf_counter() - started
+
+    drain_started = time.perf_counter()
+    while worker.scheduler.pending():
+        time.sleep(0.01)
+
+    return {
+        "messages": len(payloads),
+        "seconds": elapsed,
+        "msgs_per_sec": len(payloads) / elapsed,
+        "drain_seconds": time.perf_counter() - drain_started,
+        "scheduler": worker.scheduler.stats(),
+        "anomalies_published": worker.mqtt_client.published,
+    }
+
+def run_anomaly(device_ids, windows, batch_size):
+    from benchmarks.buffer_codec import synthetic_entries
+    from app.config.anomaly_detection import WINDOW_SIZE
+    from app.modules.anomaly_detection import detect_anomalies, prepare_window, score_windows
+
+    entries = synthetic_entries(WINDOW_SIZE + windows)
+    samples = [entries[i:i + WINDOW_SIZE] for i in range(windows)]
+    device_id = device_ids[0]
+    detect_anomalies(device_id, samples[0])  # load the model
+
+    single = []
+    for window in samples:
+        started = time.perf_counter()
+        detect_anomalies(device_id, window)
+        single.append((time.perf_counter() - started) * 1000)
+
+    batched = []
+    for i in range(0, len(samples), batch_size):
+        chunk = samples[i:i + batch_size]
+        started = time.perf_counter()
+        prepared = [prepare_window(device_id, window) for window in chunk]
+        score_windows(prepared[0][0], prepared[0][1], [p for _, _, p in prepared])
+        batched.append((time.perf_counter() - started) * 1000 / len(chunk))
+
+    return {
+        "single_window": _percentiles(single),
+        "batched_per_window": {**_percentiles(batched), "batch_size": batch_size},
+    }
+
+async def _load(client, paths, requests, concurrency):
+    latencies, errors = [], 0
+    counter = iter(range(requests))
+
+    async def worker():
+        nonlocal errors
+        for i in counter:
+            started = time.perf_counter()
+            response = await client.get(paths[i % len(paths)])
+            latencies.append((time.perf_counter() - started) * 1000)
+            errors += response.status_code >= 400
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    return {**_percentiles(latencies), "errors": errors, "requests_per_sec": requests / elapsed}
+
+async def run_api(device_ids, requests, concurrency):
+    import httpx
+    from app import server
+
+    # ASGITransport does not run the app's lifespan
+    if server.INFERENCE_BACKEND == "process":
+        server.inference_pool.pool.start()
+
+    transport = httpx.ASGITransport(app=server.app)
+    try:
+        async with httpx.AsyncClient(transport=transport, base_url="http://benchmark") as client:
+            results = {}
+            forecast_paths = [f"/forecast/{device_id}?horizon=60" for device_id in device_ids]
+
+            results["forecast_cached"] = await _load(client, forecast_paths, requests, concurrency)
+
+            server.FORECAST_CACHE_ENABLED = False
+            try:
+                results["forecast_uncached"] = await _load(client, forecast_paths, requests, concurrency)
+            finally:
+                server.FORECAST_CACHE_ENABLED = True
+
+            results["telemetry_latest"] = await _load(
+                client,
+                [f"/telemetry/power-consumption/{device_id}/latest" for device_id in device_ids],
+                requests,
+                concurrency,
+            )
+    finally:
+        server.inference_pool.pool.close()
+    return results
+
+def _git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True).strip()
+    except Exception:
+        return "unknown"
+
+def _flatten(result, prefix=""):
+    flat = {}
+    for key, value in result.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(_flatten(value, f"{name}."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[name] = value
+    return flat
+
+def compare(current, baseline):
+    """
+    Relative change (%) of every numeric metric present in both results.
+    """
+    now, before = _flatten(current), _flatten(baseline)
+    return {
+        name: (now[name] - before[name]) / before[name] * 100
+        for name in sorted(now.keys() & before.keys())
+        if before[name] and not name.startswith("config.")
+    }
+
+def run(args):
+    device_ids = _device_ids(args.devices)
+    os.environ["INFERENCE_BACKEND"] = args.inference_backend
+    with tempfile.TemporaryDirectory() as models_dir:
+        standins.install(models_dir, device_ids)
+        broker = standins.InProcessBroker()
+
+        return {
+            "commit": _git_commit(),
+            "created_at": datetime.now(tz=timezone.utc).isoformat(),
+            "config": {
+                "devices": args.devices,
+                "messages_per_device": args.messages,
+                "requests": args.requests,
+                "concurrency": args.concurrency,
+                "inference_backend": args.inference_backend,
+            },
+            "ingest": run_ingest(broker, device_ids, args.messages),
+            "anomaly": run_anomaly(device_ids, args.windows, args.batch_size),
+            "api": asyncio.run(run_api(device_ids, args.requests, args.concurrency)),
+        }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--devices", type=int, default=50)
+    parser.add_argument("--messages", type=int, default=300, help="Messages per device")
+    parser.add_argument("--windows", type=int, default=500, help="Windows for the anomaly latency run")
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--requests", type=int, default=2000, help="Requests per API scenario")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--inference-backend", choices=["thread", "process"], default="thread")
+    parser.add_argument("--output", help="Result file (default: benchmarks/results/load_test-<commit>.json)")
+    parser.add_argument("--compare", help="Earlier result file to compare against")
+    args = parser.parse_args()
+
+    result = run(args)
+    output = args.output or os.path.join("benchmarks", "results", f"load_test-{result['commit']}.json")
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(result, f, indent=2)
+    print(json.dumps(result, indent=2))
+    print(f"Results written to {output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        print(json.dumps(compare(result, baseline), indent=2))
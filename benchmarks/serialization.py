@@ -0,0 +1,79 @@
+"""
+Per-message and per-response serialization cost, stdlib json against the
+fast_json layer.
+
+    python -m benchmarks.serialization [--messages 20000] [--points 600] [--repeat 50]
+
+message_us: parsing one MQTT payload (stdlib json.loads, fast_json.loads, and
+parse + PowerTelemetry validation as ingest does it), plus encoding one
+buffered entry. response_ms: building and serializing a /latest response of
+--points buffered entries, per buffer codec, as per-point dicts through
+FastAPI's encoder ("points") and as pre-serialized columns ("columns").
+"""
+import argparse
+import json
+import time
+from app.interfaces.power_telemetry import parse_power_telemetry
+from app.modules.stream import format_power_point
+from app.storage.telemetry_codec import CODECS, encode, decode, decode_array
+from app.utils import fast_json
+from benchmarks.buffer_codec import synthetic_entries
+
+def _per_call_us(fn, items):
+    start = time.perf_counter()
+    for item in items:
+        fn(item)
+    return (time.perf_counter() - start) / len(items) * 1e6
+
+def _timed(fn, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat * 1000
+
+def points_response(encoded):
+    from fastapi.encoders import jsonable_encoder
+
+    entries = [decode(raw) for raw in encoded]
+    content = {"latest_power": [format_power_point(entry) for entry in entries]}
+    return json.dumps(jsonable_encoder(content)).encode()
+
+def columns_response(encoded):
+    timestamps, power = decode_array(encoded, ["timestamp", "power"]).T.copy()
+    return fast_json.dumps({"latest_power": {"timestamps": timestamps, "power": power}})
+
+def run(messages, points, repeat):
+    entries = synthetic_entries(messages)
+    payloads = [json.dumps(entry).encode() for entry in entries]
+
+    results = {
+        "fast_json_backend": "orjson" if fast_json.orjson is not None else "json",
+        "message_us": {
+            "parse_json": _per_call_us(lambda raw: json.loads(raw.decode()), payloads),
+            "parse_fast_json": _per_call_us(fast_json.loads, payloads),
+            "parse_and_validate": _per_call_us(parse_power_telemetry, payloads),
+            "encode_entry_json": _per_call_us(json.dumps, entries),
+            "encode_entry_fast_json": _per_call_us(fast_json.dumps, entries),
+        },
+        "response_ms": {},
+    }
+
+    for codec in CODECS:
+        encoded = [encode(entry, codec) for entry in entries[:points]]
+        encoded = [raw.encode() if isinstance(raw, str) else raw for raw in encoded]
+        results["response_ms"][codec] = {
+            "points": _timed(lambda: points_response(encoded), repeat),
+            "columns": _timed(lambda: columns_response(encoded), repeat),
+            "points_bytes": len(points_response(encoded)),
+            "columns_bytes": len(columns_response(encoded)),
+        }
+    return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=20000)
+    parser.add_argument("--points", type=int, default=600)
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    print(json.dumps(run(args.messages, args.points, args.repeat), indent=2))
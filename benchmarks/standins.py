@@ -0,0 +1,183 @@
+"""
+Local stand-ins for the services the app is wired to, for benchmarks.
+
+    models_dir = tempfile.mkdtemp()
+    install(models_dir, device_ids)   # before any other app import
+    broker = InProcessBroker()
+
+install() points the model manifest at tiny random-weight NumPy models and
+swaps the Redis clients of the storage modules for one shared fakeredis
+server. InProcessBroker delivers MQTT publishes synchronously to
+subscribed clients in the publishing thread.
+"""
+import json
+import os
+from collections import namedtuple
+import numpy as np
+
+Message = namedtuple("Message", ["topic", "payload"])
+
+def _dense(rng, n_in, n_out):
+    return {
+        "kernel": rng.normal(0, 1 / np.sqrt(n_in), (n_in, n_out)).astype(np.float32),
+        "bias": np.zeros(n_out, dtype=np.float32),
+    }
+
+def _lstm(rng, n_in, units):
+    return {
+        "kernel": rng.normal(0, 1 / np.sqrt(n_in), (n_in, 4 * units)).astype(np.float32),
+        "recurrent_kernel": rng.normal(0, 1 / np.sqrt(units), (units, 4 * units)).astype(np.float32),
+        "bias": np.zeros(4 * units, dtype=np.float32),
+    }
+
+def _save_model(path, layers):
+    arrays = {
+        f"{index}/{name}": value
+        for index, (_, weights) in enumerate(layers)
+        for name, value in weights.items()
+    }
+    np.savez(path, config=np.array(json.dumps([config for config, _ in layers])), **arrays)
+
+def _save_scaler(path, n_features, feature_names=None, scale=1.0):
+    params = {
+        "kind": np.array("StandardScaler"),
+        "mean_": np.zeros(n_features),
+        "scale_": np.full(n_features, scale),
+        "with_mean": np.array(True),
+        "with_std": np.array(True),
+    }
+    if feature_names is not None:
+        params["feature_names_in_"] = np.asarray(feature_names, dtype=str)
+    np.savez(path, **params)
+
+def write_random_models(directory, horizons, sequence_length, forecast_features, anomaly_features, units=16, seed=0):
+    """
+    Random-weight models shaped like the real ones, exported for the NumPy runtime.
+    Writes manifest.json, where every device falls back to the default class.
+    """
+    rng = np.random.default_rng(seed)
+    path = lambda name: os.path.join(directory, name)
+
+    forecast_models = {}
+    for horizon in horizons:
+        _save_model(path(f"forecast.{horizon}s.npz"), [
+            ({"class_name": "LSTM", "activation": "tanh", "recurrent_activation": "sigmoid", "return_sequences": False},
+             _lstm(rng, len(forecast_features), units)),
+            ({"class_name": "Dense", "activation": "linear"}, _dense(rng, units, horizon)),
+        ])
+        forecast_models[str(horizon)] = path(f"forecast.{horizon}s.keras")
+    _save_scaler(path("forecast.scaler_x.npz"), len(forecast_features), forecast_features, scale=100.0)
+    _save_scaler(path("forecast.scaler_y.npz"), 1)
+
+    n = len(anomaly_features)
+    _save_model(path("anomaly-detection.npz"), [
+        ({"class_name": "Dense", "activation": "relu"}, _dense(rng, n, units)),
+        ({"class_name": "Dense", "activation": "linear"}, _dense(rng, units, n)),
+    ])
+    _save_scaler(path("anomaly-detection.scaler.npz"), n, anomaly_features, scale=100.0)
+
+    manifest = {
+        "default_class": "benchmark",
+        "classes": {
+            "benchmark": {
+                "anomaly_detection": {
+                    "model": path("anomaly-detection.keras"),
+                    "scaler": path("anomaly-detection.scaler.pkl"),
+                },
+                "forecast": {
+                    "models": forecast_models,
+                    "scaler_x": path("forecast.scaler_x.pkl"),
+                    "scaler_y": path("forecast.scaler_y.pkl"),
+                },
+            }
+        },
+    }
+    with open(path("manifest.json"), "w") as f:
+        json.dump(manifest, f)
+
+def install(models_dir, device_ids):
+    """
+    Configure the app for an isolated run. Must run before app modules are imported,
+    since configuration is read from the environment at import time.
+    """
+    import fakeredis
+    import fakeredis.aioredis
+
+    os.environ["MODEL_MANIFEST"] = os.path.join(models_dir, "manifest.json")
+    os.environ["MODEL_RUNTIME"] = "numpy"
+    os.environ["MODEL_RELOAD_CHECK_INTERVAL"] = "3600"
+    os.environ["FORECAST_PERSISTED_FALLBACK"] = "false"
+    os.environ["INFERENCE_STATS_INTERVAL"] = "0"
+
+    from app.config.forecast import ALLOWED_HORIZONS, SEQUENCE_LENGTH
+    from app.modules.forecast import features as forecast_features
+    from app.modules.window_features import FEATURE_COLUMNS
+    from app.storage import telemetry_buffer, async_telemetry_buffer, forecast_cache, devices
+
+    write_random_models(models_dir, ALLOWED_HORIZONS, SEQUENCE_LENGTH, forecast_features, FEATURE_COLUMNS)
+
+    server = fakeredis.FakeServer()
+    r = fakeredis.FakeRedis(server=server)
+    ar = fakeredis.aioredis.FakeRedis(server=server)
+
+    telemetry_buffer.r = r
+    telemetry_buffer._ingest_script = r.register_script(telemetry_buffer._INGEST_LUA)
+    telemetry_buffer._latest_window_script = r.register_script(telemetry_buffer._LATEST_WINDOW_LUA)
+    async_telemetry_buffer.ar = ar
+    async_telemetry_buffer._latest_window_script = ar.register_script(async_telemetry_buffer._LATEST_WINDOW_LUA)
+    if async_telemetry_buffer.cache is not None:
+        async_telemetry_buffer.cache.redis = ar
+    forecast_cache.ar = ar
+    forecast_cache._store_script = ar.register_script(forecast_cache._STORE_LUA)
+    forecast_cache._release_script = ar.register_script(forecast_cache._RELEASE_LUA)
+
+    devices.devices.clear()
+    devices.devices.update({device_id: True for device_id in device_ids})
+    return r, ar
+
+class InProcessBroker:
+    """
+    Minimal MQTT broker: clients subscribe with topic filters (+ and # wildcards)
+    and every publish is handed to matching clients' on_message immediately.
+    """
+
+    def __init__(self):
+        self._subscriptions = []
+
+    def client(self):
+        return InProcessClient(self)
+
+    def subscribe(self, client, topic_filter):
+        self._subscriptions.append((topic_filter, client))
+
+    def publish(self, topic, payload):
+        from paho.mqtt.client import topic_matches_sub
+
+        if isinstance(payload, str):
+            payload = payload.encode()
+        message = Message(topic, payload)
+        for topic_filter, client in self._subscriptions:
+            if topic_matches_sub(topic_filter, topic) and client.on_message:
+                client.on_message(client, None, message)
+
+class InProcessClient:
+    """
+    The part of paho's Client the workers use.
+    """
+
+    def __init__(self, broker):
+        self.broker = broker
+        self.on_connect = None
+        self.on_message = None
+        self.published = 0
+
+    def connect(self, *args, **kwargs):
+        if self.on_connect:
+            self.on_connect(self, None, {}, 0)
+
+    def subscribe(self, topic_filter):
+        self.broker.subscribe(self, topic_filter)
+
+    def publish(self, topic, payload):
+        self.published += 1
+        self.broker.publish(topic, payload)
@@ -0,0 +1,23 @@
+import numpy as np
+from app.config.forecast import SEQUENCE_LENGTH
+from app.modules.forecast import HISTORY_FIELDS, forecast_input, forecast_input_array
+
+def test_array_input_matches_entry_input():
+    start = 1700000000.5
+    entries = [
+        {
+            "timestamp": start + i,
+            "voltage": 220 + i % 7,
+            "current": 0.5 + i / 100,
+            "pf": 0.9,
+            "power": 100.0,
+        }
+        for i in range(SEQUENCE_LENGTH + 5)
+    ]
+    history = np.array([[entry[field] for field in HISTORY_FIELDS] for entry in entries])
+
+    X, timestamps = forecast_input(entries)
+    X_array, timestamps_array = forecast_input_array(history)
+    np.testing.assert_array_equal(X, X_array)
+    np.testing.assert_array_equal(timestamps, timestamps_array)
+    assert timestamps[-1] == entries[-1]["timestamp"]
@@ -0,0 +1,30 @@
+import asyncio
+import threading
+from app.utils import inference_executor
+
+def test_cancelled_call_counts_until_its_thread_finishes():
+    release = threading.Event()
+
+    async def scenario():
+        task = asyncio.create_task(inference_executor.run_inference(release.wait))
+        await asyncio.sleep(0.05)
+        task.cancel()
+        await asyncio.sleep(0.05)
+        # The caller is gone but the model call still holds a pool thread
+        still_running = inference_executor.get_stats()["in_flight"]
+        release.set()
+        await asyncio.sleep(0.05)
+        return still_running, inference_executor.get_stats()["in_flight"]
+
+    assert asyncio.run(scenario()) == (1, 0)
+
+def test_failed_call_is_no_longer_in_flight():
+    async def scenario():
+        try:
+            await inference_executor.run_inference(int, "not a number")
+        except ValueError:
+            pass
+        await asyncio.sleep(0)
+        return inference_executor.get_stats()["in_flight"]
+
+    assert asyncio.run(scenario()) == 0
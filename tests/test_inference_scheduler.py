@@ -0,0 +1,40 @@
+import numpy as np
+from app.modules import inference_scheduler
+from app.modules.inference_scheduler import AnomalyBatchScheduler
+
+class ZeroModel:
+    """
+    Reconstructs every input as zeros, so a window's error is mean(X ** 2).
+    """
+    def __init__(self):
+        self.calls = 0
+
+    def predict(self, X, verbose=0):
+        self.calls += 1
+        return np.zeros_like(X)
+
+def test_devices_sharing_a_model_keep_their_own_thresholds(monkeypatch):
+    shared = ZeroModel()
+    thresholds = {"strict": 0.5, "lenient": 2.0}
+
+    def prepare_window(device_id, window, features=None):
+        # Every window has a reconstruction error of 1.0
+        return shared, thresholds[device_id], {
+            "timestamps": np.arange(3, dtype=np.float64),
+            "feature_names": ["a", "b", "c"],
+            "X_scaled": np.ones((1, 3)),
+        }
+
+    monkeypatch.setattr(inference_scheduler, "prepare_window", prepare_window)
+    flagged = []
+    scheduler = AnomalyBatchScheduler(
+        lambda device_id, result: flagged.append(device_id),
+        max_batch_size=8, max_delay_ms=0, queue_size=8,
+    )
+    # The lenient device comes first, so its threshold would be used for the group
+    scheduler.process_batch([
+        (device_id, [], None, 0.0, 0.0) for device_id in ("lenient", "strict", "lenient", "strict")
+    ])
+
+    assert flagged == ["strict", "strict"]
+    assert shared.calls == 1
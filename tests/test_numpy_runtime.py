@@ -0,0 +1,31 @@
+import numpy as np
+import pytest
+
+tf = pytest.importorskip("tensorflow")
+
+from app.utils.export_models import export_model
+from app.utils.numpy_runtime import NumpyModel
+
+@pytest.mark.parametrize("return_sequences", [False, True])
+def test_exported_model_matches_keras(tmp_path, return_sequences):
+    tf.keras.utils.set_random_seed(0)
+    layers = [
+        tf.keras.Input(shape=(12, 7)),
+        tf.keras.layers.LSTM(16, return_sequences=return_sequences),
+        tf.keras.layers.Dropout(0.2),
+    ]
+    if return_sequences:
+        layers += [tf.keras.layers.LSTM(8), tf.keras.layers.Dropout(0.2)]
+    layers += [tf.keras.layers.Dense(8, activation="relu"), tf.keras.layers.Dense(3)]
+    model = tf.keras.Sequential(layers)
+    # Non-zero biases, so a misplaced gate or bias shows up
+    for variable in model.weights:
+        variable.assign(np.random.default_rng(1).normal(0, 0.5, variable.shape))
+    path = tmp_path / "model.keras"
+    model.save(path)
+
+    _, exported = export_model(str(path))
+    runtime = NumpyModel.load(exported)
+
+    X = np.random.default_rng(2).normal(size=(5, 12, 7)).astype(np.float32)
+    np.testing.assert_allclose(runtime.predict(X), model.predict(X, verbose=0), rtol=1e-4, atol=1e-5)
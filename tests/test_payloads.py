@@ -0,0 +1,36 @@
+import importlib
+import json
+import sys
+import numpy as np
+import pytest
+from app.interfaces.power_telemetry import parse_power_telemetry
+from app.utils import fast_json
+
+FIELDS = {"voltage": 220.0, "current": 1.0, "pf": 0.9, "is_on": True, "power": 198.0, "energy": 1.5, "frequency": 50.0}
+
+def payload(timestamp):
+    return json.dumps({"timestamp": timestamp, **FIELDS}).encode()
+
+@pytest.mark.parametrize("timestamp", [1700000000, 1700000000.5, "2023-11-14T22:13:20"])
+def test_timestamps_are_accepted(timestamp):
+    assert parse_power_telemetry(payload(timestamp))["timestamp"] == timestamp
+
+@pytest.mark.parametrize("timestamp", [True, False, None, "yesterday"])
+def test_bad_timestamps_are_rejected(timestamp):
+    with pytest.raises(ValueError):
+        parse_power_telemetry(payload(timestamp))
+
+@pytest.fixture
+def stdlib_json(monkeypatch):
+    monkeypatch.setitem(sys.modules, "orjson", None)
+    yield importlib.reload(fast_json)
+    monkeypatch.undo()
+    importlib.reload(fast_json)
+
+def test_fallback_writes_nan_as_null(stdlib_json):
+    assert stdlib_json.orjson is None
+    value = {"power": [1.0, float("nan")], "columns": np.array([np.nan, 2.0]), "pf": np.float32("inf")}
+    encoded = stdlib_json.dumps(value)
+    assert encoded == b'{"power":[1.0,null],"columns":[null,2.0],"pf":null}'
+    # Readable by either backend
+    assert json.loads(encoded, parse_constant=pytest.fail)["power"] == [1.0, None]
@@ -0,0 +1,84 @@
+import time
+import fakeredis
+from app.config.sharding import SHARD_MEMBERS_KEY
+from app.modules.sharding import HashRing, ShardMembership
+
+DEVICES = [f"device-{i}" for i in range(2000)]
+
+def owners(ring):
+    return {device_id: ring.owner(device_id) for device_id in DEVICES}
+
+def test_owner_is_stable_across_rings_with_same_members():
+    assert owners(HashRing(["a", "b", "c"])) == owners(HashRing(["c", "a", "b"]))
+
+def test_owner_is_none_for_empty_ring():
+    assert HashRing([]).owner("device-1") is None
+
+def test_joining_member_only_takes_devices():
+    before = owners(HashRing(["a", "b", "c"]))
+    after = owners(HashRing(["a", "b", "c", "d"]))
+    moved = [device_id for device_id in DEVICES if before[device_id] != after[device_id]]
+    assert moved
+    assert all(after[device_id] == "d" for device_id in moved)
+    # Roughly its fair share moves, not the whole keyspace
+    assert len(moved) < len(DEVICES) / 2
+
+def test_leaving_member_only_gives_up_its_devices():
+    before = owners(HashRing(["a", "b", "c"]))
+    after = owners(HashRing(["a", "b"]))
+    for device_id in DEVICES:
+        if before[device_id] != "c":
+            assert after[device_id] == before[device_id]
+        else:
+            assert after[device_id] in ("a", "b")
+
+def test_heartbeat_rebalances_on_join_and_lease_expiry():
+    r = fakeredis.FakeRedis()
+    changes = []
+    a = ShardMembership(r, "a", on_change=lambda ring: changes.append(ring.members), lease_ttl=15)
+    b = ShardMembership(r, "b", lease_ttl=15)
+
+    a.heartbeat()
+    assert a.ring.members == {"a"} and changes == []
+    b.heartbeat()
+    a.heartbeat()
+    assert a.ring.members == b.ring.members == {"a", "b"}
+    assert changes == [frozenset({"a", "b"})]
+    # Exactly one owner per device
+    for device_id in DEVICES[:200]:
+        assert a.owns(device_id) != b.owns(device_id)
+
+    # b crashes: its lease runs out and a takes everything back
+    r.zadd(SHARD_MEMBERS_KEY, {"b": time.time() - 1})
+    a.heartbeat()
+    assert a.ring.members == {"a"}
+    assert changes[-1] == frozenset({"a"})
+    assert all(a.owns(device_id) for device_id in DEVICES[:200])
+
+def test_leave_hands_devices_over_at_next_heartbeat():
+    r = fakeredis.FakeRedis()
+    a = ShardMembership(r, "a")
+    b = ShardMembership(r, "b")
+    a.heartbeat()
+    b.heartbeat()
+    a.heartbeat()
+    b.leave()
+    a.heartbeat()
+    assert a.ring.members == {"a"}
+
+def test_previous_owner_hands_over_until_grace_period_ends():
+    r = fakeredis.FakeRedis()
+    a = ShardMembership(r, "a", lease_ttl=0.2, heartbeat_interval=0.1)
+    b = ShardMembership(r, "b", lease_ttl=0.2, heartbeat_interval=0.1)
+    a.heartbeat()
+    b.heartbeat()
+    a.heartbeat()
+
+    moved = [device_id for device_id in DEVICES[:200] if b.owns(device_id)]
+    kept = [device_id for device_id in DEVICES[:200] if a.owns(device_id)]
+    assert moved and kept
+    # a owned every device before b joined; it keeps buffering the moved ones
+    assert all(a.handing_over(device_id) for device_id in moved)
+
+    time.sleep(0.35)
+    assert not any(a.handing_over(device_id) for device_id in moved)
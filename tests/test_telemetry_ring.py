@@ -0,0 +1,66 @@
+import asyncio
+import json
+import fakeredis
+from app.storage.telemetry_codec import decode, encode
+from app.storage.telemetry_ring import DeviceRing, TelemetryRingCache, normalize_entries, _row
+
+ENTRY = {
+    "timestamp": 1700000000,
+    "voltage": 220.5,
+    "current": 1.25,
+    "power": 275.0,
+    "energy": 12.0,
+    "frequency": 50.0,
+    "pf": 0.99,
+    "is_on": True,
+}
+
+def cached(entries):
+    ring = DeviceRing(capacity=8)
+    for entry in entries:
+        ring.append(float(entry["timestamp"]), _row(entry))
+    return ring.entries(0, ring.count)
+
+def test_json_entries_match_cached_entries():
+    # As the JSON codec buffers them: ISO timestamps, extra keys, a missing field
+    raw = json.dumps({
+        **ENTRY,
+        "timestamp": "2023-11-14T22:13:20+00:00",
+        "device_id": "device-1",
+        "pf": None,
+    })
+    expected = cached([{**ENTRY, "pf": None}])
+    assert normalize_entries([decode(raw)]) == expected
+    assert expected == [{field: value for field, value in ENTRY.items() if field != "pf"}]
+
+def test_packed_entries_are_unchanged():
+    for codec in ("packed64", "packed32"):
+        entries = [decode(encode({**ENTRY, "timestamp": ENTRY["timestamp"] + i}, codec)) for i in range(3)]
+        assert normalize_entries(entries) == cached(entries)
+        if codec == "packed64":
+            assert normalize_entries(entries) == entries
+
+def test_empty():
+    assert normalize_entries([]) == []
+
+def test_reads_the_ring_cannot_answer_skip_the_fill():
+    fetched = []
+
+    async def fetch_tail(device_id, n):
+        fetched.append(n)
+        return [{**ENTRY, "timestamp": ENTRY["timestamp"] + i} for i in range(3)]
+
+    async def scenario():
+        cache = TelemetryRingCache(fakeredis.aioredis.FakeRedis(), fetch_tail, capacity=10, memory_mb=1)
+        try:
+            assert await cache.last_n("device-1", 20) is None
+            assert await cache.latest_buffer("device-1", 60) is None
+            assert fetched == []
+            assert len(await cache.last_n("device-1", 5)) == 3
+            assert fetched == [10]
+            # Loaded and complete, so now it answers the long read too
+            assert len(await cache.last_n("device-1", 20)) == 3
+        finally:
+            await cache.close()
+
+    asyncio.run(scenario())